@@ -1,9 +1,15 @@
 from random import Random
 import random
-from numpy import array, ndarray
+from numpy import array, ndarray, ones, uint32, clip
 import copy
+from weakref import WeakValueDictionary
 from aienvs.utils import hashf
 
+# The static grids of the maps that are alive, key is the tuple of map lines.
+# Maps are immutable so equal maps can share these. The grids are
+# dropped when the last map using them is garbage collected.
+_gridsCache = WeakValueDictionary()
+
 
 class BasicMap():
     """
@@ -14,6 +20,9 @@ class BasicMap():
     so without moving parts.
     immutable: nobody should access private variables
     and there are no setters so this object will never change.
+    
+    For fast lookups, read-only numpy grids are built when the map is created.
+    They are indexed [x,y] and shared between all living maps with the same lines.
     """
 
     def __init__(self, map:list):
@@ -32,11 +41,17 @@ class BasicMap():
         are placed on the map and what they mean. 
         """
         self._map = map
-        width = self.getWidth()
-        for line in map:
-            if width != len(line):
-                raise ValueError("All lines in map must have width " + str(self.getWidth()) + " but found " + str(line))
-        self._squares = self._getSquaresDict()
+        key = tuple(map)
+        grids = _gridsCache.get(key)
+        if grids is None:
+            width = self.getWidth()
+            for line in map:
+                if width != len(line):
+                    raise ValueError("All lines in map must have width " + str(self.getWidth()) + " but found " + str(line))
+            grids = _StaticGrids(map, self._getSquaresDict())
+            _gridsCache[key] = grids
+        self._grids = grids
+        self._squares = self._grids.squares
 
     def getWidth(self) -> int:
         return len(self._map[0])
@@ -57,12 +72,13 @@ class BasicMap():
         """
         if not self.isInside(pos):
             return None
-        return self._map[pos[1]][pos[0]]
+        return chr(self._grids.chars[pos[0], pos[1]])
     
     def getMapPositions(self, allowed:str) -> list:
         """
         @param allowed string containing all allowed characters
-        @return the map positions (list of ndarray) that contain allowed chars
+        @return the map positions (list of read-only ndarray) that contain allowed chars.
+        The positions are shared between all maps with the same lines, copy them to modify them.
         """
         poslist = []
         for char in allowed:
@@ -81,12 +97,14 @@ class BasicMap():
             raise Exception("The map does not contain any free tiles")
         return random.choice(freepos)
             
-    def getRandomPosition(self) -> array:
+    def getRandomPosition(self, rng=None) -> array:
         """
-        @param random number generator,  instance of Random()
+        @param rng the numpy random Generator to use, or None to use the global random
         @return: numpy array : random position on the map. The returned position 
         will be #isInside but may be on a wall.
         """
+        if rng is not None:
+            return array([rng.integers(self.getWidth()), rng.integers(self.getHeight())])
         return array([random.randint(0, self.getWidth() - 1), random.randint(0, self.getHeight() - 1)])
     
     def isInside(self, pos:ndarray) -> bool:
@@ -97,11 +115,39 @@ class BasicMap():
     
     def isFree(self, pos:ndarray):
         """
+        @param pos the position (x,y), or a (N,2) array of positions 
         @return true iff the given pos has space for a robot,
         so it must be on the map and not on a wall.
+        For a (N,2) array, a (N,) bool array with the result for each position.
         This assumes the conventional "*" char is used to indicate walls.
         """
-        return self.isInside(pos) and self.get(pos) != "*"         
+        walls = self._grids.walls
+        if isinstance(pos, ndarray) and pos.ndim == 2:
+            # everything outside the map ends up on the padding, which is wall.
+            return ~walls[clip(pos[:, 0] + 1, 0, walls.shape[0] - 1), clip(pos[:, 1] + 1, 0, walls.shape[1] - 1)]
+        if not self.isInside(pos):
+            return False
+        return not walls[pos[0] + 1, pos[1] + 1]
+
+    def getCharGrid(self) -> ndarray:
+        """
+        @return read-only (W,H) array with the character code (ord) at each [x,y]
+        """
+        return self._grids.chars
+
+    def getFreeGrid(self) -> ndarray:
+        """
+        @return read-only (W,H) bool array, true at [x,y] iff that position is not a wall
+        """
+        return self._grids.free
+
+    def getWallGrid(self) -> ndarray:
+        """
+        @return read-only (W+2,H+2) bool array, true at [x+1,y+1] iff 
+        position x,y is a wall or outside the map. So the map is surrounded 
+        by a border of walls, which saves bounds checks when moving around.
+        """
+        return self._grids.walls
 
     def getPart(self, area:ndarray):  # -> Map
         """
@@ -124,6 +170,7 @@ class BasicMap():
             for x in range(0, len(row)):
                 char = row[x]
                 pos = array([x, y])
+                pos.flags.writeable = False
                 if char in squares.keys():
                     squares[char].append(pos)
                 else:
@@ -136,8 +183,28 @@ class BasicMap():
         return self
     
     def __eq__(self, other):
-        return self._map == other._map
+        return self._grids is other._grids or self._map == other._map
 
     def __hash__(self) -> int:
-        return hashf(self._map)
+        return self._grids.hash
+
+
+class _StaticGrids():
+    """
+    The read-only lookup structures of a map, see BasicMap.
+    """
+
+    def __init__(self, map:list, squares:dict):
+        """
+        @param map the list of strings of the map
+        @param squares the squares dict of the map
+        """
+        self.chars = array([[ord(char) for char in line] for line in map], dtype=uint32).T.copy()
+        self.free = self.chars != ord('*')
+        self.walls = ones((self.chars.shape[0] + 2, self.chars.shape[1] + 2), dtype=bool)
+        self.walls[1:-1, 1:-1] = ~self.free
+        for grid in (self.chars, self.free, self.walls):
+            grid.flags.writeable = False
+        self.squares = squares
+        self.hash = hashf(map)
  
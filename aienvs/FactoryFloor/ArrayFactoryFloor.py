@@ -0,0 +1,304 @@
+from gym import spaces
+from aienvs.Environment import Env
+from aienvs.FactoryFloor.FactoryFloor import FactoryFloor
+from aienvs.FactoryFloor.FactoryFloorRobot import FactoryFloorRobot
+from aienvs.FactoryFloor.FactoryFloorTask import FactoryFloorTask
+from aienvs.FactoryFloor.FactoryFloorState import FactoryFloorState
+from aienvs.FactoryFloor.Map import Map
+from aienvs.FactoryFloor.TaskSpawner import TaskSpawner
+from aienvs.gym.CustomObjectSpace import CustomObjectSpace
+from numpy import array, zeros, full, arange, bincount, minimum, maximum, set_printoptions, transpose
+from aienvs.utils import createRandomGenerators
+import copy
+import time
+
+# position change for each action, indexed by action number (ACT,UP,DOWN,LEFT,RIGHT)
+DELTAS = array([[0, 0], [0, -1], [0, 1], [-1, 0], [1, 0]])
+
+
+def getPSucceedTable(parameters:dict, robotIds:list):
+    """
+    @param parameters the FactoryFloor parameters
+    @param robotIds the robot ids
+    @return (R,5) array with the probability that each robot succeeds
+    each action, looked up as FactoryFloor#_applyAction does
+    """
+    def getPSucceed(robotId, actstring:str) -> float:
+        try:
+            # first check for individual success probabilities
+            return parameters['P_action_succeed'][robotId][actstring]
+        except KeyError:
+            # then use common ones
+            return parameters['P_action_succeed'][actstring]
+
+    return array([[getPSucceed(robotId, FactoryFloor.ACTIONS[action]) for action in sorted(FactoryFloor.ACTIONS)] \
+                  for robotId in robotIds]).reshape(len(robotIds), len(FactoryFloor.ACTIONS))
+
+
+def resolveBlocked(moving, origCells, targetCells, ncells:int):
+    """
+    Find which robots can really move when robots are processed in order
+    and can not move onto a position occupied by another robot.
+    Robot i is blocked iff some robot j<i ends at i's target,
+    or some robot j>i (that did not move yet) is at i's target.
+    Robot i only depends on the outcome of robots j<i, so iterating
+    this until nothing changes gives exactly the sequential outcome.
+    @param moving bool array, true for robots whose move would succeed
+    on an empty floor
+    @param origCells the current cell number of each robot
+    @param targetCells the target cell number of each robot
+    @param ncells total number of cells
+    @return bool array, true for robots that really move
+    """
+    index = arange(len(moving))
+    targets = targetCells[moving]
+    candidates = index[moving]
+
+    # highest index of the robots that are at a cell before the step
+    lastAt = full(ncells, -1)
+    maximum.at(lastAt, origCells, index)
+    blockedByLater = lastAt[targets] > candidates
+
+    result = moving
+    while True:
+        finalCells = origCells.copy()
+        finalCells[result] = targetCells[result]
+        # lowest index of the robots that are at a cell after the step
+        firstAt = full(ncells, len(moving))
+        minimum.at(firstAt, finalCells, index)
+        newresult = moving.copy()
+        newresult[candidates] = ~(blockedByLater | (firstAt[targets] < candidates))
+        if (newresult == result).all():
+            return result
+        result = newresult
+
+
+class ArrayFactoryFloor(Env):
+    """
+    Alternative FactoryFloor core that keeps the dynamic parts of the floor
+    in integer arrays instead of robot and task objects:
+    the robot positions in a (R,2) array, the robots and tasks per cell
+    in (W,H) count grids and the walls in a padded boolean grid.
+    Move legality, ACT task removal and the penalty are array lookups
+    and all robots are processed at once with numpy.
+
+    Under the same seed this gives exactly the same results as FactoryFloor,
+    it uses the same parameters and draws the same random numbers in the
+    same order. Robots are processed in the order of the 'robots' parameter
+    as in FactoryFloor: a move into a cell is blocked by robots that are
+    there at the moment the robot moves.
+
+    Additionally to the FactoryFloor parameters, this uses
+    * returnRealState: if True, step returns a FactoryFloorState as FactoryFloor does.
+        if False, step returns a dict with the 'robots' positions (R,2) array
+        in the order of the 'robots' parameter and the 'tasks' (W,H) count grid.
+    """
+    DEFAULT_PARAMETERS = dict(FactoryFloor.DEFAULT_PARAMETERS, returnRealState=False)
+
+    ACTIONS = FactoryFloor.ACTIONS
+
+    def __init__(self, parameters:dict={}):
+        """
+        @param parameters the env settings, see FactoryFloor
+        """
+        self._parameters = copy.deepcopy(self.DEFAULT_PARAMETERS)
+        self._parameters.update(parameters)
+
+        self._map = Map(self._parameters['map'], self._parameters['P_task_appears'])
+        self.seed(self._parameters['seed'])
+
+        width = self._map.getWidth()
+        height = self._map.getHeight()
+        # free[x+1,y+1] is True iff x,y is inside the map and not a wall
+        self._free = ~self._map.getWallGrid()
+        self._robotGrid = zeros((width, height), dtype=int)
+        self._taskGrid = zeros((width, height), dtype=int)
+        self._taskCount = 0
+        self._step = 0
+
+        # use a dict, as FactoryFloor does, to get the same robot order
+        robots = {}
+        for item in self._parameters['robots']:
+            pos = item['pos']
+            if isinstance(pos, list):
+                if len(pos) != 2:
+                    raise ValueError("position vector must be length 2 but got " + str(pos))
+                pos = array(pos)
+            elif pos == 'random':
+                pos = self._getFreeMapPosition()
+            else:
+                raise ValueError("Unknown robot position, expected list but got " + str(type(pos)))
+            robots[item['id']] = pos
+            self._robotGrid[pos[0], pos[1]] += 1
+        self._robotIds = list(robots.keys())
+        self._robotPos = array(list(robots.values()), dtype=int).reshape(len(robots), 2)
+
+        for pos in self._parameters['tasks']:
+            if isinstance(pos, list):
+                if len(pos) != 2:
+                    raise ValueError("position vector must be length 2 but got " + str(pos))
+            elif pos == 'random':
+                pos = self._getFreeMapPosition()
+            else:
+                raise ValueError("Unknown task position, expected list but got " + str(type(pos)))
+            self._taskGrid[pos[0], pos[1]] += 1
+            self._taskCount += 1
+
+        self._pSucceed = getPSucceedTable(self._parameters, self._robotIds)
+        self._taskSpawner = TaskSpawner(self._map, self._parameters['allow_task_overlap'], \
+            [pos for pos in zip(*self._taskGrid.nonzero()) for n in range(self._taskGrid[pos])])
+        self._actSpace = spaces.Dict({robotId:spaces.Discrete(len(self.ACTIONS)) for robotId in self._robotIds})
+
+    # Override
+    def step(self, actions:dict):
+        penalty = self._taskCount
+        if(actions):
+            self._applyActions(array([actions[robotId] for robotId in self._robotIds], dtype=int))
+        global_reward = penalty - self._taskCount
+
+        appears = self._taskRng.random(int(self._parameters["N_task_appears"]))
+        for appear in appears < self._map.getTaskProbability():
+            if appear:
+                self._addTask()
+
+        self._step += 1
+        done = (self._parameters['steps'] <= self._step)
+        return self._getObservation(), global_reward, done, []
+
+    # Override
+    def reset(self):
+        self.__init__(self._parameters)
+        return self._getObservation()
+
+    # Override
+    def render(self, delay=0.0, overlay=False):
+        set_printoptions(linewidth=100)
+        print(transpose(9 * self._robotGrid - self._taskGrid))
+        time.sleep(delay)
+
+    # Override
+    def close(self):
+        pass
+
+    # Override
+    def seed(self, seed):
+        """
+        Seeds the own random generators of this env, exactly as FactoryFloor#seed
+        """
+        self._parameters['seed'] = seed
+        self._rng, self._taskRng = createRandomGenerators(seed, 2)
+
+    @property
+    def observation_space(self):
+        if self._parameters['returnRealState']:
+            return CustomObjectSpace(self.getState())
+        width = self._map.getWidth()
+        height = self._map.getHeight()
+        return spaces.Dict({'robots': spaces.Box(0, max(width, height) - 1, self._robotPos.shape, dtype=int),
+                            'tasks': spaces.Box(0, float('inf'), (width, height), dtype=int)})
+
+    @property
+    def action_space(self):
+        return self._actSpace
+
+    def getMap(self) -> Map:
+        """
+        @return: the map of this floor
+        """
+        return self._map
+
+    def getRobotIds(self) -> list:
+        """
+        @return the robot ids, in the order of the robot positions array
+        """
+        return self._robotIds
+
+    def getRobotPositions(self):
+        """
+        @return (R,2) array with the robot positions. Do not modify.
+        """
+        return self._robotPos
+
+    def getTaskGrid(self):
+        """
+        @return (W,H) array with the number of tasks at each position. Do not modify.
+        """
+        return self._taskGrid
+
+    def getState(self) -> FactoryFloorState:
+        """
+        @return a new FactoryFloorState equivalent to the current arrays
+        """
+        state = FactoryFloorState({}, [], self._map)
+        for robotId, pos in zip(self._robotIds, self._robotPos):
+            state.addRobot(FactoryFloorRobot(robotId, pos.copy()))
+        for x, y in zip(*self._taskGrid.nonzero()):
+            for n in range(self._taskGrid[x, y]):
+                state.addTask(FactoryFloorTask(array([x, y])))
+        state.step = self._step
+        return state
+
+    ########## Private functions ##########################
+
+    def _getObservation(self):
+        if self._parameters['returnRealState']:
+            return self.getState()
+        return {'robots': self._robotPos.copy(), 'tasks': self._taskGrid.copy()}
+
+    def _applyActions(self, actions):
+        """
+        All robots try to execute their action, with the semantics of
+        FactoryFloor#_applyAction applied to the robots in order.
+        @param actions array with the ACTION number for each robot
+        """
+        nrobots = len(self._robotIds)
+        # one random number per robot, in robot order, as in FactoryFloor
+        randNo = self._rng.random(nrobots)
+        succeed = randNo <= self._pSucceed[arange(nrobots), actions]
+
+        # ACT: each acting robot removes one task at its position, if there is one.
+        acting = succeed & (actions == 0)
+        if acting.any():
+            height = self._taskGrid.shape[1]
+            cells = self._robotPos[acting, 0] * height + self._robotPos[acting, 1]
+            flatTasks = self._taskGrid.reshape(-1)
+            removed = minimum(flatTasks, bincount(cells, minlength=flatTasks.size))
+            flatTasks -= removed
+            self._taskCount -= int(removed.sum())
+            for cell in removed.nonzero()[0]:
+                self._taskSpawner.remove(divmod(cell, height), removed[cell])
+
+        moving = succeed & (actions != 0)
+        newpos = self._robotPos + DELTAS[actions]
+        moving &= self._free[newpos[:, 0] + 1, newpos[:, 1] + 1]
+        if not self._parameters['allow_robot_overlap']:
+            height = self._taskGrid.shape[1]
+            moving = resolveBlocked(moving, self._robotPos[:, 0] * height + self._robotPos[:, 1], \
+                                    newpos[:, 0] * height + newpos[:, 1], self._taskGrid.size)
+        if moving.any():
+            oldpos = self._robotPos[moving]
+            self._robotPos[moving] = newpos[moving]
+            self._robotGrid[oldpos[:, 0], oldpos[:, 1]] -= 1
+            self._robotGrid[newpos[moving, 0], newpos[moving, 1]] += 1
+
+    def _getFreeMapPosition(self):
+        """
+        @return:random map position (x,y) that is not occupied by robot or wall,
+        drawn exactly as FactoryFloor#_getFreeMapPosition.
+        """
+        while True:
+            pos = self._map.getRandomPosition(self._rng)
+            if self._free[pos[0] + 1, pos[1] + 1] \
+                and (self._parameters['allow_robot_overlap'] or self._robotGrid[pos[0], pos[1]] == 0):
+                return pos
+
+    def _addTask(self):
+        """
+        Add one new task, drawn exactly as FactoryFloor#_addTask.
+        """
+        newpos = self._taskSpawner.sample(self._taskRng)
+        if newpos is None:
+            return
+        self._taskGrid[newpos[0], newpos[1]] += 1
+        self._taskCount += 1
+        self._taskSpawner.add(newpos)
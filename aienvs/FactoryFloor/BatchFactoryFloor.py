@@ -0,0 +1,295 @@
+from gym import spaces
+from aienvs.Environment import Env
+from aienvs.FactoryFloor.FactoryFloor import FactoryFloor
+from aienvs.FactoryFloor.ArrayFactoryFloor import DELTAS, getPSucceedTable, resolveBlocked
+from aienvs.FactoryFloor.FactoryFloorRobot import FactoryFloorRobot
+from aienvs.FactoryFloor.FactoryFloorTask import FactoryFloorTask
+from aienvs.FactoryFloor.FactoryFloorState import FactoryFloorState
+from aienvs.FactoryFloor.Map import Map
+from numpy import array, zeros, arange, bincount, minimum, ndarray, set_printoptions, transpose
+from aienvs.utils import createRandomGenerators
+import copy
+import time
+
+
+class BatchFactoryFloor(Env):
+    """
+    Simulates a batch of B independent factory floors in lockstep,
+    for sampling-heavy work like rollouts and evolutionary search.
+    All floors use the same Map and parameters as FactoryFloor.
+    The robot positions are kept in a (B,R,2) int array and the tasks
+    in a (B,W,H) count grid. Action success, walls, overlap rules and
+    task spawning are computed for all floors at once, using vectorized
+    draws from the own random generators of this env, seeded as FactoryFloor.
+
+    The dynamics of each floor are those of FactoryFloor: robots act
+    in the order of the 'robots' parameter and new tasks appear with
+    P_task_appears, N_task_appears times per step.
+    The random numbers are drawn differently, so results are equal
+    in distribution but not equal to FactoryFloor under the same seed.
+
+    Additionally to the FactoryFloor parameters this uses
+    * batch_size: the number of floors B.
+
+    step takes a (B,R) array with the action of each robot on each floor,
+    the columns in the order of the 'robots' parameter, or a list of B joint action dicts.
+    It returns a dict with 'robots' (B,R,2) and 'tasks' (B,W,H) arrays,
+    a (B,) array with rewards and a (B,) array with done flags.
+    """
+    DEFAULT_PARAMETERS = dict(FactoryFloor.DEFAULT_PARAMETERS, batch_size=1000)
+
+    ACTIONS = FactoryFloor.ACTIONS
+
+    def __init__(self, parameters:dict={}):
+        """
+        @param parameters the env settings, see FactoryFloor.
+        """
+        self._parameters = copy.deepcopy(self.DEFAULT_PARAMETERS)
+        self._parameters.update(parameters)
+        self._map = Map(self._parameters['map'], self._parameters['P_task_appears'])
+        self.seed(self._parameters['seed'])
+
+        self._batchSize = int(self._parameters['batch_size'])
+        self._robotIds = list({item['id']: item for item in self._parameters['robots']}.keys())
+        height = self._map.getHeight()
+        # free[x+1,y+1] is True iff x,y is inside the map and not a wall
+        self._free = ~self._map.getWallGrid()
+        self._pSucceed = getPSucceedTable(self._parameters, self._robotIds)
+        taskPositions = array(self._map.getTaskPositions(), dtype=int).reshape(-1, 2)
+        self._taskCells = taskPositions[:, 0] * height + taskPositions[:, 1]
+        self._taskWeights = array(self._map.getRawTaskWeights(), dtype=float)
+        self._actSpace = spaces.Dict({robotId:spaces.Discrete(len(self.ACTIONS)) for robotId in self._robotIds})
+        self._initFloors()
+
+    # Override
+    def step(self, actions):
+        """
+        @param actions (B,R) array with the actions, or list of B dicts
+        @return (observation, rewards, dones, info) for all floors.
+        """
+        if not isinstance(actions, ndarray):
+            actions = array([[action[robotId] for robotId in self._robotIds] for action in actions], dtype=int)
+        penalty = self._taskCount.copy()
+        self._applyActions(actions)
+        rewards = penalty - self._taskCount
+
+        for n in range(int(self._parameters["N_task_appears"])):
+            self._addTasks(self._taskRng.random(self._batchSize) < self._map.getTaskProbability())
+
+        self._steps += 1
+        dones = self._parameters['steps'] <= self._steps
+        return self._getObservation(), rewards, dones, []
+
+    # Override
+    def reset(self):
+        self.seed(self._parameters['seed'])
+        self._initFloors()
+        return self._getObservation()
+
+    # Override
+    def render(self, delay=0.0, overlay=False):
+        """
+        Renders the first floor
+        """
+        robots = zeros(self._taskGrid.shape[1:], dtype=int)
+        for pos in self._robotPos[0]:
+            robots[pos[0], pos[1]] += 1
+        set_printoptions(linewidth=100)
+        print(transpose(9 * robots - self._taskGrid[0]))
+        time.sleep(delay)
+
+    # Override
+    def close(self):
+        pass
+
+    # Override
+    def seed(self, seed):
+        """
+        Seeds the own random generators of this env, as FactoryFloor#seed.
+        The robot actions and the new tasks use separate streams.
+        @param seed the int seed, or None
+        """
+        self._parameters['seed'] = seed
+        self._rng, self._taskRng = createRandomGenerators(seed, 2)
+        return [seed]
+
+    @property
+    def observation_space(self):
+        width = self._map.getWidth()
+        height = self._map.getHeight()
+        return spaces.Dict({'robots': spaces.Box(0, max(width, height) - 1, self._robotPos.shape, dtype=int),
+                            'tasks': spaces.Box(0, float('inf'), self._taskGrid.shape, dtype=int)})
+
+    @property
+    def action_space(self):
+        """
+        @return the action space of the robots on a single floor
+        """
+        return self._actSpace
+
+    def getMap(self) -> Map:
+        return self._map
+
+    def getRobotIds(self) -> list:
+        """
+        @return the robot ids, in the order of the robot axis
+        """
+        return self._robotIds
+
+    def getState(self, floor:int) -> FactoryFloorState:
+        """
+        @param floor the floor number in [0,B>
+        @return a new FactoryFloorState with the robots and tasks of the floor
+        """
+        state = FactoryFloorState({}, [], self._map)
+        for robotId, pos in zip(self._robotIds, self._robotPos[floor]):
+            state.addRobot(FactoryFloorRobot(robotId, pos.copy()))
+        for x, y in zip(*self._taskGrid[floor].nonzero()):
+            for n in range(self._taskGrid[floor, x, y]):
+                state.addTask(FactoryFloorTask(array([x, y])))
+        state.step = int(self._steps[floor])
+        return state
+
+    def getFloor(self, floor:int) -> FactoryFloor:
+        """
+        @param floor the floor number in [0,B>
+        @return a new FactoryFloor with the same parameters and state as given floor
+        """
+        parameters = {key:value for key, value in self._parameters.items() if key != 'batch_size'}
+        env = FactoryFloor(parameters)
+        env.setState(self.getState(floor))
+        return env
+
+    def setState(self, floor:int, state:FactoryFloorState):
+        """
+        Set the robots, tasks and step of one floor.
+        @param floor the floor number in [0,B>
+        @param state a FactoryFloorState with the same robot ids and map as this
+        """
+        self._robotPos[floor] = [state.robots[robotId].getPosition() for robotId in self._robotIds]
+        self._taskGrid[floor] = 0
+        for task in state.tasks:
+            self._taskGrid[floor, task.getPosition()[0], task.getPosition()[1]] += 1
+        self._taskCount[floor] = len(state.tasks)
+        self._steps[floor] = state.step
+
+    ########## Private functions ##########################
+
+    def _initFloors(self):
+        """
+        Put the initial robots and tasks on all floors
+        """
+        batch = self._batchSize
+        width = self._map.getWidth()
+        height = self._map.getHeight()
+        self._robotPos = zeros((batch, len(self._robotIds), 2), dtype=int)
+        self._taskGrid = zeros((batch, width, height), dtype=int)
+        self._steps = zeros(batch, dtype=int)
+        robotCount = zeros((batch, width * height), dtype=int)
+        floors = arange(batch)
+
+        positions = {item['id']: item['pos'] for item in self._parameters['robots']}
+        for r, robotId in enumerate(self._robotIds):
+            pos = positions[robotId]
+            if isinstance(pos, list):
+                if len(pos) != 2:
+                    raise ValueError("position vector must be length 2 but got " + str(pos))
+                self._robotPos[:, r] = pos
+            elif pos == 'random':
+                self._robotPos[:, r] = self._getFreeMapPositions(robotCount)
+            else:
+                raise ValueError("Unknown robot position, expected list but got " + str(type(pos)))
+            robotCount[floors, self._robotPos[:, r, 0] * height + self._robotPos[:, r, 1]] += 1
+
+        for pos in self._parameters['tasks']:
+            if isinstance(pos, list):
+                if len(pos) != 2:
+                    raise ValueError("position vector must be length 2 but got " + str(pos))
+                self._taskGrid[:, pos[0], pos[1]] += 1
+            elif pos == 'random':
+                pos = self._getFreeMapPositions(robotCount)
+                self._taskGrid[floors, pos[:, 0], pos[:, 1]] += 1
+            else:
+                raise ValueError("Unknown task position, expected list but got " + str(type(pos)))
+        self._taskCount = self._taskGrid.reshape(batch, -1).sum(axis=1)
+
+    def _getFreeMapPositions(self, robotCount):
+        """
+        @param robotCount (B, W*H) array with the number of robots at each cell
+        @return (B,2) array with for each floor a uniform random position
+        that is not a wall and, if robot overlap is not allowed, not occupied
+        """
+        height = self._map.getHeight()
+        free = self._free[1:-1, 1:-1].reshape(1, -1).repeat(self._batchSize, axis=0)
+        if not self._parameters['allow_robot_overlap']:
+            free &= (robotCount == 0)
+        cells = _weightedChoice(free.astype(float), self._rng)
+        if (cells < 0).any():
+            raise ValueError("The map does not have enough free positions")
+        return array([cells // height, cells % height]).T
+
+    def _getObservation(self):
+        return {'robots': self._robotPos.copy(), 'tasks': self._taskGrid.copy()}
+
+    def _applyActions(self, actions:ndarray):
+        """
+        All robots on all floors try to execute their action,
+        with the semantics of FactoryFloor#_applyAction applied to the robots in order.
+        @param actions (B,R) array with the ACTION number for each robot
+        """
+        batch, nrobots = actions.shape
+        height = self._map.getHeight()
+        ncells = self._map.getWidth() * height
+        succeed = self._rng.random((batch, nrobots)) <= self._pSucceed[arange(nrobots), actions]
+        # cell number of each robot, unique over all floors
+        floorOffset = (arange(batch) * ncells)[:, None]
+        origCells = floorOffset + self._robotPos[:, :, 0] * height + self._robotPos[:, :, 1]
+
+        # ACT: each acting robot removes one task at its position, if there is one.
+        acting = succeed & (actions == 0)
+        if acting.any():
+            flatTasks = self._taskGrid.reshape(-1)
+            removed = minimum(flatTasks, bincount(origCells[acting], minlength=flatTasks.size))
+            flatTasks -= removed
+            self._taskCount -= removed.reshape(batch, -1).sum(axis=1)
+
+        newpos = self._robotPos + DELTAS[actions]
+        moving = succeed & (actions != 0) & self._free[newpos[:, :, 0] + 1, newpos[:, :, 1] + 1]
+        if not self._parameters['allow_robot_overlap']:
+            targetCells = floorOffset + newpos[:, :, 0] * height + newpos[:, :, 1]
+            moving = resolveBlocked(moving.reshape(-1), origCells.reshape(-1), \
+                                     targetCells.reshape(-1), batch * ncells).reshape(batch, nrobots)
+        self._robotPos[moving] = newpos[moving]
+
+    def _addTasks(self, appear):
+        """
+        Add one new task on each floor where appear is true.
+        The position is a weighted random choice from the task positions
+        that are free (or all task positions, if task overlap is allowed)
+        @param appear (B,) bool array, true for floors that get a new task
+        """
+        batch = self._batchSize
+        weights = self._taskWeights[None, :].repeat(batch, axis=0)
+        if not self._parameters['allow_task_overlap']:
+            weights *= (self._taskGrid.reshape(batch, -1)[:, self._taskCells] == 0)
+        weights[~appear] = 0
+        choice = _weightedChoice(weights, self._taskRng)
+        floors = (choice >= 0).nonzero()[0]
+        cells = self._taskCells[choice[floors]]
+        self._taskGrid.reshape(batch, -1)[floors, cells] += 1
+        self._taskCount[floors] += 1
+
+
+def _weightedChoice(weights, rng):
+    """
+    @param weights (B,N) array with non-negative weights
+    @param rng the numpy random Generator to use
+    @return (B,) array with for each row a column index drawn with
+    probability proportional to the weights, or -1 for rows with total weight 0
+    """
+    cumulative = weights.cumsum(axis=1)
+    totals = cumulative[:, -1] if weights.shape[1] > 0 else zeros(len(weights))
+    draws = rng.random(len(weights)) * totals
+    choice = minimum((cumulative <= draws[:, None]).sum(axis=1), weights.shape[1] - 1)
+    choice[totals <= 0] = -1
+    return choice
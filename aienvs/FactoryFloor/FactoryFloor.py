@@ -10,13 +10,13 @@ from numpy import array, dstack, ndarray
 import copy
 from random import Random
 from aienvs.FactoryFloor.Map import Map
-from numpy.random import seed as npseed
-from numpy.random import choice as weightedchoice
+from aienvs.FactoryFloor.TaskSpawner import TaskSpawner
 import time
 import random
 import pdb
 import numbers
 from aienvs.gym.CustomObjectSpace import CustomObjectSpace
+from aienvs.utils import createRandomGenerators
 
 USE_PossibleActionsSpace = False
 
@@ -27,6 +27,12 @@ class FactoryFloor(Env):
     the robots and the tasks.
     
     It is assumed that the factory floor itself (the layout) is immutable.
+
+    By default step and reset return a deep copy of the state.
+    If parameter copyObservation is False, they return the state itself
+    instead. That state then is a snapshot that must not be modified:
+    the env does not change it anymore but continues on a copy-on-write
+    copy that shares all unchanged robots and tasks with it.
     """
     DEFAULT_PARAMETERS = {'steps':1000,
                 'robots':[ {'id': "robot1", 'pos':[3, 4]}, {'id': "robot2", 'pos': 'random'}],  # initial robot positions
@@ -37,6 +43,7 @@ class FactoryFloor(Env):
                 'allow_robot_overlap':False,
                 'allow_task_overlap':False,
                 'seed':None,
+                'copyObservation':True,  # False: return snapshots instead of deep copies
                 'map':['..........',
                        '...8......',
                        '..3.*.....',
@@ -52,15 +59,18 @@ class FactoryFloor(Env):
         4: "RIGHT"
     }   
 
-    def __init__(self, parameters:dict={}):
+    def __init__(self, parameters:dict={}, map:Map=None):
         """
-        TBA
+        @param parameters the env settings, see the default settings above. 
+        @param map optional, the already parsed Map for the 'map' and 'P_task_appears'
+        parameters. If None, the Map is created from the parameters.
         """
         self._parameters = copy.deepcopy(self.DEFAULT_PARAMETERS)
         self._parameters.update(parameters)
         #self._random = SystemRandom()#Random(x=self._parameters['seed'])
 
-        map = Map(self._parameters['map'], self._parameters['P_task_appears'])
+        if map is None:
+            map = Map(self._parameters['map'], self._parameters['P_task_appears'])
         # use "set" to get rid of weird wrappers
         # if set(self._parameters['P_action_succeed'].keys()) != set(FactoryFloor.ACTIONS.values()):
         #    raise ValueError("P_action_succeed must contain values for all actions")
@@ -93,6 +103,9 @@ class FactoryFloor(Env):
             else:
                 raise ValueError("Unknown task position, expected list but got " + str(type(pos)))
             self._state.addTask(task)
+        # true iff self._state was returned as observation and must not be changed anymore
+        self._stateShared = False
+        self._createTaskSpawner()
     
         if not USE_PossibleActionsSpace:
             self._actSpace = spaces.Dict({robotId:spaces.Discrete(len(self.ACTIONS)) for robotId in self._state.robots.keys()})
@@ -101,27 +114,30 @@ class FactoryFloor(Env):
 
     # Override
     def step(self, actions:dict):
+        if self._stateShared:
+            self._state = self._state.copy()
+            self._stateShared = False
         global_reward = self._computePenalty()
         if(actions):
-            for robot in self._state.robots.values():
-                self._applyAction(robot, actions[robot.getId()])
+            # all success rolls in one draw, one per robot in robot order
+            randNos = self._rng.random(len(self._state.robots))
+            for robot, randNo in zip(list(self._state.robots.values()), randNos):
+                self._applyAction(robot, actions[robot.getId()], randNo)
         global_reward -= self._computePenalty()
  
-        idx=0
-        while( idx < int(self._parameters["N_task_appears"]) ):
-            if random.random() < self._state.getMap().getTaskProbability():
+        appears = self._taskRng.random(int(self._parameters["N_task_appears"]))
+        for appear in appears < self._state.getMap().getTaskProbability():
+            if appear:
                 self._addTask()
-            idx+=1
 
         self._state.step += 1
         done = (self._parameters['steps'] <= self._state.step)
 
-        obs = copy.deepcopy(self._state)
-        return obs, global_reward, done, []
+        return self._getObservation(), global_reward, done, []
     
     def reset(self):
         self.__init__(self._parameters)
-        return copy.deepcopy(self._state)  # should return initial observation
+        return self._getObservation()  # should return initial observation
         
     def render(self, delay=0.0, overlay=False):
         if overlay:
@@ -145,16 +161,22 @@ class FactoryFloor(Env):
         pass  
 
     def seed(self, seed):
+        """
+        Seeds the own random generators of this env, the global random 
+        generators are not used. The robot actions and the new tasks 
+        use separate streams.
+        @param seed the int seed, or None
+        """
         self._parameters['seed'] = seed
-        if isinstance(self._parameters['seed'], numbers.Number):
-            npseed(self._parameters['seed'])
-        random.seed(seed)
+        self._rng, self._taskRng = createRandomGenerators(seed, 2)
 
     def getState(self) -> FactoryFloorState:
         return self._state
 
     def setState(self, newState):
         self._state = copy.deepcopy(newState)
+        self._stateShared = False
+        self._createTaskSpawner()
 
     @property
     def observation_space(self):
@@ -184,21 +206,54 @@ class FactoryFloor(Env):
         @param area a numpy array of the form [[xmin,ymin],[xmax,ymax]]. 
         @return: A new FactoryFloor with same settings as this, but
         with Map#getPart(area) of this map, and only those bots and tasks that 
-        are in that area. The new factoryfloor is completely independent of this floor.
+        are in that area. Their positions are relative to [xmin,ymin].
+        The new factoryfloor is completely independent of this floor.
+        Use refreshPart to bring it in sync with this floor again later.
         """
         if( int(self._parameters["N_task_appears"]) > 1 ):
             raise Exception("Multiple task appears not supported for getting part of the map")
 
-        parameters = copy.deepcopy(self._parameters)
         newmap = self._state.getMap().getPart(area)
+        parameters = dict(self._parameters)
         parameters['map'] = newmap.getFullMap()
-        parameters['robots'] = [\
-            { 'id':robot.getId(), 'pos':robot.getPosition().tolist() }\
-            for robot in self._state.robots.values() if self._state.getMap().isInside(robot.getPosition())]
-        parameters['tasks'] = [task.getPosition().tolist() \
-            for task in self._state.tasks if self._state.getMap().isInside(task.getPosition())]
+        parameters['robots'] = []
+        parameters['tasks'] = []
         parameters['P_task_appears'] = newmap.getTaskProbability()
-        return FactoryFloor(parameters)
+        part = FactoryFloor(parameters, newmap)
+        self.refreshPart(part, area)
+        return part
+
+    def refreshPart(self, part, area:ndarray):
+        """
+        Update a part of this floor in place: its robots and tasks are replaced
+        by those of this floor that are in the area. The step count of
+        the part is not changed.
+        @param part a FactoryFloor created with getPart(area)
+        @param area a numpy array of the form [[xmin,ymin],[xmax,ymax]], as given to getPart
+        """
+        robots = list(self._state.robots.values())
+        tasks = self._state.tasks
+        robotpos = array([robot.getPosition() for robot in robots], dtype=int).reshape(len(robots), 2)
+        taskpos = array([task.getPosition() for task in tasks], dtype=int).reshape(len(tasks), 2)
+        robotsInside = ((robotpos >= area[0]) & (robotpos <= area[1])).all(axis=1)
+        tasksInside = ((taskpos >= area[0]) & (taskpos <= area[1])).all(axis=1)
+
+        state = FactoryFloorState({}, [], part._state.getMap())
+        for i in robotsInside.nonzero()[0]:
+            state.addRobot(FactoryFloorRobot(robots[i].getId(), robotpos[i] - area[0]))
+        for pos in taskpos[tasksInside] - area[0]:
+            state.addTask(FactoryFloorTask(pos))
+        state.step = part._state.step
+
+        oldIds = part._state.robots.keys()
+        part._state = state
+        part._stateShared = False
+        part._parameters['robots'] = [{'id':robot.getId(), 'pos':robot.getPosition().tolist()} \
+                                      for robot in state.robots.values()]
+        part._parameters['tasks'] = [task.getPosition().tolist() for task in state.tasks]
+        part._createTaskSpawner()
+        if state.robots.keys() != oldIds:
+            part._actSpace = spaces.Dict({robotId:spaces.Discrete(len(self.ACTIONS)) for robotId in state.robots.keys()})
   
     def isPossible(self, robot:FactoryFloorRobot, action):
         """
@@ -220,6 +275,16 @@ class FactoryFloor(Env):
 
     ########## Private functions ##########################
 
+    def _getObservation(self) -> FactoryFloorState:
+        """
+        @return deep copy of the state, or the state itself as snapshot
+        if copyObservation is False
+        """
+        if self._parameters['copyObservation']:
+            return copy.deepcopy(self._state)
+        self._stateShared = True
+        return self._state
+
     def _createBitmap(self):
         map = self._state.getMap()
         bitmapRobots = zeros((map.getWidth(), map.getHeight()))
@@ -234,14 +299,15 @@ class FactoryFloor(Env):
 
         return dstack((9 * bitmapRobots, bitmapTasks))
 
-    def _applyAction(self, robot, action):
+    def _applyAction(self, robot, action, randNo:float):
         """
         robot tries to execute given action.
         @param robot a FactoryFloorRobot
         @param action the ACTION number. 
+        @param randNo uniform random number in [0,1>, the action 
+        fails if this is above the success probability.
         """
         actstring = self.ACTIONS.get(action)
-        randNo = random.random()
         try:
             # first check for individual success probabilities
             pSucceed = self._parameters['P_action_succeed'][robot.getId()][actstring]
@@ -258,12 +324,14 @@ class FactoryFloor(Env):
             newpos=pos
             task = self._getTask(newpos)
             if task != None:
-                self._state.tasks.remove(task)
+                self._state.removeTask(task)
+                self._taskSpawner.remove(newpos)
                 #logging.debug("removed " + str(task))
         else: # move
             newpos = self._newPos(pos, action)
             if self._isFree(newpos):
-                robot.setPosition(newpos)
+                # in snapshot mode the robot may be shared with a snapshot, then replace it
+                self._state.moveRobot(robot.getId(), newpos, self._parameters['copyObservation'])
   
     def _newPos(self, pos:ndarray, action):
         """
@@ -289,7 +357,7 @@ class FactoryFloor(Env):
         @return:random map position (x,y) that is not occupied by robot or wall.
         """
         while True:
-            pos = self._state.getMap().getRandomPosition()
+            pos = self._state.getMap().getRandomPosition(self._rng)
             if self._isFree(pos):
                 return pos
 
@@ -317,22 +385,18 @@ class FactoryFloor(Env):
         """
         Add one new task to the task pool
         """
-        themap = self._state.getMap()
-        poslist = list(themap.getTaskPositions())
-        if not self._parameters['allow_task_overlap']:
-            if len(self._state.tasks) >= len(poslist):
-                return
-
-        # samplingSpace = spaces.MultiDiscrete([self._parameters['x_size'], self._parameters['y_size']])
-        while True:  # do until newpos is not yet tasked, or task overlap allowed
-            # work around numpy bug when list contains tuples
-            weights = list(themap.getTaskWeights())
-            i = weightedchoice(list(range(len(poslist))), 1, p=weights)[0]
-            newpos = poslist[i]
-            if self._parameters['allow_task_overlap'] or self._getTask(newpos) == None:
-                break;
-
+        newpos = self._taskSpawner.sample(self._taskRng)
+        if newpos is None:
+            return
         self._state.addTask(FactoryFloorTask(newpos))
+        self._taskSpawner.add(newpos)
+
+    def _createTaskSpawner(self):
+        """
+        (Re)create the task spawner for the tasks in the current state
+        """
+        self._taskSpawner = TaskSpawner(self._state.getMap(), self._parameters['allow_task_overlap'], \
+            [task.getPosition() for task in self._state.tasks])
 
     def _getTask(self, pos:tuple):
         """
@@ -1,8 +1,19 @@
 import numpy as np
 from aienvs.FactoryFloor.Map import Map
+from aienvs.FactoryFloor.FactoryFloorRobot import FactoryFloorRobot
+
+# cached zobrist key tables, see _getZobristKeys
+_zobristKeys = {}
 
 
 class FactoryFloorState():
+    """
+    The robots and tasks on the floor.
+    The state keeps a zobrist hash of the robots and tasks up to date
+    while robots move and tasks appear or disappear, so that hashing is O(1).
+    This requires that changes go through addRobot, moveRobot,
+    addTask and removeTask instead of modifying robots and tasks directly.
+    """
 
     def __init__(self, robotList, taskList, map:Map):
         """
@@ -12,54 +23,180 @@ class FactoryFloorState():
         self.tasks = taskList
         self._map = map
         self.step = 0
+        # robot ids sorted as in encodeStateAsArray, the layer number of each
+        # robot id and the zobrist hash. None if they need to be recomputed.
+        self._sortedIds = None
+        self._layers = None
+        self._zobrist = None
 
     def addRobot(self, robot):
         self.robots.update({robot.getId(): robot})
+        self._sortedIds = None
+        self._layers = None
+        self._zobrist = None
+
+    def moveRobot(self, robotId, newpos:np.ndarray, inplace:bool=True):
+        """
+        @param robotId the id of the robot to move
+        @param newpos the new position of the robot
+        @param inplace if True, the robot object itself is moved.
+        If False, the robot is replaced by a new robot object.
+        """
+        robot = self.robots[robotId]
+        if self._zobrist is not None:
+            keys = self._getZobristKeys()[self._layers[robotId]]
+            self._zobrist = (self._zobrist - int(keys[self._cell(robot.getPosition())]) \
+                             + int(keys[self._cell(newpos)])) & 0xFFFFFFFFFFFFFFFF
+        if inplace:
+            robot.setPosition(newpos)
+        else:
+            self.robots[robotId] = FactoryFloorRobot(robotId, newpos)
 
     def addTask(self, task):
         self.tasks.append(task)
+        if self._zobrist is not None:
+            self._zobrist = (self._zobrist + int(self._getZobristKeys()[1][self._cell(task.getPosition())])) \
+                & 0xFFFFFFFFFFFFFFFF
+
+    def removeTask(self, task):
+        self.tasks.remove(task)
+        if self._zobrist is not None:
+            self._zobrist = (self._zobrist - int(self._getZobristKeys()[1][self._cell(task.getPosition())])) \
+                & 0xFFFFFFFFFFFFFFFF
 
     def getMap(self):
         return self._map
-    
+
+    def getSortedRobotIds(self) -> list:
+        """
+        @return the robot ids, sorted case-insensitive. This is
+        the order of the robot layers in encodeStateAsArray
+        """
+        if self._sortedIds is None:
+            self._sortedIds = sorted(self.robots.keys(), key=str.lower)
+            self._layers = {robotId: 2 + n for n, robotId in enumerate(self._sortedIds)}
+        return self._sortedIds
+
+    def copy(self) -> 'FactoryFloorState':
+        """
+        @return shallow copy of this state: a new robots dict and tasks list,
+        but containing the same robot and task objects.
+        """
+        newstate = FactoryFloorState(self.robots.copy(), self.tasks.copy(), self._map)
+        newstate.step = self.step
+        newstate._sortedIds = self._sortedIds
+        newstate._layers = self._layers
+        newstate._zobrist = self._zobrist
+        return newstate
+
     def __hash__(self):
         """
         for hashing
         """
-        return hash(toTuple(encodeStateAsArray(self)))
+        return hash((self._getZobrist(), self.step))
 
     def __eq__(self, other):
-        return (encodeStateAsArray(self)==encodeStateAsArray(other)).all()
+        if self is other:
+            return True
+        if not isinstance(other, FactoryFloorState) or self.step != other.step \
+            or len(self.robots) != len(other.robots) or len(self.tasks) != len(other.tasks) \
+            or self._map.getWidth() != other._map.getWidth() or self._map.getHeight() != other._map.getHeight() \
+            or self._getZobrist() != other._getZobrist():
+            return False
+        # same as comparing encodeStateAsArray of both, but cheaper
+        return np.array_equal(self._getSortedRobotPositions(), other._getSortedRobotPositions()) \
+            and np.array_equal(np.sort(self._getTaskCells()), np.sort(other._getTaskCells()))
+
+    def _cell(self, pos) -> int:
+        """
+        @return the cell number of the given position
+        """
+        return pos[0] * self._map.getHeight() + pos[1]
 
+    def _getSortedRobotPositions(self) -> np.ndarray:
+        """
+        @return (R,2) array with robot positions, in getSortedRobotIds order
+        """
+        return _getPositions([self.robots[robotId] for robotId in self.getSortedRobotIds()])
 
-def encodeStateAsArray(state:FactoryFloorState):
+    def _getTaskCells(self) -> np.ndarray:
+        """
+        @return array with the cell number of each task
+        """
+        tasks = _getPositions(self.tasks)
+        return tasks[:, 0] * self._map.getHeight() + tasks[:, 1]
+
+    def _getZobristKeys(self):
+        """
+        @return the zobrist keys for this map size and number of robots.
+        """
+        return _getZobristKeys(self._map.getWidth() * self._map.getHeight(), 2 + len(self.robots))
+
+    def _getZobrist(self) -> int:
+        """
+        @return the zobrist hash of robots and tasks: the sum (modulo 2^64) of
+        the key of each task position and of each robot position for its layer.
+        The step is not included. Computed from scratch if needed.
+        """
+        if self._zobrist is None:
+            keys = self._getZobristKeys()
+            robots = self._getSortedRobotPositions()
+            robotkeys = keys[2 + np.arange(len(robots)), robots[:, 0] * self._map.getHeight() + robots[:, 1]]
+            taskkeys = keys[1, self._getTaskCells()]
+            # numpy sums of uint64 arrays wrap around modulo 2^64
+            self._zobrist = (int(robotkeys.sum()) + int(taskkeys.sum())) & 0xFFFFFFFFFFFFFFFF
+        return self._zobrist
+
+
+def encodeStateAsArray(state:FactoryFloorState, out:np.ndarray=None):
+    """
+    @param state the FactoryFloorState to encode
+    @param out optional buffer of shape [width, height, 2+#robots] to
+    write the result in. If None, a new array is allocated.
+    @return array [width, height, 2+#robots]. The first layer contains
+    the step number everywhere, the second the number of tasks at each position,
+    then each layer contains a 1 at the position of one robot,
+    for the robots in lexicographic order.
+    """
     width = state.getMap().getWidth()
     height = state.getMap().getHeight()
-    # first one for the tasks, then each layer for one robot in lexicographic order
-    result = np.zeros([width, height,2+len(state.robots)])
-
-    robots = {}
-    for robot in state.robots.values():
-        robots[robot.getId()]=robot.getPosition()
-
-    sortedIds = sorted(robots.keys(), key=str.lower)
-    
-    idx=0
-    while idx < len(sortedIds):
-        pos=robots[sortedIds[idx]]
-        result[pos[0], pos[1], idx+2] += 1
-        if sum(sum(result[:,:,idx+2])) != 1:
-            breakpoint()
-            raise "Something went wrong"
-        idx+=1
-
-    for task in state.tasks:
-        pos = task.getPosition()
-        result[pos[0], pos[1], 1] += 1
-
-    result[:,:,0] += state.step*np.ones([width,height])
-   
-    return result
+    shape = (width, height, 2 + len(state.robots))
+    if out is None:
+        out = np.zeros(shape)
+    elif out.shape != shape:
+        raise ValueError("Expected buffer with shape " + str(shape) + " but got " + str(out.shape))
+    else:
+        out.fill(0)
+
+    robots = state._getSortedRobotPositions()
+    out[robots[:, 0], robots[:, 1], 2 + np.arange(len(robots))] = 1
+
+    tasks = _getPositions(state.tasks)
+    np.add.at(out[:, :, 1], (tasks[:, 0], tasks[:, 1]), 1)
+
+    out[:, :, 0] = state.step
+    return out
+
+
+def _getPositions(items:list) -> np.ndarray:
+    """
+    @param items list of robots or tasks
+    @return (N,2) int array with the positions of the items
+    """
+    return np.array([item.getPosition() for item in items], dtype=int).reshape(len(items), 2)
+
+
+def _getZobristKeys(ncells:int, nlayers:int) -> np.ndarray:
+    """
+    @return (nlayers, ncells) array with random uint64 keys,
+    the same for each call with the same arguments.
+    """
+    if (ncells, nlayers) not in _zobristKeys:
+        # own generator, fixed seed, so that hashes do not depend on global seeds
+        generator = np.random.default_rng(ncells * 1000003 + nlayers)
+        _zobristKeys[(ncells, nlayers)] = generator.integers(0, 2 ** 64, (nlayers, ncells), dtype=np.uint64)
+    return _zobristKeys[(ncells, nlayers)]
+
 
 def toTuple(a):
     try:
@@ -74,4 +211,3 @@ def toTuple(a):
 # obs.addTask(FactoryFloorTask(np.array([2,2])))
 # obs.addTask(FactoryFloorTask(np.array([0,0])))
 # encoded=encodeStateAsArray(obs, env.observation_space.nvec[1],env.observation_space.nvec[2], "robot1")
-
@@ -1,27 +1,220 @@
 from aienvs.FactoryFloor.Map import Map
 from networkx.classes.graph import Graph
-from numpy import array, ndarray
+from numpy import array, ndarray, full, zeros, arange, int16
+import hashlib
+import os
+import tempfile
+import numpy
+
+# the (dx,dy) steps to the neighbours of a cell
+NEIGHBOURS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+
+# the number of sources that are searched together when computing distances
+BFS_CHUNK = 256
+
+# distance tables of maps that were already computed, key is the map key
+_distanceTables = {}
 
 
 class FactoryGraph(Graph):
+    """
+    The graph of the free cells of a map, with edges between
+    cells that a robot can step between.
+    Because maps are immutable, the graph can also provide the
+    shortest path distance between all pairs of free cells.
+    These distances are computed once per map (on first use),
+    with a breadth first search from chunks of cells at once,
+    and kept as int16 (N,N) matrix (N the number of free cells).
+    The tables are shared between graphs of equal maps and
+    optionally stored on disk, so that they survive the process.
+    """
 
-    def __init__(self, map:Map):
+    def __init__(self, map:Map, cacheDir:str=None):
         """
         constructs a graph with possible steps
         @param the map to make a graph for
+        @param cacheDir optional directory to load and store the distance table.
+        The file name contains a hash of the map.
+        If None, the table is only cached in memory.
         """
         super().__init__()
-        
-        for y in range(0, map.getHeight()):
-            for x in range(0, map.getWidth()):
-                pos = array([x, y])
-                if map.get(pos) == '*':
+        self._map = map
+        self._cacheDir = cacheDir
+        self._distances = None
+
+        width = map.getWidth()
+        height = map.getHeight()
+        # the node number of each free cell [x,y], or -1 for walls
+        self._cellIndex = full((width, height), -1, dtype=int)
+        self._cells = []
+        for y in range(0, height):
+            for x in range(0, width):
+                if map.get((x, y)) == '*':
                     continue
-                self.add_node(tuple(pos))
-                for neighbour in self._neighbours(pos):
-                    if map.isInside(neighbour) and map.get(neighbour) != '*':
-                        self.add_edge(tuple(pos), tuple(neighbour))
-
-    def _neighbours(self, pos:array):
-        return [ pos + [0, 1], pos + [0, -1], pos + [1, 0], pos + [-1, 0]]
-    
+                self._cellIndex[x, y] = len(self._cells)
+                self._cells.append((x, y))
+                self.add_node((x, y))
+        for (x, y) in self._cells:
+            for (dx, dy) in NEIGHBOURS:
+                neighbour = (x + dx, y + dy)
+                if 0 <= neighbour[0] < width and 0 <= neighbour[1] < height \
+                        and self._cellIndex[neighbour] >= 0:
+                    self.add_edge((x, y), neighbour)
+
+    def getDistance(self, source, target) -> int:
+        """
+        @param source the position (x,y) of a free cell
+        @param target the position (x,y) of a free cell
+        @return the number of steps on a shortest path from source
+        to target, or -1 if target can not be reached from source.
+        """
+        return int(self._getDistanceTable()[self._getIndex(source), self._getIndex(target)])
+
+    def getDistances(self, sources:ndarray, targets:ndarray) -> ndarray:
+        """
+        Vectorized version of getDistance, eg for the distances
+        from all robots to all tasks.
+        @param sources (N,2) array with positions of free cells
+        @param targets (M,2) array with positions of free cells
+        @return (N,M) int16 array with the distances, -1 for unreachable
+        """
+        sources = array(sources, dtype=int).reshape(-1, 2)
+        targets = array(targets, dtype=int).reshape(-1, 2)
+        table = self._getDistanceTable()
+        return table[numpy.ix_(self._getIndices(sources), self._getIndices(targets))]
+
+    def getNextStep(self, source, target):
+        """
+        @param source the position (x,y) of a free cell
+        @param target the position (x,y) of a free cell
+        @return the position (x,y) of a neighbour of source that is on a
+        shortest path to target, source itself if source==target,
+        or None if target can not be reached from source.
+        """
+        table = self._getDistanceTable()
+        targetIndex = self._getIndex(target)
+        distance = table[self._getIndex(source), targetIndex]
+        if distance <= 0:
+            return None if distance < 0 else tuple(source)
+        for neighbour in self.neighbors((int(source[0]), int(source[1]))):
+            if table[self._cellIndex[neighbour], targetIndex] == distance - 1:
+                return neighbour
+
+    ########## Private functions ##########################
+
+    def _getIndex(self, pos) -> int:
+        """
+        @param pos the position (x,y) of a free cell
+        @return the node number of the cell
+        """
+        return self._getIndices(array([pos], dtype=int))[0]
+
+    def _getIndices(self, positions:ndarray) -> ndarray:
+        """
+        @param positions (N,2) array with positions of free cells
+        @return (N,) array with the node numbers of the cells
+        """
+        width, height = self._cellIndex.shape
+        inside = (positions[:, 0] >= 0) & (positions[:, 0] < width) & \
+                 (positions[:, 1] >= 0) & (positions[:, 1] < height)
+        if not inside.all():
+            raise ValueError("Positions are outside the map: " + str(positions[~inside].tolist()))
+        indices = self._cellIndex[positions[:, 0], positions[:, 1]]
+        if (indices < 0).any():
+            raise ValueError("Positions are not free: " + str(positions[indices < 0].tolist()))
+        return indices
+
+    def _getDistanceTable(self) -> ndarray:
+        """
+        @return the (N,N) distance table, computed or loaded on first call
+        """
+        if self._distances is None:
+            key = self._getMapKey()
+            if key not in _distanceTables:
+                _distanceTables[key] = self._loadOrComputeDistances(key)
+            self._distances = _distanceTables[key]
+        return self._distances
+
+    def _getMapKey(self) -> str:
+        """
+        @return a hash of the map lines that is stable between runs.
+        """
+        return hashlib.sha1("\n".join(self._map.getFullMap()).encode()).hexdigest()
+
+    def _loadOrComputeDistances(self, key:str) -> ndarray:
+        """
+        @param key the map key, used in the file name
+        @return the distance table, loaded from the cacheDir if it is
+        there, otherwise computed and, if there is a cacheDir, stored there.
+        """
+        if self._cacheDir is None:
+            return self._computeDistances()
+        filename = os.path.join(self._cacheDir, "factorygraph_" + key + ".npy")
+        if os.path.exists(filename):
+            distances = numpy.load(filename)
+            if distances.shape == (len(self._cells), len(self._cells)):
+                distances.flags.writeable = False
+                return distances
+        distances = self._computeDistances()
+        os.makedirs(self._cacheDir, exist_ok=True)
+        # write to a temporary file first, so that other processes never read a partial file
+        handle, tmpname = tempfile.mkstemp(suffix=".npy", dir=self._cacheDir)
+        try:
+            with os.fdopen(handle, "wb") as file:
+                numpy.save(file, distances)
+            os.replace(tmpname, filename)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+        return distances
+
+    def _computeDistances(self) -> ndarray:
+        """
+        Breadth first search from all cells, BFS_CHUNK sources at a time.
+        The frontier of a chunk is kept as list of (source, cell) pairs,
+        so that each pair is handled only once.
+        @return (N,N) int16 array, element [i,j] is the distance from
+        cell i to cell j, or -1 if j can not be reached from i
+        """
+        n = len(self._cells)
+        # neighbours[j] contains the node numbers of neighbours of j, padded with n
+        neighbours = full((n, len(NEIGHBOURS)), n, dtype=int)
+        for j, cell in enumerate(self._cells):
+            for k, neighbour in enumerate(self.neighbors(cell)):
+                neighbours[j, k] = self._cellIndex[neighbour]
+
+        distances = full((n, n), -1, dtype=int16)
+        for start in range(0, n, BFS_CHUNK):
+            sources = arange(start, min(start + BFS_CHUNK, n))
+            self._searchChunk(sources, neighbours, distances[start:start + len(sources)])
+        distances.flags.writeable = False
+        return distances
+
+    def _searchChunk(self, sources:ndarray, neighbours:ndarray, distances:ndarray):
+        """
+        Breadth first search from the given sources simultaneously
+        @param sources (C,) array with the node numbers of the sources
+        @param neighbours (N,4) array with the neighbours of each node, padded with N
+        @param distances (C,N) array, filled with the distances from the sources
+        """
+        n = len(neighbours)
+        # pair (i, node) has number i*(n+1)+node. Column n is the padding, never reached
+        reached = zeros((len(sources), n + 1), dtype=bool)
+        reached[:, n] = True
+        reached = reached.reshape(-1)
+        claim = zeros(len(reached), dtype=int)
+        frontierSources = arange(len(sources))
+        frontierNodes = sources
+        reached[frontierSources * (n + 1) + frontierNodes] = True
+        distance = 0
+        while len(frontierNodes) > 0:
+            distances[frontierSources, frontierNodes] = distance
+            distance += 1
+            pairs = (frontierSources[:, None] * (n + 1) + neighbours[frontierNodes]).reshape(-1)
+            pairs = pairs[~reached[pairs]]
+            # remove duplicate pairs: only the last claim of each pair is kept
+            order = arange(len(pairs))
+            claim[pairs] = order
+            pairs = pairs[claim[pairs] == order]
+            reached[pairs] = True
+            frontierSources, frontierNodes = numpy.divmod(pairs, n + 1)
@@ -33,9 +33,12 @@ class Map(BasicMap):
         """
         super().__init__(map)
         self._taskProbability = ptask
+        # cache for getPart, key is the area as tuple
+        self._parts = {}
         self._cachedTaskPositions = tuple(Map._getTasksList(map))
          
         weights = Map._getWeightsList(map)
+        self._cachedRawTaskWeights = tuple(weights)
         totalweight = sum(weights)
         if totalweight == 0:
             self._cachedTaskWeights = tuple([])
@@ -61,6 +64,13 @@ class Map(BasicMap):
         """
         return self._cachedTaskWeights
     
+    def getRawTaskWeights(self) -> tuple:
+        """
+        @return: list of the task weights (ints) as on the map, 
+        ordered to match getTaskPositions
+        """
+        return self._cachedRawTaskWeights
+    
     @staticmethod
     def _getTasksList(map:list):
         """
@@ -92,15 +102,19 @@ class Map(BasicMap):
         """
         @param area a numpy array of the form [[xmin,ymin],[xmax,ymax]]. 
         @return: A copy of a part of this map, spanning from [xmin,ymin] to [xmax, ymax]
-        (both ends inclusive). 
-        """
-        newmap = super().getPart(area)._map
-        
-        # use raw original values to compute scalings
-        oldweight = sum(Map._getWeightsList(self._map))
-        if oldweight == 0:
-            newtaskp = 0
-        else:
-            newtaskp = self._taskProbability * sum(Map._getWeightsList(newmap)) / oldweight
-        return Map(newmap, newtaskp)
+        (both ends inclusive). As maps are immutable, the part is 
+        computed only once for each area.
+        """
+        key = tuple(array(area).flatten().tolist())
+        if key not in self._parts:
+            newmap = super().getPart(area)._map
+            
+            # use raw original values to compute scalings
+            oldweight = sum(self._cachedRawTaskWeights)
+            if oldweight == 0:
+                newtaskp = 0
+            else:
+                newtaskp = self._taskProbability * sum(Map._getWeightsList(newmap)) / oldweight
+            self._parts[key] = Map(newmap, newtaskp)
+        return self._parts[key]
     
@@ -0,0 +1,101 @@
+from aienvs.FactoryFloor.Map import Map
+from numpy import ndarray
+from numpy.random import random_sample
+
+
+class TaskSpawner():
+    """
+    Picks the positions for new tasks on a Map: a weighted random choice
+    among the task positions of the map, using the weights on the map.
+    If task overlap is not allowed, positions that already have a task
+    are excluded from the choice. This gives exactly the same distribution
+    as repeatedly choosing from all task positions until a free one is found,
+    but without the rejection loop.
+
+    The weights of the free task positions are kept in a
+    binary indexed (Fenwick) tree, so that picking a position and
+    marking a position as (un)occupied are O(log n).
+    The owner must call add and remove for every task that is added
+    or removed, to keep the spawner in sync with the tasks.
+    """
+
+    def __init__(self, map:Map, allowOverlap:bool, tasks:list=[]):
+        """
+        @param map the Map with the task positions and weights
+        @param allowOverlap true iff new tasks can be placed on positions
+        that already have a task
+        @param tasks the list of positions (x,y) of the tasks that are already on the map.
+        """
+        self._positions = map.getTaskPositions()
+        self._weights = map.getRawTaskWeights()
+        self._allowOverlap = allowOverlap
+        self._index = {(int(pos[0]), int(pos[1])): i for i, pos in enumerate(self._positions)}
+        self._counts = [0] * len(self._positions)
+
+        # tree[i] (1-based) holds the sum of the weights (i - lowbit(i), i]
+        n = len(self._weights)
+        self._tree = [0] + list(self._weights)
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                self._tree[parent] += self._tree[i]
+        self._total = sum(self._weights)
+        self._topbit = 1 << (n.bit_length() - 1) if n > 0 else 0
+
+        for pos in tasks:
+            self.add(pos)
+
+    def sample(self, rng=None) -> ndarray:
+        """
+        Draw a position for a new task.
+        @param rng the numpy random Generator to use, or None to use the global numpy random generator.
+        @return the position (x,y) of the new task, or None if there is no
+        free task position.
+        """
+        if self._total <= 0:
+            return None
+        remaining = (random_sample() if rng is None else rng.random()) * self._total
+        # find the first index where the cumulative weight exceeds remaining
+        index = 0
+        step = self._topbit
+        while step:
+            nextindex = index + step
+            if nextindex < len(self._tree) and self._tree[nextindex] <= remaining:
+                index = nextindex
+                remaining -= self._tree[index]
+            step >>= 1
+        return self._positions[index]
+
+    def add(self, pos, n:int=1):
+        """
+        Register n new tasks at given position
+        @param pos the position (x,y) of the task
+        """
+        i = self._index.get((int(pos[0]), int(pos[1])))
+        if i is None:
+            return
+        if self._counts[i] == 0 and not self._allowOverlap:
+            self._update(i, -self._weights[i])
+        self._counts[i] += n
+
+    def remove(self, pos, n:int=1):
+        """
+        Register that n tasks at given position were removed
+        @param pos the position (x,y) of the task
+        """
+        i = self._index.get((int(pos[0]), int(pos[1])))
+        if i is None:
+            return
+        self._counts[i] -= n
+        if self._counts[i] == 0 and not self._allowOverlap:
+            self._update(i, self._weights[i])
+
+    def _update(self, i:int, delta:int):
+        """
+        add delta to the weight of the position with index i
+        """
+        self._total += delta
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
@@ -17,6 +17,7 @@ import random
 from aienvs.gym.CustomObjectSpace import CustomObjectSpace
 from aienvs.GroupingRobots.WorldState import WorldState
 from aienvs.BasicMap import BasicMap
+from aienvs.utils import createRandomGenerators
 
 
 class GroupingRobots(Env):
@@ -61,7 +62,8 @@ class GroupingRobots(Env):
                     raise ValueError("position vector must be length 2 but got " + str(pos))
                 robot = Robot(robotId, array(pos))
             elif pos == 'random':
-                newpos = random.choice(self._state.getFreeWithoutRobot())
+                free = self._state.getFreeWithoutRobot()
+                newpos = free[self._rng.integers(len(free))]
                 robot = Robot(robotId, array(newpos))
             else:
                 raise ValueError("Unknown robot position, expected list but got " + str(type(pos)))
@@ -72,10 +74,7 @@ class GroupingRobots(Env):
 
     # Override
     def step(self, actions:dict):
-        for robot in self._state.getRobots():
-            rid = robot.getId()
-            if rid in actions.keys():
-                self._state = self._state.withAction(robot, actions[rid])
+        self._state = self._state.withActions(actions)
         global_reward = self._state.getReward()
 
         if self._doneOnFirstGrouping is True and global_reward > 0:
@@ -87,7 +86,7 @@ class GroupingRobots(Env):
             # in summary, only actually teleport when grouping happens and not done on step and time limit has not been reached
             done = (self._parameters['steps'] <= self._state.getSteps())
             if not done:
-                self._state = self._state.withTeleport()
+                self._state = self._state.withTeleport(self._rng)
 
         self._state = self._state.withStep()
         return self._state, global_reward, done, []
@@ -114,8 +113,13 @@ class GroupingRobots(Env):
 
     # Override
     def seed(self, seed):
-        # FIXME this is setting global seed, affecting everyone!
-        return random.seed(seed)
+        """
+        Seeds the own random generator of this env, the global random 
+        generators are not used.
+        @param seed the int seed, or None
+        """
+        self._parameters['seed'] = seed
+        self._rng, = createRandomGenerators(seed, 1)
 
     def getState(self) -> WorldState:
         return self._state
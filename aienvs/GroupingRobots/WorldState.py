@@ -5,16 +5,25 @@ from aienvs.GroupingRobots.Robot import Robot
 from numpy import array, ndarray, delete, array_equal
 from xml.etree.ElementPath import prepare_self
 import random
-from aienvs.utils import rm, hashf
+from aienvs.utils import hashf
+from collections import Counter
 
 from typing import TypeVar, Generic
 
+# position change for each action number, see WorldState.ACTIONS
+DELTAS = array([[0, -1], [0, 1], [-1, 0], [1, 0]])
+
 
 class WorldState:
     """
     The state of the GroupingRobots world.
     This is adding Robot's to the BasicMap.
     Immutable.
+    
+    For O(n) grouping and reward computations, the state keeps a Counter 
+    with the number of robots at each occupied cell, keyed by packed cell id
+    (see _cellId). It is created when first needed and then carried through
+    withRobot and withStep.
     """
     ACTIONS = {
         0: "UP",
@@ -33,6 +42,7 @@ class WorldState:
         self._robots = robots
         self._map = map
         self._steps = steps
+        self._counts = None
 
     # see PEP 484: WorldState not yet defined (geez), in that case use ''
     def withRobot(self, robot:Robot) -> 'WorldState':
@@ -43,24 +53,55 @@ class WorldState:
         """
         newrobots = self._robots.copy()
         newrobots.update({robot.getId(): robot})
-        return WorldState(newrobots, self._map, self._steps)
+        newstate = WorldState(newrobots, self._map, self._steps)
+        if self._counts is not None:
+            counts = self._counts.copy()
+            old = self._robots.get(robot.getId())
+            if old is not None:
+                WorldState._decrement(counts, _cellId(old.getPosition()))
+            counts[_cellId(robot.getPosition())] += 1
+            newstate._counts = counts
+        return newstate
     
     def withStep(self) -> 'WorldState':
         """
         Returns new state with the step counter incremented
         """
-        return WorldState(self._robots, self._map, self._steps + 1)
+        newstate = WorldState(self._robots, self._map, self._steps + 1)
+        newstate._counts = self._counts
+        return newstate
     
-    def withTeleport(self) -> 'WorldState':
+    def withTeleport(self, rng=None) -> 'WorldState':
         """
         New state where all grouped robots are teleported to random free position
         May throw if there are not enough free positions on the map
+        @param rng the numpy random Generator to use, or None to use the global random
         """
-        newstate = self
-        for robot in self.getGroupedRobots():
-            newpos = random.choice(newstate.getFreeWithoutRobot())
-            newstate = newstate.withRobot(Robot(robot.getId(), newpos))
-            
+        counts = self._getCounts()
+        grouped = [robot for robot in self._robots.values() if counts[_cellId(robot.getPosition())] > 1]
+        if not grouped:
+            return self
+
+        counts = counts.copy()
+        # the free cells without robot, in a list with index to remove in O(1)
+        free = [pos for pos in self._map.getMapPositions('.') if _cellId(pos) not in counts]
+        index = {_cellId(pos): i for i, pos in enumerate(free)}
+        newrobots = self._robots.copy()
+        for robot in grouped:
+            if len(free) == 0:
+                raise IndexError("There are no free positions to teleport to")
+            i = random.randrange(len(free)) if rng is None else int(rng.integers(len(free)))
+            newpos = free[i]
+            _removeAt(free, index, i)
+            counts[_cellId(newpos)] += 1
+            oldpos = robot.getPosition()
+            if WorldState._decrement(counts, _cellId(oldpos)) == 0 and self._map.get(oldpos) == '.':
+                index[_cellId(oldpos)] = len(free)
+                free.append(oldpos)
+            newrobots[robot.getId()] = Robot(robot.getId(), newpos)
+
+        newstate = WorldState(newrobots, self._map, self._steps)
+        newstate._counts = counts
         return newstate
     
     def withAction(self, robot:Robot, action:int) -> 'WorldState':
@@ -76,25 +117,51 @@ class WorldState:
             return self.withRobot(Robot(robot.getId(), newpos))
         return self
     
+    def withActions(self, actions:dict) -> 'WorldState':
+        """
+        All robots try to execute their action, in one pass.
+        Same result as calling withAction for each robot that has an action.
+        @param actions dict with robot ids as key and ACTION number as value.
+        Robots that are not in the dict do not move.
+        @return new State with the actions applied
+        """
+        robots = [robot for robot in self._robots.values() if robot.getId() in actions]
+        if not robots:
+            return self
+        acts = array([actions[robot.getId()] for robot in robots], dtype=int)
+        if (acts < 0).any() or (acts >= len(DELTAS)).any():
+            raise KeyError("Unknown action in " + str(actions))
+        positions = array([robot.getPosition() for robot in robots], dtype=int)
+        newpositions = positions + DELTAS[acts]
+        moved = self._map.isFree(newpositions).nonzero()[0]
+        if len(moved) == 0:
+            return self
+
+        newrobots = self._robots.copy()
+        counts = None if self._counts is None else self._counts.copy()
+        for i in moved:
+            robotId = robots[i].getId()
+            newrobots[robotId] = Robot(robotId, newpositions[i])
+            if counts is not None:
+                WorldState._decrement(counts, _cellId(positions[i]))
+                counts[_cellId(newpositions[i])] += 1
+        newstate = WorldState(newrobots, self._map, self._steps)
+        newstate._counts = counts
+        return newstate
+
     def getFreeWithoutRobot(self) -> array:
         """
         @return all positions that are free and do not contain robot.
         """
-        free = self._map.getMapPositions('.')
-        for robot in self._robots.values():
-            free = rm(free, robot.getPosition())
-        return free
+        counts = self._getCounts()
+        return [pos for pos in self._map.getMapPositions('.') if _cellId(pos) not in counts]
             
     def getGroupedRobots(self) -> set:
         """
         @return set of all robots that are in a group now
         """
-        robots = set()
-        for robot in self._robots.values():
-            for otherrobot in self._robots.values():
-                if robot != otherrobot and array_equal(robot.getPosition(), otherrobot.getPosition()):
-                    robots.add(robot)
-        return robots
+        counts = self._getCounts()
+        return set(robot for robot in self._robots.values() if counts[_cellId(robot.getPosition())] > 1)
 
     def isPossible(self, robot:Robot, action):
         """
@@ -131,17 +198,29 @@ class WorldState:
         of the rewards of all robots.
         Each robot gets a reward = #robots at its current position -1
         """
-        reward = 0
-        for robot in self._robots.values():
-            reward = reward + len(self._getRobotsAt(robot.getPosition())) - 1
-        return reward
+        # each of the n robots at a cell gets n-1
+        return sum(n * (n - 1) for n in self._getCounts().values())
             
-    def _getRobotsAt(self, pos:ndarray):
+    def _getCounts(self) -> Counter:
+        """
+        @return Counter with the number of robots at each occupied cell id.
+        Must not be modified.
+        """
+        if self._counts is None:
+            self._counts = Counter(_cellId(robot.getPosition()) for robot in self._robots.values())
+        return self._counts
+
+    @staticmethod
+    def _decrement(counts:Counter, cell:int) -> int:
         """
-        @return all robots at given position
+        Decrement the count of cell, removing the cell if it becomes 0
+        @return the new count of the cell
         """
-        return [robot for robot in self._robots.values() \
-                if array_equal(pos, robot.getPosition())]
+        counts[cell] -= 1
+        if counts[cell] == 0:
+            del counts[cell]
+            return 0
+        return counts[cell]
 
     def _newPos(self, pos:ndarray, action):
         """
@@ -167,4 +246,26 @@ class WorldState:
 
     def __hash__(self) -> int:
         return hashf(self._robots) + hashf(self._map) + hashf(self._steps)
-    
+
+
+def _cellId(pos) -> int:
+    """
+    @param pos the (x,y) position, x and y in [0, 2^32>
+    @return a single int identifying the position. 
+    Independent of the map size, so it can be used without knowing the map.
+    """
+    return (int(pos[0]) << 32) | int(pos[1])
+
+
+def _removeAt(items:list, index:dict, i:int):
+    """
+    Remove item i from items in O(1) by moving the last item to position i
+    @param items the list of positions
+    @param index dict from cell id of each position in items to its index in items
+    @param i the index of the item to remove
+    """
+    last = items.pop()
+    del index[_cellId(items[i] if i < len(items) else last)]
+    if i < len(items):
+        items[i] = last
+        index[_cellId(last)] = i
@@ -1,4 +1,4 @@
-from numpy import array, ndarray
+from numpy import array, ndarray, array_equal
 from numpy.linalg import norm
 
 
@@ -63,7 +63,7 @@ class MovableItemOnMap:
         return MovableItemOnMap(self._id, newpos, self._active)
     
     def __eq__(self, other):
-        return self._id == other._id and self._pos == other._pos 
+        return self._id == other._id and array_equal(self._pos, other._pos) 
 
     def __str__(self):
      """
@@ -1,13 +1,11 @@
 import logging
 from gym import spaces
-from gym.spaces import Dict, MultiBinary, Tuple
+from gym.spaces import Box, Dict, MultiBinary, Tuple
 from aienvs.Environment import Env
-from numpy import set_printoptions, transpose, zeros
+from numpy import set_printoptions, transpose, zeros, uint8
 from numpy import array, dstack, ndarray
 import copy
 from random import Random
-from numpy.random import seed as npseed
-from numpy.random import choice as weightedchoice
 import time
 import random
 import pdb
@@ -18,6 +16,7 @@ from aienvs.PredatorPrey.PredatorPreyState import PredatorPreyState
 from aienvs.PredatorPrey.Predator import Predator
 from aienvs.PredatorPrey.Prey import Prey
 from typing import List
+from aienvs.utils import createRandomGenerators
 
 USE_PossibleActionsSpace = False
 
@@ -56,6 +55,12 @@ class PredatorPreyEnv(Env):
     * map: the BasicMap on which the game is played, see BasicMap.
     * returnRealState: if True, step returns the real state object.
         if False, step returns a gym state
+    * observationRadius: the number of positions a predator can see in
+        each direction. Defaults to 2, giving the 5x5 area of the paper.
+    * dictObservation: if True, the gym state is a dict with for each predator
+        3 lists of lists, as in PredatorPreyState#getObservationMatrix.
+        If False (default), the gym state is a (n_predators, 3, D, D) uint8 array
+        with D=2*observationRadius+1, see PredatorPreyState#getObservationArray.
     """
     DEFAULT_PARAMETERS = {'steps':200,
                 'p':0,
@@ -63,6 +68,8 @@ class PredatorPreyEnv(Env):
                 'preys':[ {'id': "prey1", 'pos':[7, 1]}, {'id': "prey2", 'pos': [1, 1]}],  # initial prey positions
                 'seed':None,
                 'returnRealState':False,
+                'observationRadius':2,
+                'dictObservation':False,
                 'map':['..........',
                        '..........',
                        '..........',
@@ -107,15 +114,12 @@ class PredatorPreyEnv(Env):
         if self._parameters['returnRealState']:
             return s, s.getReward(), s.isFinal(), []
         else:
-            return s.getObservationMatrix(), s.getReward(), s.isFinal(), []
+            return self._getObservation(), s.getReward(), s.isFinal(), []
     
     def _step(self, actions:dict):
         if(self._state.isFinal()) or (not actions):
             return 
-        self._catch(actions)
-        self._stepPredators(actions)
-        self._stepPreys()
-        self._state = self._state.increment()
+        self._state = self._state.withJointStep(actions, self._drawPreyActions(self._state, self._rng), self._parameters['p'])
     
     def reset(self):
         self.__init__(self._parameters)
@@ -140,10 +144,13 @@ class PredatorPreyEnv(Env):
 
     # Override
     def seed(self, seed):
+        """
+        Seeds the own random generators of this env, the global random 
+        generators are not used. simulate uses a separate stream.
+        @param seed the int seed, or None
+        """
         self._parameters['seed'] = seed
-        if isinstance(self._parameters['seed'], numbers.Number):
-            npseed(self._parameters['seed'])
-        random.seed(seed)
+        self._rng, self._simulationRng = createRandomGenerators(seed, 2)
 
     def getState(self) -> PredatorPreyState:
         return self._state
@@ -151,21 +158,43 @@ class PredatorPreyEnv(Env):
     def setState(self, newState:PredatorPreyState):
         self._state = newState  # no copy needed, immutable
 
+    def simulate(self, state:PredatorPreyState, actions:dict, rng=None):
+        """
+        Do a step from given state, without changing this env or the
+        global random generators. For tree search agents: states are
+        immutable and hashable so they can be shared and deduplicated.
+        @param state the state to start from
+        @param actions dict with for each active predator id the action
+        @param rng the numpy random Generator to draw the prey moves from. If None, 
+        a Generator owned by this env, seeded with the 'seed' parameter, is used.
+        @return tuple (new state, the reward of this step)
+        """
+        if state.isFinal() or not actions:
+            return state, 0
+        if rng is None:
+            rng = self._simulationRng
+        preyActions = self._drawPreyActions(state, rng)
+        newstate = state.withJointStep(actions, preyActions, self._parameters['p'])
+        return newstate, newstate.getReward() - state.getReward()
+
     @property
     def observation_space(self):
         """
-        If returnRealSpace=true, the observation is simply the full state.
-        if falsle each entity receives as observation 3 5x5 binary matrices. 
-        Refer to PredatorPreyState#getStateMatrix for details.
+        If returnRealState=true, the observation is simply the full state.
+        if false each entity receives as observation 3 DxD binary matrices. 
+        Refer to PredatorPreyState#getObservationArray for details.
         """
-        if self._parameters['returnRealSpace']:
+        size = 2 * self._parameters['observationRadius'] + 1
+        if self._parameters['returnRealState']:
             return CustomObjectSpace(self._state);
-        else:
-            mb = MultiBinary(5)  # 5x1 binary matrix
-            mbs = Tuple(mb, mb, mb, mb, mb)  # 5 of them for 5x5 binary
-            entityobs = Tuple(mbs, mbs, mbs)  # an obs is 3 5x5 matrices
+        elif self._parameters['dictObservation']:
+            mb = MultiBinary(size)  # Dx1 binary matrix
+            mbs = Tuple([mb] * size)  # D of them for DxD binary
+            entityobs = Tuple([mbs, mbs, mbs])  # an obs is 3 DxD matrices
             return Dict ({ pred.getId() : entityobs \
                            for pred in self._state.getPredators()})
+        else:
+            return Box(0, 1, (len(self._state.getPredators()), 3, size, size), dtype=uint8)
         
     @property
     def action_space(self):
@@ -184,43 +213,21 @@ class PredatorPreyEnv(Env):
 
     ########## Private functions ##########################
 
-    def _stepPreys(self):
-        """
-        Let the active preys make their step
-        """
-        for prey in self._state.getPreys() :
-            if prey.isActive():
-                self._state = self._state.withPreyStep(prey, random.choice(range(4)))
-    
-    def _stepPredators(self, actions:dict):
+    def _getObservation(self):
         """
-        Do the actions of all active predators and update state accordingly.
-        actions of inactive predators are ignored.
-        It is assumed that all succesful 'catch' actions of predators
-        have been executed already. So predators that are still here
-        and do a 'catch' missed the prey and get penalized.
-        @param actions a dict, keys are predator ids and actions are int ACTIONS.
+        @return the gym state, see observation_space
         """
-        for predator in self._state.getPredators() :
-            if not predator.isActive():
-                continue
-            act = actions[predator.getId()]
-            if self.ACTIONS[act] == 'CATCH':
-                # note, negative reward.
-                self._state = self._state.withReward(self._parameters['p'])
-            else:  # a step action. 
-                self._state = self._state.withStep(predator, act)
-
-    def _catch(self, actions:dict):
+        if self._parameters['dictObservation']:
+            return self._state.getObservationMatrix(self._parameters['observationRadius'])
+        return self._state.getObservationArray(self._parameters['observationRadius'])
+
+    def _drawPreyActions(self, state:PredatorPreyState, rng) -> dict:
         """
-        Removes all caught prey and their predators from state
+        @param state the current state
+        @param rng the numpy random Generator to use
+        @return dict with for each active prey id a random move in [0,3],
+        all drawn at once.
         """
-        # Copy the list as we are going to modify state
-        preys = self._state.getPreys() 
-        for prey in preys: 
-            adjacent = self._state.getAdjacentPredators(prey.getPosition())
-            adjacent = list(filter(lambda adj: self.ACTIONS[actions[adj.getId()]] == 'CATCH', adjacent))
-            if len(adjacent) >= 2:
-                # remove prey and first two that catch it 
-                self._state = self._state.withCatch(prey, adjacent[0], adjacent[1]) 
-    
+        preys = [prey for prey in state.getPreys() if prey.isActive()]
+        moves = rng.integers(4, size=len(preys))
+        return {prey.getId(): int(move) for prey, move in zip(preys, moves)}
@@ -1,10 +1,14 @@
-from numpy import array, ndarray, array_equal
+from numpy import array, ndarray, zeros, uint8, int32
+from numpy.lib.stride_tricks import sliding_window_view
 from typing import List
 from aienvs.PredatorPrey.Predator import Predator
 from aienvs.PredatorPrey.Prey import Prey
 from aienvs.BasicMap import BasicMap
 from aienvs.PredatorPrey.MovableItemOnMap import MovableItemOnMap
 
+# the catch action, see PredatorPreyEnv.ACTIONS
+CATCH = 4
+
 
 class PredatorPreyState():
     """
@@ -14,6 +18,15 @@ class PredatorPreyState():
     
     NOTICE the equals function uses ALL fields and therefore 
     might not be appropriate for learning.
+    States are hashable, so they can be used in a transposition table.
+    The hash and equals use the compact key from getKey.
+    
+    For O(1) position queries the state also keeps two occupancy grids,
+    with at [x,y] the number of predators resp. preys at that position.
+    The predators and preys are kept in tuples and the grids are read-only, 
+    so new states share everything that did not change with the state they 
+    were derived from. Use withJointStep to do a complete env step
+    in one transition.
     """
 
     def __init__(self, predatorsList:List[Predator], preyList:List[Prey], themap:BasicMap, r:float, s:int, maxs: int):
@@ -25,21 +38,25 @@ class PredatorPreyState():
         @param s the current step count
         @param maxs the max number of steps 
         """
-        self._predators = predatorsList.copy()
-        self._preys = preyList.copy()
+        self._predators = tuple(predatorsList)
+        self._preys = tuple(preyList)
         self._map = themap
         self._reward = r
         self._step = s
         self._maxsteps = maxs
+        self._predatorGrid = self._createGrid(self._predators)
+        self._preyGrid = self._createGrid(self._preys)
+        self._key = None
+        self._hash = None
 
     def getMap(self) -> BasicMap:
         return self._map
     
     def getPredators(self) -> List[Predator]:
-        return self._predators.copy()
+        return list(self._predators)
     
     def getPreys(self) -> List[Prey]:
-        return self._preys.copy()
+        return list(self._preys)
     
     def getReward(self):
         """
@@ -47,34 +64,69 @@ class PredatorPreyState():
         """
         return self._reward
     
-    def getObservationMatrix(self):
+    def getObservationMatrix(self, radius:int=2):
         """
+        @param radius the number of positions the predators can see in each direction
         @return a gym-style dict with for each entity (predator) 
-        a 3x5x5 matrix, containing the observations for all predators. 
-        See _getPredatorObsMatrix for more details on each 3x5x5 matrix
+        a 3x5x5 matrix (as list of lists), containing the observations for all predators. 
+        See getObservationArray for more details on each 3x5x5 matrix
+        """
+        observations = self.getObservationArray(radius).tolist()
+        return { pred.getId(): obs for pred, obs in zip(self._predators, observations)}
+
+    def getObservationArray(self, radius:int=2) -> ndarray:
+        """
+        @param radius the number of positions the predators can see in each direction.
+        The observed area is then D x D with D=2*radius+1, 5x5 for the default radius.
+        @return (n_predators, 3, D, D) uint8 array with the observations of the 
+        predators, in the order of getPredators. 
+        Each DxD matrix represents the DxD area around the predator, in 
+        the top-left to bottom-right. So first line in the matrix
+        is the NW to NE content. The last row the SW to SE content.
+        The center position in the matrix [radius,radius] represents the 
+        position of the predator himself.
+        The first matrix contains a 1 at positions where there is a
+        predator on the map.
+        The second matrix contains 1 at positions where there is a 
+        prey on the map
+        The third matrix contains 1 at positions where there is an 
+        obstacle on the map, eg a wall or edge of the map.
         """
-        return { pred.getId(): self._getPredatorObsMatrix(pred)\
-                for pred in self._predators}
+        size = 2 * radius + 1
+        width, height = self._predatorGrid.shape
+        # the padded grids, channels predators, preys, obstacles
+        padded = zeros((3, width + 2 * radius, height + 2 * radius), dtype=uint8)
+        padded[2] = 1
+        padded[0, radius:radius + width, radius:radius + height] = self._predatorGrid > 0
+        padded[1, radius:radius + width, radius:radius + height] = self._preyGrid > 0
+        padded[2, radius:radius + width, radius:radius + height] = ~self._map.getFreeGrid()
+        if len(self._predators) == 0:
+            return zeros((0, 3, size, size), dtype=uint8)
+
+        # windows[c,x,y] is the (size,size) area with [x,y] top left, indexed [dx,dy]
+        windows = sliding_window_view(padded, (size, size), axis=(1, 2))
+        positions = array([pred.getPosition() for pred in self._predators])
+        # padding shifts the map by radius, so window at pos has pos in the center
+        return windows[:, positions[:, 0], positions[:, 1]].transpose(1, 0, 3, 2)
     
     def isPredatorAt(self, pos:ndarray) -> bool:
         """
         @return true iff there is a predator at given position
         """
-        return any(map(lambda pred: array_equal(pred.getPosition(), pos), self._predators))
+        return self._isSetAt(self._predatorGrid, pos)
 
     def isPreyAt(self, pos:ndarray):
         """
         @return true iff there is a prey at given position
         """
-        return any(map(lambda prey: array_equal(prey.getPosition(), pos), self._preys))
+        return self._isSetAt(self._preyGrid, pos)
 
     def getAdjacentPredators(self, pos:ndarray) -> List[Predator]:
         """
         @param pos a ndarray with some [x,y] position on the map
         @return all active predators that are directly N,E,S or W from given pos
         """
-        return list(filter(lambda pred: pred.isAdjacent(pos) and pred.isActive(), \
-                       self.getPredators()))
+        return [pred for pred in self._predators if pred.isAdjacent(pos) and pred.isActive()]
 
     def withCatch(self, prey:Prey, catcher1:Predator, catcher2:Predator) -> 'PredatorPreyState':
         """
@@ -92,8 +144,11 @@ class PredatorPreyState():
         newpreds = self.getPredators()
         newpreds.remove(catcher1)
         newpreds.remove(catcher2)
-        return PredatorPreyState(newpreds, newpreys, self._map, \
-            self._reward + 10, self._step, self._maxsteps)
+        predatorGrid = self._predatorGrid.copy()
+        preyGrid = self._preyGrid.copy()
+        for item, grid in [(prey, preyGrid), (catcher1, predatorGrid), (catcher2, predatorGrid)]:
+            grid[tuple(item.getPosition())] -= 1
+        return self._derive(newpreds, newpreys, self._reward + 10, self._step, predatorGrid, preyGrid)
         
     def withReward(self, reward:float) -> 'PredatorPreyState':
         """
@@ -101,8 +156,7 @@ class PredatorPreyState():
         """
         if self.isFinal():
             return self
-        return PredatorPreyState(self._predators, self._preys, self._map, \
-            self._reward + reward, self._step, self._maxsteps) 
+        return self._derive(self._predators, self._preys, self._reward + reward, self._step)
         
     def withStep(self, pred: Predator, act: int) -> 'PredatorPreyState':
         """
@@ -111,9 +165,11 @@ class PredatorPreyState():
         @return new PredatorPreyState with move executed if the new pos is free
         """
         newpred = self._withStep(pred, act)
+        if newpred is pred:
+            return self
         preds = [newpred if p.getId() == newpred.getId() else p for p in self._predators]
-        return PredatorPreyState(preds, self._preys, self._map, \
-            self._reward, self._step, self._maxsteps) 
+        return self._derive(preds, self._preys, self._reward, self._step, \
+            self._movedGrid(self._predatorGrid, pred, newpred), self._preyGrid)
 
     def withPreyStep(self, prey: Prey, act: int) -> 'PredatorPreyState':
         """
@@ -121,9 +177,11 @@ class PredatorPreyState():
         @act an action in [0,3] moving N,E,S or W. 
         """
         newprey = self._withStep(prey, act)
+        if newprey is prey:
+            return self
         preys = [newprey if p.getId() == newprey.getId() else p for p in self._preys]
-        return PredatorPreyState(self._predators, preys, self._map, \
-            self._reward, self._step, self._maxsteps) 
+        return self._derive(self._predators, preys, self._reward, self._step, \
+            self._predatorGrid, self._movedGrid(self._preyGrid, prey, newprey))
         
     def _withStep(self, item:MovableItemOnMap, act:int):
         """
@@ -132,13 +190,58 @@ class PredatorPreyState():
         @act an action in [0,3] moving N,E,S or W. 
         @return item on new place if place is free, or item on old place if not
         """
-        newitem = item.withStep(act)
-        newpos = newitem.getPosition()
-        
-        if self.isPredatorAt(newpos) or self.isPreyAt(newpos)\
-            or not self._map.isFree(newpos):
-            return item
-        return newitem
+        return self._moved(item, act, self._predatorGrid, self._preyGrid)
+
+    def withJointStep(self, actions:dict, preyActions:dict, p:float=0) -> 'PredatorPreyState':
+        """
+        Do a complete step of the env in one transition, with the 
+        same result as doing the catches (withCatch), the predator steps 
+        (withStep or withReward(p) for failed catches) and the prey steps
+        (withPreyStep) one by one, followed by increment.
+        @param actions dict with for each active predator id the action, see
+        PredatorPreyEnv.ACTIONS. 4 is catch.
+        @param preyActions dict with for each prey id an action in [0,3].
+        Preys that are not in the dict do not move.
+        @param p the reward (punishment) for predators that catch without success
+        @return the new PredatorPreyState, or this if this is final.
+        """
+        if self.isFinal():
+            return self
+        predators = list(self._predators)
+        preys = list(self._preys)
+        predatorGrid = self._predatorGrid.copy()
+        preyGrid = self._preyGrid.copy()
+        reward = self._reward
+
+        for prey in self._preys:
+            if not any(pred.isActive() for pred in predators):
+                break
+            adjacent = [pred for pred in predators if pred.isAdjacent(prey.getPosition()) \
+                        and pred.isActive() and actions[pred.getId()] == CATCH]
+            if len(adjacent) >= 2:
+                preys.remove(prey)
+                predators.remove(adjacent[0])
+                predators.remove(adjacent[1])
+                for item, grid in [(prey, preyGrid), (adjacent[0], predatorGrid), (adjacent[1], predatorGrid)]:
+                    grid[tuple(item.getPosition())] -= 1
+                reward += 10
+
+        for i, pred in enumerate(predators):
+            if not pred.isActive():
+                continue
+            act = actions[pred.getId()]
+            if act == CATCH:
+                reward += p
+            else:
+                predators[i] = self._moved(pred, act, predatorGrid, preyGrid, predatorGrid)
+
+        for i, prey in enumerate(preys):
+            if prey.isActive() and prey.getId() in preyActions:
+                preys[i] = self._moved(prey, preyActions[prey.getId()], predatorGrid, preyGrid, preyGrid)
+
+        # as increment, the step counter stays if the state became final
+        step = self._step + 1 if any(pred.isActive() for pred in predators) else self._step
+        return self._derive(predators, preys, reward, step, predatorGrid, preyGrid)
         
     def increment(self) -> 'PredatorPreyState':
         """
@@ -147,8 +250,7 @@ class PredatorPreyState():
         """
         if self.isFinal():
             return self
-        return PredatorPreyState(self._predators, self._preys, self._map, \
-                                 self._reward, self._step + 1, self._maxsteps)
+        return self._derive(self._predators, self._preys, self._reward, self._step + 1)
     
     def isFinal(self) -> bool:
         """
@@ -159,44 +261,108 @@ class PredatorPreyState():
         activePredator = any([predator.isActive() for predator in self._predators])
         return (not activePredator) or self._step >= self._maxsteps
 
-    def _getPredatorObsMatrix(self, pred:Predator):
+    def _derive(self, predators:list, preys:list, reward:float, step:int, \
+                predatorGrid:ndarray=None, preyGrid:ndarray=None) -> 'PredatorPreyState':
         """
-        @param pred the predator to get obs matrix for
-        @return the observation matrix (3x5x5) of given predator.
-        Each 5x5 matrix represents the 5x5 area around the entity, in 
-        the top-left to bottom-right. So first line in the matrix
-        is the NW to NE content. The last row the SW to SE content.
-        The center position in the matrix (3,3) represents the 
-        position of the predator himself.
-        The first matrix contains a 1 at positions where there is a
-        predator on the map.
-        The second matrix contains 1 at positions where there is a 
-        prey on the map
-        The third matrix contains 1 at positions where there is an 
-        obstacle on the map, eg a wall or edge of the map.
-        The full obs space is a dict with a 3x5x5 matrix for each predator. 
-
-        """
-        predmap = [ [0] * 5 for row in range(5)]
-        preymap = [ [0] * 5 for row in range(5)]
-        obstmap = [ [0] * 5 for row in range(5)]
-        mypos = pred.getPosition()
-        for x in range(0, 5):
-            for y in range(0, 5):
-                pos = array([x - 2, y - 2]) + mypos
-                if not self._map.isFree(pos):
-                    obstmap[y][x] = 1
-                if self.isPredatorAt(pos):
-                    predmap[y][x] = 1
-                if self.isPreyAt(pos):
-                    preymap[y][x] = 1
-                    
-        return [predmap, preymap, obstmap]
+        Create a new state with the same map and max steps as this. 
+        The given lists and grids are used as is, so they must not be 
+        modified afterwards.
+        @param predatorGrid the occupancy grid of the predators, or None 
+        to share the grid of this state.
+        @param preyGrid the occupancy grid of the preys, or None 
+        to share the grid of this state.
+        """
+        state = PredatorPreyState.__new__(PredatorPreyState)
+        state._predators = tuple(predators)
+        state._preys = tuple(preys)
+        state._map = self._map
+        state._reward = reward
+        state._step = step
+        state._maxsteps = self._maxsteps
+        state._predatorGrid = self._predatorGrid if predatorGrid is None else predatorGrid
+        state._preyGrid = self._preyGrid if preyGrid is None else preyGrid
+        state._predatorGrid.flags.writeable = False
+        state._preyGrid.flags.writeable = False
+        state._key = None
+        state._hash = None
+        return state
+
+    def _createGrid(self, items:List[MovableItemOnMap]) -> ndarray:
+        """
+        @return read-only (W,H) grid with the number of items at each position
+        """
+        grid = zeros((self._map.getWidth(), self._map.getHeight()), dtype=uint8)
+        for item in items:
+            if self._map.isInside(item.getPosition()):
+                grid[tuple(item.getPosition())] += 1
+        grid.flags.writeable = False
+        return grid
+
+    def _moved(self, item:MovableItemOnMap, act:int, predatorGrid:ndarray, preyGrid:ndarray, \
+               grid:ndarray=None) -> MovableItemOnMap:
+        """
+        Move item with requested act and check that the new place is free.
+        @param item the item to move
+        @param act an action in [0,3] moving N,E,S or W. 
+        @param predatorGrid the predator occupancy to check 
+        @param preyGrid the prey occupancy to check
+        @param grid the grid to update if the item moves, or None
+        @return item on new place if place is free, or item on old place if not
+        """
+        newitem = item.withStep(act)
+        newpos = newitem.getPosition()
+        if self._isSetAt(predatorGrid, newpos) or self._isSetAt(preyGrid, newpos)\
+            or not self._map.isFree(newpos):
+            return item
+        if grid is not None:
+            grid[tuple(item.getPosition())] -= 1
+            grid[tuple(newpos)] += 1
+        return newitem
+
+    def _movedGrid(self, grid:ndarray, item:MovableItemOnMap, newitem:MovableItemOnMap) -> ndarray:
+        """
+        @return copy of grid with item moved to the position of newitem
+        """
+        grid = grid.copy()
+        grid[tuple(item.getPosition())] -= 1
+        grid[tuple(newitem.getPosition())] += 1
+        return grid
+
+    def _isSetAt(self, grid:ndarray, pos:ndarray) -> bool:
+        """
+        @return true iff the grid is non-zero at pos. False if pos is outside the grid
+        """
+        x, y = int(pos[0]), int(pos[1])
+        return 0 <= x < grid.shape[0] and 0 <= y < grid.shape[1] and grid[x, y] > 0
+
+    def getKey(self) -> tuple:
+        """
+        @return a canonical key for this state: the step, the reward, 
+        and for predators and preys their ids, packed positions and packed 
+        active flags. The map and max steps are not in the key.
+        Computed once and cached.
+        """
+        if self._key is None:
+            self._key = (self._step, self._reward) + _packItems(self._predators) + _packItems(self._preys)
+        return self._key
 
     def __eq__(self, other):
-        return self._predators == other._predators \
-            and self._preys == other._preys \
-            and self._map == other._map \
-            and self._reward == other._reward \
-            and self._step == other._step
+        return isinstance(other, PredatorPreyState) \
+            and self.getKey() == other.getKey() \
+            and self._map == other._map
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(self.getKey())
+        return self._hash
+
+
+def _packItems(items:tuple) -> tuple:
+    """
+    @param items tuple of MovableItemOnMap
+    @return tuple with the ids, the positions as bytes and the active flags as bytes
+    """
+    positions = array([item.getPosition() for item in items], dtype=int32).reshape(-1, 2)
+    active = array([item.isActive() for item in items], dtype=bool)
+    return (tuple(item.getId() for item in items), positions.tobytes(), active.tobytes())
             
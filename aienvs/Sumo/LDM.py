@@ -4,6 +4,9 @@ import logging
 import numpy as np
 import string
 
+# the map value added for each light head, by light state character
+LIGHT_VALUES = {'G':0.8, 'g':0.8, 'y':0.5, 'r':0.2}
+
 class ldm():
     '''
     An LDM (Local Dynamic Map) module contains the positions and other state attributes of dynamic objects
@@ -14,6 +17,16 @@ class ldm():
 
     Public methods: getMapSliceByCorners( bottomLeftCoords, topRightCoords )
     getMapSliceByCenter( self, centerCoords, widthInMeters, heightInMeters )
+
+    The subscribed vehicle variables are kept in a columnar vehicle table,
+    updated every step: the vehicle ids and one float array per variable
+    (x, y, speed, allowed speed, waiting time), row i holding vehicle i.
+    Filtering and rewards are computed with numpy over these columns.
+
+    The map is one preallocated buffer. Each step only the cells that were
+    set in the previous step are cleared, and vehicles and lights are added
+    for all positions at once. With setRasterWindow only a window of the
+    map is rasterized.
     '''
 
     def __init__(self, using_libsumo=True):
@@ -32,6 +45,8 @@ class ldm():
                              "please declare it (e.g. in ~/.bashrc).")
         # should be added once only, otherwise multiple step listeners are created
         self._lightids={}
+        self._arrayMap = None
+        self._rasterWindowMeters = None
 
 
     #TODO: Wouter: change all verbose prints to logging
@@ -56,8 +71,17 @@ class ldm():
         self._waitingPenalty = waitingPenalty
         self.new_reward = new_reward
         self.subscribedVehs=[]
+        # number of each vehicle that was ever seen, to index the per vehicle history arrays
+        self._vehicleNumbers = {}
+        self._lastSpeeds = np.zeros(0)
+        self._speedFactorSums = np.zeros(0)
+        self._speedFactorCounts = np.zeros(0, dtype=int)
+        self._updateVehicleTable({})
+        self._subscribeToSimulation()
+        # vehicles that are already in the simulation did not depart in a step of this ldm
+        for vehID in self.SUMO_client.vehicle.getIDList():
+            self._addVehicleSubscription(vehID)
 
-        self._vehSpeeds = {}
 
     def start(self, sumoCmd:list, PORT:9001):
         """
@@ -81,36 +105,27 @@ class ldm():
         except self.SUMO_client.TraCIException as exc:
             logging.error(str(exc) + str(" This is some problem of libsumo, but everything still seems to work correctly"))
 
-        self.subscribedVehs = list(self.SUMO_client.vehicle.getIDList())
-        for vehID in self.subscribedVehs:
-            self._addVehicleSubscription(vehID)
-
-        self.subscriptionResults={}
-
-        for vehID in self.subscribedVehs:
-            subscriptionResult = self.SUMO_client.vehicle.getSubscriptionResults(vehID)
-            logging.debug("Subscription result: veh: " + vehID + str(subscriptionResult))
-            if( subscriptionResult and vehID in self.SUMO_client.vehicle.getIDList() ):
-                self.subscriptionResults.update({vehID:subscriptionResult})
-            else:
-                self.subscribedVehs.remove(vehID)
+        # only vehicles that departed in this step need a new subscription,
+        # subscriptions of arrived vehicles are removed by SUMO
+        self._subscribeToNewVehicles()
 
+        # the results of all subscribed vehicles, in one call
+        self._updateVehicleTable(self.SUMO_client.vehicle.getAllSubscriptionResults())
+        logging.debug("Subscription results: " + str(len(self.subscribedVehs)) + " vehicles")
 
         self._resetMap()
 
-        if( len(self.subscriptionResults.keys())>0 ):
-            self._updateMapWithVehicles( self._getVehiclePositions(self.subscriptionResults) )
+        if( len(self.subscribedVehs)>0 ):
+            self._updateMapWithVehicles( self._getVehiclePositions() )
 
-        tlState = {}
-        for lightid in self._lightids:
-    	    tlState[lightid] = self.SUMO_client.trafficlight.getSubscriptionResults(lightid)
+        tlState = self.SUMO_client.trafficlight.getAllSubscriptionResults()
 
         self._updateTrafficLights(tlState)
 
         if(self._lightids != None):
             for lightid in self._lightids:
                 if(self._tlPositions.get(lightid) != None):
-                    self._add_stop_lights(self._lightstate[lightid], list(self._tlPositions.get(lightid)) )
+                    self._add_stop_lights(self._lightstate[lightid], self._tlPositions.get(lightid) )
         return True
 
 
@@ -130,61 +145,56 @@ class ldm():
 
 
     def getRewardByCorners(self, bottomLeftCoords, topRightCoords, local_rewards, reward_range, function):
-
+        """
+        @param bottomLeftCoords, topRightCoords the corners of the box, its centre is the centre of the local rewards
+        @param local_rewards true to only reward the vehicles within radius of the centre
+        @param reward_range list of radii (or None for all vehicles)
+        @param function the name of the reward function
+        @return dict with the reward for each radius in reward_range.
+        Vehicles within a radius are those with Chebyshev distance to the centre
+        at most radius, so that the reward of each radius is a prefix sum of
+        the vehicle rewards sorted by that distance.
+        """
         c0 = bottomLeftCoords[0] + 0.5 * (topRightCoords[0] - bottomLeftCoords[0])
         c1 = bottomLeftCoords[1] + 0.5 * (topRightCoords[1] - bottomLeftCoords[1])
-        # print(c0, c1)
 
-        rewards = {}
+        radii = np.array([radius if local_rewards and radius is not None else np.inf for radius in reward_range], dtype=float)
+        distances = np.maximum(np.abs(self._vehicleX - c0), np.abs(self._vehicleY - c1))
+        order = np.argsort(distances, kind='stable')
+        counts = np.searchsorted(distances[order], radii, side='right')
 
-        for radius in reward_range:
-            vehicles = self.subscriptionResults
-            filteredVehicles = vehicles.copy()
-            if local_rewards and radius is not None:
-                for vehID in vehicles:
-                    position = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_POSITION)
-
-                    if(position[0] < c0 - radius):
-                        filteredVehicles.pop(vehID)
-                        continue
-                    if(position[0] > c0 + radius):
-                        filteredVehicles.pop(vehID)
-                        continue
-                    if(position[1] < c1 - radius):
-                        filteredVehicles.pop(vehID)
-                        continue
-                    if(position[1] > c1 + radius):
-                        filteredVehicles.pop(vehID)
-                        continue
-
-            rewards[radius] = self._computeReward(filteredVehicles, function)
+        if function == "eval":
+            # eval is an average over the history of all vehicles, not a sum
+            return { radius:self._computeEvalRewards(order[:count]) for radius, count in zip(reward_range, counts) }
+
+        if function == "elise":
+            vehicleRewards = self._getVehicleRewardsElise()
+            lightPenalty = self._getLightPenaltyElise()
+            self._updateLastSpeeds(order[:counts.max(initial=0)])
+        else:
+            vehicleRewards = self._getVehicleRewardsDefault()
+            lightPenalty = 0
+        prefixSums = np.concatenate([[0.], np.cumsum(vehicleRewards[order])])
+
+        rewards = {}
+        for radius, count in zip(reward_range, counts):
+            if count == 0:
+                logging.debug("No vehicles, returning 0 reward")
+                rewards[radius] = 0
+            else:
+                rewards[radius] = float(prefixSums[count] + lightPenalty)
         return rewards
 
     def getRewardByCenter( self, centerCoords, widthInMeters, heightInMeters ):
-        vehicles = self.subscriptionResults
-        filteredVehicles = vehicles.copy()
-        for vehID in vehicles:
-            position = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_POSITION)
-
-            if(position[0] < centerCoords[0] - heightInMeters/2.):
-                filteredVehicles.pop(vehID)
-                continue
-            if(position[0] > centerCoords[0] + heightInMeters/2.):
-                filteredVehicles.pop(vehID)
-                continue
-            if(position[1] < centerCoords[1] - widthInMeters/2.):
-                filteredVehicles.pop(vehID)
-                continue
-            if(position[1] > centerCoords[0] + widthInMeters/2.):
-                filteredVehicles.pop(vehID)
-                continue
-
-        return self._computeReward( filteredVehicles )
+        selection = self._getVehiclesInBox( (centerCoords[0] - heightInMeters/2., centerCoords[1] - widthInMeters/2.),
+                                            (centerCoords[0] + heightInMeters/2., centerCoords[0] + widthInMeters/2.) )
+        return self._computeReward( selection, "default" )
 
     def getMapSliceByCorners( self, bottomLeftCoords, topRightCoords ):
         bottomLeftMatrixCoords = self._coordMetersToArray( bottomLeftCoords )
         topRightMatrixCoords = self._coordMetersToArray( topRightCoords )
-        return self._arrayMap[bottomLeftMatrixCoords[0]:(topRightMatrixCoords[0]), bottomLeftMatrixCoords[1]:(topRightMatrixCoords[1])].transpose()[::-1]
+        # copy, the map buffer is reused in the next step
+        return self._arrayMap[bottomLeftMatrixCoords[0]:(topRightMatrixCoords[0]), bottomLeftMatrixCoords[1]:(topRightMatrixCoords[1])].transpose()[::-1].copy()
 
     def getMapSliceByCenter( self, centerCoords, widthInMeters, heightInMeters ):
         bottomLeftCoords = (centerCoords[0] - widthInMeters/2., centerCoords[1] - heightInMeters/2.)
@@ -199,6 +209,21 @@ class ldm():
     def setResolutionInMetersPerPixel( self, metersPerPixelWidth, metersPerPixelHeight ):
         self.setResolutionInPixelsPerMeter( 1./metersPerPixelWidth, 1./metersPerPixelHeight )
 
+    def setRasterWindow( self, bottomLeftCoords=None, topRightCoords=None ):
+        '''
+        Only rasterize vehicles and lights inside the given window,
+        eg the window that is requested with getMapSliceByCorners.
+        The rest of the map stays empty.
+        @param bottomLeftCoords bottom left corner of the window in meters, or None for the whole map
+        @param topRightCoords top right corner of the window in meters
+        '''
+        if bottomLeftCoords is None:
+            self._rasterWindowMeters = None
+        else:
+            self._rasterWindowMeters = (tuple(bottomLeftCoords), tuple(topRightCoords))
+        if self._arrayMap is not None:
+            self._updateRasterWindow()
+
     def setPositionOfTrafficLights( self, lightsPositions ):
         # compute the positions of light heads automatically in case they are not given explicitly
         for lightID in self._lightids:
@@ -262,7 +287,7 @@ class ldm():
         """
         @return the list[string] of vehicle ids
         """
-        return self.subscriptionResults.keys()
+        return self._vehicleIds
 
     def getVehicleLane(self, vehicleid:str):
         """
@@ -311,7 +336,7 @@ class ldm():
         @param vehicleid the id of the vehicle
         @return  the allowed speed of the vehicle
         """
-        return self.subscriptionResults.get(vehicleid).get(self.SUMO_client.constants.VAR_ALLOWED_SPEED)
+        return self._vehicleAllowedSpeeds[self._vehicleIndex[vehicleid]]
 
     def getVehiclePosition(self, vehicleid):
         """
@@ -332,169 +357,233 @@ class ldm():
         for lightid in self._lightids:
             self.SUMO_client.trafficlight.subscribe(lightid, (self.SUMO_client.constants.TL_RED_YELLOW_GREEN_STATE, self.SUMO_client.constants.TL_CURRENT_PHASE))
 
+    def _subscribeToSimulation(self):
+        '''
+        subscribe to the ids of the vehicles that departed in each step
+        '''
+        self.SUMO_client.simulation.subscribe((self.SUMO_client.constants.VAR_DEPARTED_VEHICLES_IDS,))
+
+    def _subscribeToNewVehicles(self):
+        '''
+        subscribe to the vehicles that departed in the last step
+        '''
+        simulationResults = self.SUMO_client.simulation.getSubscriptionResults()
+        for vehID in simulationResults.get(self.SUMO_client.constants.VAR_DEPARTED_VEHICLES_IDS, ()):
+            self._addVehicleSubscription(vehID)
+
     def _initializeArrayMap( self ):
         if( self._verbose ):
             print( self.netBoundaryMeters[1] )
             print( self.netBoundaryMeters[0] )
 
         self._arrayMap=np.zeros( self._coordMetersToArray(tuple(( self.netBoundaryMeters[1][0], self.netBoundaryMeters[1][1] )) ) )
+        # flat indices of the cells that are set since the last reset
+        self._dirtyCells = []
+        self._updateRasterWindow()
+
+    def _updateRasterWindow( self ):
+        '''
+        compute the cells [low, high> of the map that are rasterized
+        '''
+        shape = np.array(self._arrayMap.shape)
+        if self._rasterWindowMeters is None:
+            self._rasterLow = np.zeros(2, dtype=int)
+            self._rasterHigh = shape
+        else:
+            self._rasterLow = np.clip(self._coordMetersToArray(self._rasterWindowMeters[0]), 0, shape)
+            self._rasterHigh = np.clip(self._coordMetersToArray(self._rasterWindowMeters[1]), 0, shape)
 
     def _resetMap( self ):
-        self._arrayMap = np.zeros( self._arrayMap.shape )
+        flatMap = self._arrayMap.reshape(-1)
+        for cells in self._dirtyCells:
+            flatMap[cells] = 0
+        self._dirtyCells = []
+
+    def _rasterize( self, coordsInMeters, values ):
+        '''
+        add values to the map cells at the given coordinates.
+        Coordinates outside the map or raster window are ignored.
+        @param coordsInMeters (N,2) array with coordinates in meters
+        @param values (N,) array with the value to add at each coordinate
+        '''
+        cells = self._coordsMetersToArray(coordsInMeters)
+        inside = ((cells >= self._rasterLow) & (cells < self._rasterHigh)).all(axis=1)
+        flatCells = np.ravel_multi_index((cells[inside, 0], cells[inside, 1]), self._arrayMap.shape)
+        np.add.at(self._arrayMap.reshape(-1), flatCells, values[inside])
+        self._dirtyCells.append(flatCells)
 
     def _coordMetersToArray( self, *coordsInMeters ):
         arrayX = round( (coordsInMeters[0][0] - self.netBoundaryMeters[0][0]) * self._pixelsPerMeterWidth - 0.5 )
         arrayY = round( (coordsInMeters[0][1] - self.netBoundaryMeters[0][1]) * self._pixelsPerMeterHeight - 0.5 )
         return [arrayX, arrayY]
 
+    def _coordsMetersToArray( self, coordsInMeters ):
+        '''
+        vectorized _coordMetersToArray
+        @param coordsInMeters (N,2) array with coordinates in meters
+        @return (N,2) int array with the map cells
+        '''
+        pixelsPerMeter = np.array([self._pixelsPerMeterWidth, self._pixelsPerMeterHeight])
+        return np.round( (np.asarray(coordsInMeters, dtype=float).reshape(-1, 2) - self.netBoundaryMeters[0]) * pixelsPerMeter - 0.5 ).astype(int)
+
     def _addVehicleSubscription(self, vehID):
         self.SUMO_client.vehicle.subscribe(vehID, (self.SUMO_client.constants.VAR_POSITION, self.SUMO_client.constants.VAR_SPEED, self.SUMO_client.constants.VAR_ALLOWED_SPEED, self.SUMO_client.constants.VAR_WAITING_TIME ))
 
     def _updateMapWithVehicles( self, floatingCarData ):
-        for vehCoords in floatingCarData:
-            vehCoordsInArray=self._coordMetersToArray(vehCoords)
-            try:
-                self._arrayMap[vehCoordsInArray[0], vehCoordsInArray[1]] = self._arrayMap[vehCoordsInArray[0], vehCoordsInArray[1]] + 1
-            except IndexError as error:
-                print(error)
+        '''
+        @param floatingCarData (N,2) array with the vehicle positions in meters
+        '''
+        self._rasterize(floatingCarData, np.ones(len(floatingCarData)))
+
+    def _updateVehicleTable(self, subscriptionResults:dict):
+        """
+        Replace the vehicle table with the given subscription results.
+        @param subscriptionResults dict with vehicle ids as keys and the
+        subscription results of each vehicle as value. Vehicles without results are skipped.
+        """
+        constants = self.SUMO_client.constants
+        self._vehicleIds = [vehID for vehID, result in subscriptionResults.items() if result]
+        self.subscribedVehs = self._vehicleIds
+        results = [subscriptionResults[vehID] for vehID in self._vehicleIds]
+        n = len(results)
+        self._vehicleIndex = dict(zip(self._vehicleIds, range(n)))
+        positions = np.array([result[constants.VAR_POSITION] for result in results], dtype=float).reshape(n, 2)
+        self._vehicleX = np.ascontiguousarray(positions[:, 0])
+        self._vehicleY = np.ascontiguousarray(positions[:, 1])
+        self._vehicleSpeeds = np.fromiter((result[constants.VAR_SPEED] for result in results), float, n)
+        self._vehicleAllowedSpeeds = np.fromiter((result[constants.VAR_ALLOWED_SPEED] for result in results), float, n)
+        self._vehicleWaitingTimes = np.fromiter((result[constants.VAR_WAITING_TIME] for result in results), float, n)
+        self._vehicleRows = np.array([self._vehicleNumbers.setdefault(vehID, len(self._vehicleNumbers)) \
+                                      for vehID in self._vehicleIds], dtype=int)
+        self._growVehicleHistory(len(self._vehicleNumbers))
+
+    def _growVehicleHistory(self, size:int):
+        """
+        make sure the per vehicle history arrays have at least given size
+        """
+        oldsize = len(self._lastSpeeds)
+        if oldsize >= size:
+            return
+        extra = max(size, 2 * oldsize) - oldsize
+        self._lastSpeeds = np.concatenate([self._lastSpeeds, np.full(extra, np.nan)])
+        self._speedFactorSums = np.concatenate([self._speedFactorSums, np.zeros(extra)])
+        self._speedFactorCounts = np.concatenate([self._speedFactorCounts, np.zeros(extra, dtype=int)])
+
+    def _getVehiclesInBox(self, bottomLeftCoords, topRightCoords):
+        """
+        @return bool array, true for the vehicles with position inside the box (including the border)
+        """
+        return (self._vehicleX >= bottomLeftCoords[0]) & (self._vehicleX <= topRightCoords[0]) \
+            & (self._vehicleY >= bottomLeftCoords[1]) & (self._vehicleY <= topRightCoords[1])
 
     #selects which reward function to use (might be parameterized later)
-    def _computeReward(self, vehicles, function):
+    def _computeReward(self, selection, function):
+        """
+        @param selection bool or index array, selecting the vehicles in the vehicle table to compute the reward for
+        @param function the name of the reward function
+        """
         if function == "eval":
-            return self._computeEvalRewards(vehicles)
+            return self._computeEvalRewards(selection)
         elif function == "elise":
-            return self._computeRewardElise(vehicles)
+            return self._computeRewardElise(selection)
         else:
-            return self._computeRewardDefault(vehicles)
+            return self._computeRewardDefault(selection)
 
-    # vehicles are a subset of all subscription results
-    def _computeRewardDefault( self, vehicles ):
-        result = 0
-        if not vehicles:
+    def _computeRewardDefault( self, selection ):
+        vehicleRewards = self._getVehicleRewardsDefault()[selection]
+        if len(vehicleRewards) == 0:
             logging.debug("No vehicles, returning 0 reward")
             return 0
+        return float(vehicleRewards.sum())
 
-        for vehID in vehicles:
+    def _computeRewardElise( self, selection ):
+        vehicleRewards = self._getVehicleRewardsElise()[selection]
+        if len(vehicleRewards) == 0:
+            logging.debug("No vehicles, returning 0 reward")
+            return 0
+        self._updateLastSpeeds(selection)
+        return self._getLightPenaltyElise() + float(vehicleRewards.sum())
 
-            if self.new_reward:
-                waitingTime = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_WAITING_TIME)
-                reward = -min(waitingTime, 1.0)
-            else:
-                if self._waitingPenalty:
-                    waitingTime = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_WAITING_TIME)
-                speed = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_SPEED)
-                allowedSpeed = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_ALLOWED_SPEED)
+    def _computeEvalRewards(self, selection):
+        """
+        @return the average over all vehicles seen so far of their
+        average speed factor (speed / allowed speed)
+        """
+        rows = self._vehicleRows[selection]
+        self._speedFactorSums[rows] += self._vehicleSpeeds[selection] / self._vehicleAllowedSpeeds[selection]
+        self._speedFactorCounts[rows] += 1
+
+        seen = self._speedFactorCounts > 0
+        if not seen.any():
+            return 0
+        return float((self._speedFactorSums[seen] / self._speedFactorCounts[seen]).mean())
+
+    def _getVehicleRewardsDefault( self ):
+        """
+        @return (N,) array with the default reward of each vehicle in the vehicle table
+        """
+        waitingTimes = self._vehicleWaitingTimes
+        if self.new_reward:
+            return -np.minimum(waitingTimes, 1.0)
 
-                if( self._verbose ):
-                    if self._waitingPenalty:
-                        print(vehID + " waitingTime " + str(waitingTime) + " speed " + str(speed) + " allowedSpeed " + str(allowedSpeed))
-                    else:
-                        print(vehID + " speed " + str(speed) + " allowedSpeed " + str(allowedSpeed))
+        speeds = self._vehicleSpeeds
+        allowedSpeeds = self._vehicleAllowedSpeeds
+        clippedDelays = np.maximum(0, 1 - speeds / allowedSpeeds)
+        if self._waitingPenalty:
+            clippedWaitingTimes = np.minimum(waitingTimes, 1.0) #min(waitingTime*0.5, 1.0)
+            rewards = - 0.5*clippedDelays - 0.5*clippedWaitingTimes
+        else:
+            rewards = -clippedDelays
 
+        if( self._verbose ):
+            for i, vehID in enumerate(self._vehicleIds):
                 if self._waitingPenalty:
-                    clippedWaitingTime = min(waitingTime, 1.0) #min(waitingTime*0.5, 1.0)
-                    clippedDelay = max(0, 1 - speed/allowedSpeed)
-                    reward = - 0.5*clippedDelay - 0.5*clippedWaitingTime
+                    print(vehID + " waitingTime " + str(waitingTimes[i]) + " speed " + str(speeds[i]) + " allowedSpeed " + str(allowedSpeeds[i]))
+                    print(vehID + " clippedWaitingTime " + str(clippedWaitingTimes[i]) + " clippedDelay " + str(clippedDelays[i]) + " reward " + str(rewards[i]))
                 else:
-                    clippedDelay = max(0, 1 - speed / allowedSpeed)
-                    reward = -clippedDelay
-
-                if( self._verbose ):
-                    if self._waitingPenalty:
-                        print(vehID + " clippedWaitingTime " + str(clippedWaitingTime) + " clippedDelay " + str(clippedDelay) + " reward " + str(reward))
-                    else:
-                        print(vehID + " clippedDelay " + str(clippedDelay) + " reward " + str(reward))
+                    print(vehID + " speed " + str(speeds[i]) + " allowedSpeed " + str(allowedSpeeds[i]))
+                    print(vehID + " clippedDelay " + str(clippedDelays[i]) + " reward " + str(rewards[i]))
+        return rewards
 
-            result += reward
-        return result
+    def _getVehicleRewardsElise( self ):
+        """
+        @return (N,) array with the elise reward of each vehicle in the vehicle table,
+        without the light flip penalty
+        """
+        currentSpeeds = self._vehicleSpeeds
+        clippedDelays = -1 * np.maximum(0, 1 - currentSpeeds / self._vehicleAllowedSpeeds)
+        waitingTimes = self._vehicleWaitingTimes
+        waitPenalties = np.where(waitingTimes > 1, -1, np.where(waitingTimes == 1, -0.5, 0))
+        # comparisons with nan (no last speed) are false
+        hardBrakesPenalties = -1 * (currentSpeeds - self._lastSpeeds[self._vehicleRows] <= -4.5)
+        return (0.2 * hardBrakesPenalties) + (0.3 * clippedDelays) + (0.3 * waitPenalties)
 
-    def _computeRewardElise( self, vehicles ):
+    def _getLightPenaltyElise( self ):
+        """
+        @return the elise penalty for lights that flip
+        """
         result = 0
-        if not vehicles:
-            logging.debug("No vehicles, returning 0 reward")
-            return 0
-
-        # print("Teleport: ", self.SUMO_client.simulation.getStartingTeleportNumber)
-
         for tlID in self.getTrafficLights():
             lightFlipPenalty = 0
             if(self.getLightState(tlID) == "ryry" or self.getLightState(tlID) == "yryr"):
-                # print("punishing flip")
                 lightFlipPenalty = -1
             result += (1.5 * lightFlipPenalty)
-
-
-        for vehID in vehicles:
-            if vehID not in self._vehSpeeds:
-                self._vehSpeeds[vehID] = []
-            currentSpeed = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_SPEED)
-            allowedSpeed = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_ALLOWED_SPEED)
-            clippedDelay = -1 * max(0, 1 - currentSpeed / allowedSpeed)
-            waitPenalty = 0
-            hardBrakesPenalty = 0
-
-            if(self.getVehicleWaitingTime(vehID) == 1):
-                waitPenalty = -0.5
-            if(self.getVehicleWaitingTime(vehID) > 1):
-                waitPenalty = -1
-
-
-            if(len(self._vehSpeeds[vehID]) > 0):
-                lastSpeed = self._vehSpeeds[vehID][len(self._vehSpeeds[vehID]) - 1]
-                if(currentSpeed - lastSpeed <= -4.5):
-                    hardBrakesPenalty = -1
-
-            result += (0.2 * hardBrakesPenalty) + (0.3 * clippedDelay) + (0.3 * waitPenalty)
-            self._vehSpeeds[vehID].append(currentSpeed)
         return result
 
-    def _computeEvalRewards(self, vehicles):
-
-        result = 0
-        # if not vehicles:
-        #     logging.debug("No vehicles, returning 0 reward")
-        #     return 0
-        for vehID in vehicles:
-            if vehID not in self._vehSpeeds:
-                self._vehSpeeds[vehID] = []
-            currentSpeedFactor = vehicles.get(vehID).get(self.SUMO_client.constants.VAR_SPEED) / vehicles.get(vehID).get(self.SUMO_client.constants.VAR_ALLOWED_SPEED)
-            self._vehSpeeds[vehID].append(currentSpeedFactor)
-        avgSpeeds = []
-        for key in self._vehSpeeds.keys():
-            lst = self._vehSpeeds[key]
-            avgSpeeds.append(sum(lst) / len(lst))
-        # print("\n Car average speeds: ", avgSpeeds)
-        if(len(avgSpeeds) > 0):
-            systemAverage = sum(avgSpeeds) / len(avgSpeeds)
-        else:
-            return 0
-        # print("\n System average speed: ", systemAverage)
-
-
-        return systemAverage
-
-    def _getVehiclePositions( self, subscriptionResults ):
-        resultsFormatted=list(subscriptionResults.values())
-        positionList = list()
-
-        for vehAttrib in resultsFormatted:
-            if(vehAttrib):
-                position = (round(vehAttrib[self.SUMO_client.constants.VAR_POSITION][0]), round(vehAttrib[self.SUMO_client.constants.VAR_POSITION][1]))
-                if(self._verbose):
-                    print("Position " + str(position))
-                positionList.append(position)
-        return positionList
-
-    def _getLaneEnds( self, subscriptionResults ):
-        resultsFormatted=list(subscriptionResults.values())
-        positionList = list()
+    def _updateLastSpeeds( self, selection ):
+        """
+        store the current speed of the selected vehicles, for the hard brake penalty of elise
+        """
+        self._lastSpeeds[self._vehicleRows[selection]] = self._vehicleSpeeds[selection]
 
-        for vehAttrib in resultsFormatted:
-            position = (round(vehAttrib[self.SUMO_client.constants.VAR_POSITION][0]), round(vehAttrib[self.SUMO_client.constants.VAR_POSITION][1]))
-            if(self._verbose):
-                print("Position " + str(position))
-            positionList.append(position)
-        return positionList
+    def _getVehiclePositions( self ):
+        """
+        @return (N,2) array with the rounded positions of all vehicles
+        """
+        positions = np.round(np.stack([self._vehicleX, self._vehicleY], axis=1))
+        if(self._verbose):
+            print("Positions " + str(positions))
+        return positions
 
     def _updateTrafficLights(self, lightupdates):
         """
@@ -518,18 +607,8 @@ class ldm():
             position     -- a tuple containing the traffic light position
             traci        -- instance of TraCI to communicate with SUMO
         """
-        index = 0
-        for index in range(len(lights)):
-            if lights[index] == 'G' or lights[index] == 'g':
-                val = 0.8
-            elif lights[index] == 'y':
-                val = 0.5
-            elif lights[index] == 'r':
-                val = 0.2
-
-            arrayPosition = self._coordMetersToArray( position[index] )
-            self._arrayMap[arrayPosition[0], arrayPosition[1]] += val
-            index += 1
+        values = np.array([LIGHT_VALUES.get(light, 0.0) for light in lights])
+        self._rasterize(np.array(position[:len(lights)], dtype=float), values)
 
     def setRedYellowGreenState(self, agent:string, state:string ):
         """
@@ -539,6 +618,17 @@ class ldm():
         """
         self.SUMO_client.trafficlight.setRedYellowGreenState(agent, state)
 
+    def setRedYellowGreenStates(self, states:dict):
+        """
+        set new states for several traffic lights.
+        A state set with setRedYellowGreenState stays until it is set again,
+        so only lights that change need to be given.
+        @param states dict with agent ids as keys and new states as values
+        """
+        setState = self.SUMO_client.trafficlight.setRedYellowGreenState
+        for agent, state in states.items():
+            setState(agent, state)
+
     def test(self, bottomLeftCoord = (506., 430.), topRightCoord = (516., 500.), centerCoord = (510., 475.), width = 10., height=70. ):
         #mapSlice=str(self.getMapSliceByCorners( bottomLeftCoord, topRightCoord ))
         mapSlice=str(self.getMapSliceByCenter( centerCoord, width, height ))
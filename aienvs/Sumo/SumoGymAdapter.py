@@ -32,6 +32,7 @@ class SumoGymAdapter(Env):
                 'box_top_corner':(10, 10),  # top right corner of the observable frame
                 'resolutionInPixelsPerMeterX': 1,  # for the observable frame
                 'resolutionInPixelsPerMeterY': 1,  # for the observable frame
+                'rasterize_observed_frame': False,  # only put vehicles and lights on the ldm map inside the observable frame
                 'y_t': 6,  # yellow time
                 'generate_conf': True,  # for automatic route/config generation
                 'simulation_start_time': '0', # The start time of the sumo simulation in seconds
@@ -85,6 +86,11 @@ class SumoGymAdapter(Env):
             tlPhasesFile = os.path.join(self._parameters['scenarios_path'], self._parameters['scene'], self._parameters['tlphasesfile'])
 
         self._tlphases = TrafficLightPhases(tlPhasesFile)
+        # the phase strings of each intersection, indexed by phase number
+        self._phaseStrings = {inters:tuple(self._tlphases.getPhase(inters, n) for n in range(self._tlphases.getNrPhases(inters))) \
+                              for inters in self._tlphases.getIntersectionIds()}
+        # the light state that was last sent to sumo, for each intersection
+        self._sentLightStates = {}
 
         self.ldm = ldm(using_libsumo=self._parameters['libsumo'])
         self._takenActions = {}
@@ -229,7 +235,12 @@ class SumoGymAdapter(Env):
                 break
 
         self.ldm.init(waitingPenalty=self._parameters['waiting_penalty'], new_reward=self._parameters['new_reward'])  # ignore reward for now
+        self._sentLightStates = {}
         self.ldm.setResolutionInPixelsPerMeter(self._parameters['resolutionInPixelsPerMeterX'], self._parameters['resolutionInPixelsPerMeterY'])
+        if self._parameters['rasterize_observed_frame']:
+            self.ldm.setRasterWindow(self._parameters['box_bottom_corner'], self._parameters['box_top_corner'])
+        else:
+            self.ldm.setRasterWindow(None)
         self.ldm.setPositionOfTrafficLights(self._parameters['lightPositions'])
 
         if list(self.ldm.getTrafficLights()) != self._tlphases.getIntersectionIds():
@@ -243,8 +254,7 @@ class SumoGymAdapter(Env):
         @param lightvalue the PHASES value
         @return the intersection PHASES string eg 'rrGr' or 'GGrG'
         """
-        logging.debug("lightPhaseId" + str(lightPhaseId))
-        return self._tlphases.getPhase(intersectionId, lightPhaseId)
+        return self._phaseStrings[intersectionId][lightPhaseId]
 
     def _observe(self):
         """
@@ -277,9 +287,12 @@ class SumoGymAdapter(Env):
 
     def _set_lights(self, actions:spaces.Dict):
         """
-        Take the specified actions in the environment
+        Take the specified actions in the environment.
+        Only the light states that differ from the state last sent
+        to sumo are sent.
         @param actions a list of
         """
+        changes = {}
         for intersectionId in actions.keys():
             action = self._intToPhaseString(intersectionId, actions.get(intersectionId))
             # Retrieve the action that was taken the previous step
@@ -297,9 +310,13 @@ class SumoGymAdapter(Env):
                 action, self._yellowTimer[intersectionId] = self._correct_action(prev_action, action, self._yellowTimer[intersectionId])
 
             # Set traffic lights
-            self.ldm.setRedYellowGreenState(intersectionId, action)
+            if self._sentLightStates.get(intersectionId) != action:
+                changes[intersectionId] = action
             self._takenActions[intersectionId] = action
 
+        self.ldm.setRedYellowGreenStates(changes)
+        self._sentLightStates.update(changes)
+
     def _correct_action(self, prev_action, action, timer):
 
         """
@@ -0,0 +1,279 @@
+from aienvs.Environment import Env
+from aienvs.EnvironmentFactory import createEnvironment
+from abc import abstractmethod
+from multiprocessing import Process, Pipe, Array
+from numpy import array, ndarray, stack, frombuffer, float64, int8
+import numbers
+
+
+class VectorEnv(Env):
+    """
+    Steps N independent copies of an Env together.
+    The copies are created with EnvironmentFactory, so any Env can be
+    batched without changes to the Env itself.
+    step takes a list of N joint actions and returns the N observations,
+    an array with the N rewards and an array with the N done flags.
+    Sub-envs that are done are reset automatically: the observation returned
+    for such an env is the initial observation of its next episode,
+    the final observation is in its info under 'terminal_observation'.
+
+    Observations are stacked into one ndarray if the env returns ndarray
+    observations, otherwise a list of the N observations is returned.
+
+    This is to be used as base class only, see SyncVectorEnv
+    and AsyncVectorEnv.
+    """
+
+    def __init__(self, fullname:str, parameters:dict, n:int):
+        """
+        @param fullname the full.path.name of the Env to create, eg
+        "aienvs.FactoryFloor.FactoryFloor.FactoryFloor"
+        @param parameters the parameters for each env initialization
+        @param n the number of env copies
+        """
+        if n < 1:
+            raise ValueError("Number of envs must be at least 1 but got " + str(n))
+        self._fullname = fullname
+        self._parameters = parameters
+        self._n = n
+
+    def getNumEnvs(self) -> int:
+        """
+        @return the number of sub-envs
+        """
+        return self._n
+
+    # Override
+    def step(self, actions):
+        """
+        @param actions list of N joint actions (dicts), one for each sub-env.
+        Alternatively a (N, #agents) array, in which case each row is mapped
+        onto the keys of action_space in order.
+        @return (observations, rewards, dones, infos).
+        rewards is a float array and dones a bool array, both of length N.
+        infos is a list of N dicts, containing the original info under 'info'.
+        """
+        if isinstance(actions, ndarray):
+            keys = list(self.action_space.spaces.keys())
+            actions = [dict(zip(keys, row.tolist())) for row in actions]
+        if len(actions) != self._n:
+            raise ValueError("Expected " + str(self._n) + " joint actions but got " + str(len(actions)))
+        observations, rewards, dones, infos = self._step(actions)
+        return _stack(observations), rewards, dones, infos
+
+    # Override
+    def reset(self):
+        return _stack(self._reset())
+
+    # Override
+    def seed(self, seed=None):
+        """
+        Sub-env i gets seed+i, or None if seed is None.
+        @return the list of seeds given to the sub-envs
+        """
+        if isinstance(seed, numbers.Number):
+            seeds = [seed + i for i in range(self._n)]
+        else:
+            seeds = [None] * self._n
+        self._seed(seeds)
+        return seeds
+
+    @abstractmethod
+    def _step(self, actions:list):
+        """
+        @param actions list of N joint actions
+        @return (list of N obs, reward array, done array, list of N info dicts)
+        """
+        pass
+
+    @abstractmethod
+    def _reset(self) -> list:
+        """
+        @return list of the N initial observations
+        """
+        pass
+
+    @abstractmethod
+    def _seed(self, seeds:list):
+        """
+        @param seeds list with the seed for each sub-env
+        """
+        pass
+
+
+class SyncVectorEnv(VectorEnv):
+    """
+    VectorEnv that steps all sub-envs in a loop in this process.
+    Each env has its own numpy random Generator, seeded as in seed.
+    """
+
+    def __init__(self, fullname:str, parameters:dict, n:int):
+        super().__init__(fullname, parameters, n)
+        self._envs = [createEnvironment(fullname, parameters) for i in range(n)]
+
+    def _step(self, actions:list):
+        observations = []
+        rewards = array([0.0] * self._n)
+        dones = array([False] * self._n)
+        infos = []
+        for i, env in enumerate(self._envs):
+            obs, rewards[i], dones[i], info = env.step(actions[i])
+            info = {'info': info}
+            if dones[i]:
+                info['terminal_observation'] = obs
+                obs = env.reset()
+            observations.append(obs)
+            infos.append(info)
+        return observations, rewards, dones, infos
+
+    def _reset(self) -> list:
+        return [env.reset() for env in self._envs]
+
+    def _seed(self, seeds:list):
+        for env, seed in zip(self._envs, seeds):
+            env.seed(seed)
+
+    def getEnvs(self) -> list:
+        """
+        @return the list of sub-envs
+        """
+        return self._envs
+
+    # Override
+    def render(self, mode='human'):
+        return self._envs[0].render()
+
+    # Override
+    def close(self):
+        for env in self._envs:
+            env.close()
+
+    @property
+    def observation_space(self):
+        return self._envs[0].observation_space
+
+    @property
+    def action_space(self):
+        return self._envs[0].action_space
+
+
+def _worker(conn, fullname:str, parameters:dict, index:int, rewards, dones):
+    """
+    Runs one sub-env of an AsyncVectorEnv in a subprocess.
+    Rewards and done flags are written into the shared arrays at index,
+    observations and infos are sent back through conn.
+    """
+    env = createEnvironment(fullname, parameters)
+    while True:
+        command, data = conn.recv()
+        if command == 'step':
+            obs, reward, done, info = env.step(data)
+            rewards[index] = reward
+            dones[index] = done
+            info = {'info': info}
+            if done:
+                info['terminal_observation'] = obs
+                obs = env.reset()
+            conn.send((obs, info))
+        elif command == 'reset':
+            conn.send(env.reset())
+        elif command == 'seed':
+            conn.send(env.seed(data))
+        elif command == 'call':
+            conn.send(getattr(env, data[0])(*data[1]))
+        elif command == 'getattr':
+            conn.send(getattr(env, data))
+        elif command == 'close':
+            env.close()
+            conn.close()
+            break
+
+
+class AsyncVectorEnv(VectorEnv):
+    """
+    VectorEnv that runs each sub-env in its own subprocess.
+    The commands are sent to all workers before the results are collected,
+    so the sub-envs step in parallel. Rewards and done flags are returned
+    through shared memory, observations and infos are pickled through a pipe
+    as envs generally return python objects as observation.
+    Each sub-env has its own numpy random Generator, seeded as in seed.
+    """
+
+    def __init__(self, fullname:str, parameters:dict, n:int):
+        super().__init__(fullname, parameters, n)
+        self._sharedRewards = Array('d', n, lock=False)
+        self._sharedDones = Array('b', n, lock=False)
+        self._rewards = frombuffer(self._sharedRewards, dtype=float64)
+        self._dones = frombuffer(self._sharedDones, dtype=int8)
+        self._conns = []
+        self._processes = []
+        for i in range(n):
+            conn, workerconn = Pipe()
+            process = Process(target=_worker, args=(workerconn, fullname, parameters, i, \
+                                                    self._sharedRewards, self._sharedDones), daemon=True)
+            process.start()
+            workerconn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+        self._closed = False
+
+    def _step(self, actions:list):
+        for conn, action in zip(self._conns, actions):
+            conn.send(('step', action))
+        results = [conn.recv() for conn in self._conns]
+        observations = [obs for obs, info in results]
+        infos = [info for obs, info in results]
+        return observations, self._rewards.copy(), self._dones.astype(bool), infos
+
+    def _reset(self) -> list:
+        return self._all('reset')
+
+    def _seed(self, seeds:list):
+        for conn, seed in zip(self._conns, seeds):
+            conn.send(('seed', seed))
+        for conn in self._conns:
+            conn.recv()
+
+    def _all(self, command:str, data=None) -> list:
+        """
+        send command to all workers
+        @return list with the results of all workers
+        """
+        for conn in self._conns:
+            conn.send((command, data))
+        return [conn.recv() for conn in self._conns]
+
+    # Override
+    def render(self, mode='human'):
+        self._conns[0].send(('call', ('render', ())))
+        return self._conns[0].recv()
+
+    # Override
+    def close(self):
+        if self._closed:
+            return
+        for conn in self._conns:
+            conn.send(('close', None))
+        for process in self._processes:
+            process.join()
+        self._closed = True
+
+    @property
+    def observation_space(self):
+        self._conns[0].send(('getattr', 'observation_space'))
+        return self._conns[0].recv()
+
+    @property
+    def action_space(self):
+        self._conns[0].send(('getattr', 'action_space'))
+        return self._conns[0].recv()
+
+
+def _stack(observations:list):
+    """
+    @return observations stacked into one array if all are ndarray,
+    or the list of observations otherwise
+    """
+    if all(isinstance(obs, ndarray) for obs in observations):
+        return stack(observations)
+    return observations
@@ -1,10 +1,9 @@
 from gym.spaces import Space, Dict, Discrete, MultiDiscrete, Box, Tuple, MultiBinary
 from aienvs.gym.ModifiedActionSpace import ModifiedActionSpace
 import math
-from math import floor
 from abc import ABC, abstractmethod
 from collections import OrderedDict
-from numpy import array
+from numpy import array, ndarray, asarray, iinfo, int64, arange, zeros
 
 
 class DecoratedSpace(ABC):
@@ -15,6 +14,15 @@ class DecoratedSpace(ABC):
     Gym actions do not have a proper type. 
     A gym Discrete returns int actions, Dict returns OrderedDict actions,
     etc. Let's call these GYMACT
+    
+    The decorated gym space is assumed not to change: the child decorators,
+    the sizes and the mixed-radix strides are computed once, at construction. 
+    The element with index n of a space with children of sizes [s0,s1,...]
+    has child indices [n%s0, (n/s0)%s1, ...], see numberToList.
+    The batch functions use this to convert arrays of child indices 
+    to and from arrays of indices with numpy integer arithmetic.
+    Iterating over a space (iterate, iterIndices) walks the child indices
+    like an odometer, in index order, without calling getById for each element.
     '''
 
     def __init__(self, space:Dict):
@@ -28,6 +36,14 @@ class DecoratedSpace(ABC):
         The remaining keys in the original space are left untouched.
         '''
         self._gymspace = space
+        self._subsizes = self._computeSubSizes()
+        self._size = self._computeSize()
+        # stride[i] is the index step of child i, None if the space is infinite
+        self._strides = None
+        if self._size != math.inf:
+            self._strides = [1]
+            for subsize in self._subsizes[:-1]:
+                self._strides.append(self._strides[-1] * subsize)
         
     @staticmethod
     def create(space: Space):  # -> DecoratedSpace:
@@ -68,14 +84,13 @@ class DecoratedSpace(ABC):
     def n(self):
         return self.getSize()
         
-    @abstractmethod
     def getSize(self):
         '''
         @return:  the total number of possible discrete values in this space.
-        This has to be determined dynamically as 
-        the space can change over time. May return math.inf
-        to indicate infinite number of  discrete values are possible.
+        May return math.inf to indicate infinite number of 
+        discrete values are possible.
         '''
+        return self._size
     
     def getSubSpaces(self) -> list:  # list<DecoratedSpace>
         '''
@@ -99,6 +114,118 @@ class DecoratedSpace(ABC):
         @return the index N of the given value in this space.
         '''
 
+    def getIndexOfBatch(self, values) -> ndarray:
+        '''
+        Vectorized getIndexOf
+        @param values (N,K) int array, row i containing the K child 
+        indices of element i (for Discrete children that is the action itself),
+        or a list of N GYMACT.
+        @return (N,) int64 array with the indices of the elements.
+        '''
+        self._checkBatchable()
+        if not isinstance(values, ndarray):
+            values = array([self._getSubIndices(value) for value in values], dtype=int64).reshape(-1, len(self._subsizes))
+        return asarray(values, dtype=int64) @ array(self._strides, dtype=int64)
+
+    def getByIdBatch(self, indices) -> ndarray:
+        '''
+        Vectorized getById
+        @param indices (N,) int array with indices in [0, getSize()>
+        @return (N,K) int64 array, row i containing the K child indices
+        of element indices[i]. 
+        '''
+        self._checkBatchable()
+        indices = asarray(indices, dtype=int64)
+        return (indices[:, None] // array(self._strides, dtype=int64)) % array(self._subsizes, dtype=int64)
+
+    def iterIndices(self, chunkSize:int=None):
+        '''
+        Iterate over the child indices of all elements, in index order.
+        @param chunkSize None to iterate per element, or the number of 
+        elements to get per iteration.
+        @return generator. If chunkSize is None, this yields for each element 
+        the same (K,) int64 array, updated in place; copy it to keep it. 
+        Otherwise this yields (chunkSize,K) arrays, as getByIdBatch, 
+        the last one possibly shorter.
+        '''
+        if self._strides is None:
+            raise Exception("Infinite space can not be iterated")
+        if chunkSize is not None:
+            for start in range(0, self._size, chunkSize):
+                yield self.getByIdBatch(arange(start, min(start + chunkSize, self._size)))
+            return
+        buffer = zeros(len(self._subsizes), dtype=int64)
+        for digits, changed in self._walk():
+            buffer[:changed] = digits[:changed]
+            yield buffer
+
+    def iterate(self):
+        '''
+        Iterate over all elements, in index order, equal to 
+        getById(n) for n in range(getSize()) but much faster.
+        @return generator of GYMACT. Mutable elements (OrderedDict, arrays)
+        are one object that is updated in place; copy them to keep them.
+        '''
+        if self._strides is None:
+            raise Exception("Infinite space can not be iterated")
+        for n in range(self._size):
+            yield self.getById(n)
+
+    def __iter__(self):
+        return self.iterate()
+
+    def _walk(self):
+        '''
+        The odometer: walks the child indices of all elements in index order.
+        @return generator yielding (digits, changed), with digits
+        one list of child indices that is updated in place and changed the
+        number of leading digits that changed since the previous element 
+        (all for the first element).
+        '''
+        if self._size == 0:
+            return
+        subsizes = self._subsizes
+        digits = [0] * len(subsizes)
+        yield digits, len(digits)
+        for n in range(self._size - 1):
+            i = 0
+            while True:
+                digits[i] += 1
+                if digits[i] < subsizes[i]:
+                    break
+                digits[i] = 0
+                i += 1
+            yield digits, i + 1
+
+    def _computeSubSizes(self) -> list:
+        '''
+        @return list of sizes of all children (the "digits" of an index), in proper order
+        '''
+        return [space.getSize() for space in self.getSubSpaces()]
+
+    def _computeSize(self):
+        '''
+        @return the total size, computed from the subsizes
+        '''
+        size = 1
+        for subsize in self._subsizes:
+            size = size * subsize
+        return size
+
+    def _getSubIndices(self, value) -> list:
+        '''
+        @param value a GYMACT
+        @return list with the child indices of value
+        '''
+        return DecoratedSpace.numberToList(self.getIndexOf(value), self._subsizes)
+
+    def _checkBatchable(self):
+        '''
+        raise if the indices of this space do not fit in int64
+        '''
+        if self._strides is None or self._size > iinfo(int64).max:
+            raise OverflowError("Space is too large for batch indexing: " + str(self._size))
+
     @staticmethod
     def numberToList(n:int, subsizes:list) -> list:
         '''
@@ -114,7 +241,7 @@ class DecoratedSpace(ABC):
         selection = []
         for max in subsizes:
             selection.append(n % max)
-            n = floor(n / max)
+            n = n // max
         return selection
     
     @staticmethod
@@ -146,51 +273,69 @@ class DictSpaceDecorator(DecoratedSpace):
 
     '''
 
+    def __init__(self, space:Dict):
+        self._ids = list(space.spaces.keys())
+        self._subspaces = OrderedDict([(id, DecoratedSpace.create(space.spaces[id])) for id in self._ids])
+        super().__init__(space)
+
     def getSubSpaces(self) -> list:
-        return [self.getSubSpace(id) for id in self.getIds()]
+        return list(self._subspaces.values())
     
     def getIds(self):
         '''
         the keys of this Dict, in proper order
         '''
-        return self.getSpace().spaces.keys()
+        return self._subspaces.keys()
     
     def getSubSpace(self, id:str) -> DecoratedSpace:
         '''
         @param id the id of the space
         @return: space that has given id
         '''
-        return DecoratedSpace.create(self.getSpace().spaces[id])
-    
-    # Override
-    def getSize(self):
-        if len(self.getSubSpaces()) == 0:
-            return 0
-        size = 1
-        for space in self.getSubSpaces():
-            size = size * space.getSize()
-        return size
+        return self._subspaces[id]
     
     def getById(self, n:int):
-        nrList = DecoratedSpace.numberToList(n, self._getSubSizes())
-        nrList = list(zip(self.getIds(), nrList))
-        return OrderedDict([(id, self.getSubSpace(id).getById(m)) \
-                            for id, m in nrList])
+        nrList = DecoratedSpace.numberToList(n, self._subsizes)
+        return OrderedDict([(id, space.getById(m)) \
+                            for (id, space), m in zip(self._subspaces.items(), nrList)])
 
     def getIndexOf(self, value:OrderedDict):
         # collect values in proper order
-        values = [self.getSubSpace(id).getIndexOf(value[id]) \
-                        for id in self.getIds()]
-        return DecoratedSpace.listToNumber(values, self._getSubSizes())
+        values = [space.getIndexOf(value[id]) \
+                        for id, space in self._subspaces.items()]
+        return DecoratedSpace.listToNumber(values, self._subsizes)
 
     def get(self, id:str):
         return self.getSubSpace(id)
+
+    # Override
+    def _computeSize(self):
+        if len(self._subsizes) == 0:
+            return 0
+        return super()._computeSize()
     
     def _getSubSizes(self) -> list:
         '''
         @return list of sizes of all subspaces, in proper order
         '''
-        return [space.getSize() for space in self.getSubSpaces()]
+        return self._subsizes
+
+    # Override
+    def _getSubIndices(self, value) -> list:
+        return [space.getIndexOf(value[id]) for id, space in self._subspaces.items()]
+
+    # Override
+    def iterate(self):
+        if self._strides is None:
+            raise Exception("Infinite space can not be iterated")
+        ids = self._ids
+        # the elements of each child, in index order
+        values = [[space.getById(m) for m in range(space.getSize())] for space in self._subspaces.values()]
+        action = OrderedDict()
+        for digits, changed in self._walk():
+            for i in range(changed):
+                action[ids[i]] = values[i][digits[i]]
+            yield action
 
 
 class DiscreteSpaceDecorator(DecoratedSpace):
@@ -198,34 +343,59 @@ class DiscreteSpaceDecorator(DecoratedSpace):
     Decorates a spaces.Discrete
     '''
 
-    # Override
-    def getSize(self):
-        return self.getSpace().n
-
     def getById(self, n:int):
         return n
 
     def getIndexOf(self, value:int):
         return value
 
+    # Override
+    def getIndexOfBatch(self, values) -> ndarray:
+        '''
+        @param values (N,) int array or list with the values
+        @return (N,) int64 array with the indices, which equal the values
+        '''
+        return array(values, dtype=int64).reshape(-1)
+
+    # Override
+    def getByIdBatch(self, indices) -> ndarray:
+        '''
+        @param indices (N,) int array with the indices
+        @return (N,) int64 array with the values, which equal the indices
+        '''
+        return array(indices, dtype=int64).reshape(-1)
+
+    # Override
+    def _computeSubSizes(self) -> list:
+        return [int(self.getSpace().n)]
+
+    # Override
+    def iterate(self):
+        return iter(range(self._size))
+
 
 class MultiDiscreteSpaceDecorator(DecoratedSpace):
     '''
     Decorates a spaces.MultipleDiscrete
     '''
 
-    # Override
-    def getSize(self):
-        size = 1
-        for n in self.getSpace().nvec:
-            size = size * n
-        return size
-
     def getById(self, n:int):
-        return array(DecoratedSpace.numberToList(n, self.getSpace().nvec))
+        return array(DecoratedSpace.numberToList(n, self._subsizes))
 
     def getIndexOf(self, values):
-        return DecoratedSpace.listToNumber(values, self.getSpace().nvec)
+        return DecoratedSpace.listToNumber(values, self._subsizes)
+
+    # Override
+    def _computeSubSizes(self) -> list:
+        return [int(n) for n in self.getSpace().nvec]
+
+    # Override
+    def _getSubIndices(self, value) -> list:
+        return list(value)
+
+    # Override
+    def iterate(self):
+        return self.iterIndices()
 
     
 class TupleSpaceDecorator(DecoratedSpace):
@@ -233,23 +403,24 @@ class TupleSpaceDecorator(DecoratedSpace):
     Decorates a spaces.Tuple
     '''
 
-    # Override
-    def getSize(self):
-        size = 1
-        for space in self.getSubSpaces():
-            size = size * space.getSize()
-        return size
+    def __init__(self, space:Tuple):
+        self._subspaces = [DecoratedSpace.create(subspace) for subspace in space.spaces]
+        super().__init__(space)
 
     def getSubSpaces(self):
-        return [DecoratedSpace.create(space) for space in self.getSpace().spaces]
+        return list(self._subspaces)
 
     def getById(self, n:int):
-        subspaces = self.getSubSpaces()
-        nrList = DecoratedSpace.numberToList(n, [space.getSize() for space in subspaces])
-        res = []
-        for i in range(0, len(subspaces)):
-            res.append(subspaces[i].getById(nrList[i]))
-        return tuple(res)
+        nrList = DecoratedSpace.numberToList(n, self._subsizes)
+        return tuple(space.getById(m) for space, m in zip(self._subspaces, nrList))
+
+    # Override
+    def iterate(self):
+        if self._strides is None:
+            raise Exception("Infinite space can not be iterated")
+        values = [[space.getById(m) for m in range(space.getSize())] for space in self._subspaces]
+        for digits, changed in self._walk():
+            yield tuple(value[digit] for value, digit in zip(values, digits))
 
     def getIndexOf(self, value:int):
         raise NotImplemented  # not yet
@@ -262,7 +433,7 @@ class BoxSpaceDecorator(DecoratedSpace):
     '''
 
     # Override
-    def getSize(self):
+    def _computeSize(self):
         return math.inf
 
     def getById(self, n:int):
@@ -277,12 +448,20 @@ class MultiBinarySpaceDecorator(DecoratedSpace):
     Decorates a spaces.MultiBinary
     '''
 
+    def getById(self, n:int):
+        return array(DecoratedSpace.numberToList(n, self._subsizes))
+
     # Override
-    def getSize(self):
-        return 2 ** self.getSpace().n
+    def _computeSubSizes(self) -> list:
+        return [2] * int(self.getSpace().n)
 
-    def getById(self, n:int):
-        return array(DecoratedSpace.numberToList(n, [2] * self.getSpace().n))
+    # Override
+    def _getSubIndices(self, value) -> list:
+        return list(value)
+
+    # Override
+    def iterate(self):
+        return self.iterIndices()
 
     def getIndexOf(self, value:int):
         raise NotImplemented  # possible but not yet done.
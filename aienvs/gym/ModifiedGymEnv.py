@@ -8,6 +8,8 @@ class ModifiedGymEnv(Env):
     '''
     Modifies a gym environment by compressing specified actions
     into compound actions.
+    The action space of env is checked on the first step
+    and must not change after that.
     '''
     
     def __init__(self, env:Env, newactspace: ModifiedActionSpace):
@@ -18,10 +20,13 @@ class ModifiedGymEnv(Env):
         '''
         self._env = env
         self._newactionspace = newactspace
+        self._validated = False
         
     def step(self, actions:OrderedDict):
-        if not self._env.action_space == self._newactionspace.getOriginalSpace():
-            raise Exception("Unsupported: can't handle action space change")
+        if not self._validated:
+            if not self._env.action_space == self._newactionspace.getOriginalSpace():
+                raise Exception("Unsupported: can't handle action space change")
+            self._validated = True
         return self._env.step(self._newactionspace.unpack(actions))
 
     @property
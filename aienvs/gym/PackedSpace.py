@@ -1,7 +1,11 @@
 from gym.spaces import Dict
-from aienvs.gym.DecoratedSpace import DecoratedSpace, DictSpaceDecorator
+from aienvs.gym.DecoratedSpace import DecoratedSpace, DictSpaceDecorator, DiscreteSpaceDecorator
 from aienvs.gym.ModifiedActionSpace import ModifiedActionSpace
 from _collections import OrderedDict
+from numpy import ndarray, arange, asarray, int64
+
+# packed keys with at most this many packed actions get an unpack table
+MAX_TABLE_SIZE = 2 ** 16
 
 
 class PackedSpace(ModifiedActionSpace):
@@ -13,6 +17,11 @@ class PackedSpace(ModifiedActionSpace):
     But you can call unpack to convert an action
     in this packed space back into an action
     for the original space.
+    
+    Packed keys that merge only Discrete spaces, with at most
+    MAX_TABLE_SIZE packed actions, get a table from packed action
+    to the original actions, built at construction.
+    unpackBatch converts arrays of packed actions at once.
     '''
 
     def __init__(self, actionspace: Dict, packing: dict):
@@ -30,6 +39,11 @@ class PackedSpace(ModifiedActionSpace):
         '''
         self._originalspace = DecoratedSpace.create(actionspace)
         self._subdicts = {}
+        # for packed keys with only Discrete subspaces: the original keys and their sizes
+        self._subids = {}
+        self._subsizes = {}
+        # for some of those: (S,K) array, row n containing the original actions of packed action n
+        self._tables = {}
         newdict = actionspace.spaces.copy()
         # now replace keys according to packing instructions.
         for sid in packing:
@@ -40,6 +54,13 @@ class PackedSpace(ModifiedActionSpace):
                 if not oldkey in newdict:
                     raise Exception("Packing instruction " + str(packing) + " refers unknown key " + oldkey)
                 newdict.pop(oldkey)
+            if all(isinstance(space, DiscreteSpaceDecorator) for space in subdict.getSubSpaces()):
+                self._subids[sid] = list(subdict.getIds())
+                self._subsizes[sid] = [space.getSize() for space in subdict.getSubSpaces()]
+                if subdict.getSize() <= MAX_TABLE_SIZE:
+                    table = subdict.getByIdBatch(arange(subdict.getSize()))
+                    table.flags.writeable = False
+                    self._tables[sid] = table
         # we set this up as if it is a dict
         # NOTE    super(Dict, self).__init__(newdict) does NOT work as intended
         Dict.__init__(self, newdict)
@@ -71,8 +92,15 @@ class PackedSpace(ModifiedActionSpace):
         the packed space {'a_b':['a','b']} then the action may be packed
         to something like {'a_b':55, 'c':2}
         '''
-        return { entity:subspace.getIndexOf(action) \
-                for entity, subspace in self._subdicts.items()}
+        packed = {}
+        for entity, subspace in self._subdicts.items():
+            if entity in self._subids:
+                # Discrete: the index of each original action is the action itself
+                packed[entity] = DecoratedSpace.listToNumber(\
+                    [action[id] for id in self._subids[entity]], self._subsizes[entity])
+            else:
+                packed[entity] = subspace.getIndexOf(action)
+        return packed
 
     # Override
     def unpack(self, action:OrderedDict) -> OrderedDict:
@@ -84,7 +112,10 @@ class PackedSpace(ModifiedActionSpace):
         '''
         newactions = {}
         for actid, value in action.items():
-            if actid in self._subdicts:
+            if actid in self._tables:
+                for origid, origact in zip(self._subids[actid], self._tables[actid][value].tolist()):
+                    newactions[origid] = origact
+            elif actid in self._subdicts:
                 origactions = self._subdicts[actid].getById(value)
                 for origid, origact in origactions.items():
                     newactions[origid] = origact
@@ -92,6 +123,31 @@ class PackedSpace(ModifiedActionSpace):
                 newactions[actid] = value
         return OrderedDict(newactions)
     
+    def unpackBatch(self, actions:dict) -> OrderedDict:
+        '''
+        Vectorized unpack, eg for the actions of a VectorEnv.
+        Only supported if all packed keys merge Discrete spaces.
+        @param actions dict with the packed-entity labels as keys
+        and (N,) int arrays with N packed actions as values
+        @return OrderedDict with the original labels as keys and
+        (N,) int64 arrays with the unpacked actions as values
+        '''
+        newactions = OrderedDict()
+        for actid, values in actions.items():
+            values = asarray(values, dtype=int64)
+            if actid in self._tables:
+                rows = self._tables[actid][values]
+            elif actid in self._subids:
+                rows = self._subdicts[actid].getByIdBatch(values)
+            elif actid in self._subdicts:
+                raise Exception("Batch unpack of " + actid + " is unsupported: it packs non-Discrete spaces")
+            else:
+                newactions[actid] = values
+                continue
+            for k, origid in enumerate(self._subids[actid]):
+                newactions[origid] = rows[:, k]
+        return newactions
+
     def getOriginalSpace(self) -> OrderedDict: 
         return self._originalspace.getSpace()
 
@@ -0,0 +1,99 @@
+from aienvs.EnvironmentFactory import createEnvironment
+from aienvs.runners.Episode import Episode
+from aienvs.runners.DefaultRunner import DefaultRunner
+from aienvs.listener.DefaultListenable import DefaultListenable
+from collections import deque
+from itertools import cycle
+from multiprocessing import Pool, cpu_count
+import logging
+
+# the env and agent owned by a worker process, set by _initWorker
+_workerEnv = None
+_workerAgent = None
+
+
+def _initWorker(envName:str, envParameters:dict, agent):
+    """
+    Pool initializer: builds the fresh env and the agent copy of this worker
+    """
+    global _workerEnv, _workerAgent
+    _workerEnv = createEnvironment(envName, envParameters)
+    _workerAgent = agent
+
+
+def _runEpisode(seed):
+    """
+    Runs one episode in the worker, exactly like Experiment does it
+    @param seed the seed for the env for this episode
+    @return (steps, reward) of the episode
+    """
+    _workerEnv.seed(seed)
+    obs = _workerEnv.reset()
+    episode = Episode(_workerAgent, _workerEnv, obs, doneStep=True)
+    return episode.run()
+
+
+class ParallelExperiment(DefaultRunner, DefaultListenable):
+    """
+    Runs an experiment like Experiment, but distributes the episodes
+    over a pool of worker processes. Each worker builds its own env
+    through EnvironmentFactory and gets its own copy of the agent.
+    Episodes are handed out in the order of the seedlist cycle and their
+    results are merged back in that same order, so that the returned
+    episode rewards and the episodic_return notifications are identical
+    to those of a serial Experiment with the same seeds.
+
+    This requires that an episode only depends on its seed: the agent
+    must be picklable and must not learn across episodes,
+    and the env must be fully re-initialized by seed() and reset().
+    Transition notifications are not forwarded from the workers.
+    """
+
+    def __init__(self, agent, envName:str, envParameters:dict, maxSteps:int, seedlist:list, processes:int=None):
+        """
+        @param agent an AgentComponent holding an agent. Must be picklable
+        @param envName the full.path.name of the Env to create, eg
+        "aienvs.FactoryFloor.FactoryFloor.FactoryFloor"
+        @param envParameters the parameters for the env initialization
+        @param maxSteps the number of steps to run, as in Experiment
+        @param seedlist the seeds to use for the episodes, cycled.
+        Required, as the results would not be reproducible otherwise
+        @param processes number of worker processes. Defaults to cpu_count()
+        """
+        super().__init__()
+        if not seedlist:
+            raise ValueError("ParallelExperiment requires a non-empty seedlist")
+        self._agent = agent
+        self._envName = envName
+        self._envParameters = envParameters
+        self._maxSteps = maxSteps
+        self._seedcycle = cycle(seedlist)
+        self._processes = processes if processes is not None else cpu_count()
+
+    def run(self):
+        """
+        Runs episodes in parallel until the total number of steps
+        is reached, exactly as Experiment#run would.
+        Episodes that were started ahead but turn out to be beyond
+        maxSteps are discarded.
+        @return list with the total reward of each episode
+        """
+        steps = 0
+        episodeCount = 0
+        episodeRewards = []
+
+        with Pool(self._processes, _initWorker, (self._envName, self._envParameters, self._agent)) as pool:
+            # keep twice as many episodes in flight as there are workers
+            pending = deque()
+            while steps < self._maxSteps:
+                while len(pending) < 2 * self._processes:
+                    pending.append(pool.apply_async(_runEpisode, (next(self._seedcycle),)))
+                episodeSteps, episodeReward = pending.popleft().get()
+                steps += episodeSteps
+                episodeRewards.append(episodeReward)
+                logging.info("Episode return: " + str(episodeReward))
+                episodeCount += 1
+                self.notifyAll({"key":"episodic_return", "step": steps, "episode": episodeCount, "episodic_return": episodeReward})
+            pool.terminate()
+
+        return episodeRewards
@@ -1,6 +1,7 @@
 import yaml
 import logging
 from numpy import array, array_equal, ndarray
+from numpy.random import SeedSequence, default_rng
 from collections.abc import  Hashable
 
 
@@ -17,6 +18,17 @@ def getParameters(filename:str) -> dict:
     return parameters
 
 
+def createRandomGenerators(seed, n:int) -> list:
+    """
+    Create independent random streams for an env, so that envs 
+    do not need the global random generators.
+    @param seed the int seed, or None to get non-reproducible streams
+    @param n the number of streams needed
+    @return list of n numpy Generators, spawned from SeedSequence(seed)
+    """
+    return [default_rng(child) for child in SeedSequence(seed).spawn(n)]
+
+
 def rm(array:list, element: array) -> list:
     """
     @param array the list to delete element from
@@ -0,0 +1,71 @@
+from test.LoggedTestCase import LoggedTestCase
+from aienvs.FactoryFloor.FactoryFloor import FactoryFloor
+from aienvs.FactoryFloor.ArrayFactoryFloor import ArrayFactoryFloor
+from numpy import array, array_equal, zeros
+import random
+
+
+def taskGrid(state):
+    grid = zeros((state.getMap().getWidth(), state.getMap().getHeight()), dtype=int)
+    for task in state.tasks:
+        grid[task.getPosition()[0], task.getPosition()[1]] += 1
+    return grid
+
+
+class testArrayFactoryFloor(LoggedTestCase):
+
+    def test_smoke(self):
+        env = ArrayFactoryFloor()
+        obs = env.reset()
+        self.assertEqual((2, 2), obs['robots'].shape)
+        self.assertEqual(1, obs['tasks'][1, 1])
+
+    def test_same_as_FactoryFloor(self):
+        """
+        run both envs on many random settings with same seed and actions
+        """
+        for trial in range(40):
+            rnd = random.Random(trial)
+            nrobots = rnd.randint(1, 12)
+            ids = ['r' + str(i) for i in range(nrobots)]
+            parameters = {'steps': 20, 'seed': trial,
+                'robots': [{'id': robotId, 'pos': 'random'} for robotId in ids],
+                'tasks': ['random', [1, 1]],
+                'allow_robot_overlap': rnd.random() < 0.3,
+                'allow_task_overlap': rnd.random() < 0.5,
+                'N_task_appears': rnd.randint(1, 3), 'P_task_appears': 0.7,
+                'map': ['..1..2', '.**.3.', '1....9', '..*..1']}
+            actions = [{robotId: rnd.randint(0, 4) for robotId in ids} for step in range(20)]
+
+            env = FactoryFloor(parameters)
+            expected = []
+            for action in actions:
+                obs, reward, done, info = env.step(action)
+                positions = array([obs.robots[robotId].getPosition() for robotId in ids])
+                expected.append((reward, done, positions, taskGrid(obs)))
+
+            env = ArrayFactoryFloor(parameters)
+            for action, (reward, done, positions, tasks) in zip(actions, expected):
+                obs, newreward, newdone, info = env.step(action)
+                self.assertEqual(reward, newreward)
+                self.assertEqual(done, newdone)
+                self.assertTrue(array_equal(positions, obs['robots']))
+                self.assertTrue(array_equal(tasks, obs['tasks']))
+
+    def test_blocked_in_order(self):
+        parameters = {'tasks': [], 'P_task_appears': 0,
+            'P_action_succeed': {'LEFT':1, 'RIGHT':1, 'ACT':1, 'UP':1, 'DOWN':1}}
+        # r1 moves first and is blocked by r2 that did not move yet
+        env = ArrayFactoryFloor(dict(parameters, robots=[{'id': 'r1', 'pos': [0, 0]}, {'id': 'r2', 'pos': [1, 0]}]))
+        obs, reward, done, info = env.step({'r1': 4, 'r2': 4})
+        self.assertEqual([[0, 0], [2, 0]], obs['robots'].tolist())
+        # r2 moves first, so r1 can follow
+        env = ArrayFactoryFloor(dict(parameters, robots=[{'id': 'r2', 'pos': [1, 0]}, {'id': 'r1', 'pos': [0, 0]}]))
+        obs, reward, done, info = env.step({'r1': 4, 'r2': 4})
+        self.assertEqual([[2, 0], [1, 0]], obs['robots'].tolist())
+
+    def test_getState(self):
+        env = ArrayFactoryFloor({'returnRealState': True, 'seed': 1})
+        state = env.reset()
+        self.assertEqual(['robot1', 'robot2'], list(state.robots.keys()))
+        self.assertEqual([1, 1], state.tasks[0].getPosition().tolist())
@@ -0,0 +1,72 @@
+from test.LoggedTestCase import LoggedTestCase
+from aienvs.FactoryFloor.FactoryFloor import FactoryFloor
+from aienvs.FactoryFloor.BatchFactoryFloor import BatchFactoryFloor
+from numpy import array, array_equal
+import random
+
+CERTAIN = {'LEFT':1, 'RIGHT':1, 'ACT':1, 'UP':1, 'DOWN':1}
+MAP = ['..1..2', '.**.3.', '1....9', '..*..1']
+
+
+class testBatchFactoryFloor(LoggedTestCase):
+
+    def test_smoke(self):
+        env = BatchFactoryFloor({'batch_size': 10, 'seed': 1})
+        obs = env.reset()
+        self.assertEqual((10, 2, 2), obs['robots'].shape)
+        self.assertEqual((10, 10, 5), obs['tasks'].shape)
+        obs, rewards, dones, info = env.step(array([[0, 1]] * 10))
+        self.assertEqual((10,), rewards.shape)
+        self.assertEqual([False] * 10, dones.tolist())
+
+    def test_same_as_FactoryFloor_when_deterministic(self):
+        robots = [{'id': 'r' + str(i), 'pos': pos} for i, pos in enumerate([[0, 0], [1, 0], [3, 1], [0, 2], [4, 3]])]
+        parameters = {'robots': robots, 'tasks': [[2, 0], [5, 0], [4, 1], [0, 2]], 'map': MAP,
+                      'P_action_succeed': CERTAIN, 'P_task_appears': 0, 'seed': 1}
+        rnd = random.Random(1)
+        actions = [{robot['id']: rnd.randint(0, 4) for robot in robots} for step in range(40)]
+        env = FactoryFloor(parameters)
+        batch = BatchFactoryFloor(dict(parameters, batch_size=3))
+        for action in actions:
+            state, reward, done, info = env.step(action)
+            obs, rewards, dones, info = batch.step([action] * 3)
+            self.assertEqual([reward] * 3, rewards.tolist())
+            for floor in range(3):
+                self.assertEqual(state, batch.getState(floor))
+
+    def test_rules(self):
+        env = BatchFactoryFloor({'batch_size': 200, 'seed': 2, 'map': MAP, 'N_task_appears': 2,
+            'robots': [{'id': 'r' + str(i), 'pos': 'random'} for i in range(8)], 'tasks': ['random']})
+        env.reset()
+        free = array([[char != '*' for char in line] for line in MAP]).T
+        rnd = random.Random(2)
+        for step in range(50):
+            obs, rewards, dones, info = env.step(array([[rnd.randint(0, 4) for r in range(8)] for floor in range(200)]))
+            robots = obs['robots']
+            self.assertTrue(free[robots[:, :, 0], robots[:, :, 1]].all())
+            cells = robots[:, :, 0] * 4 + robots[:, :, 1]
+            for floorcells in cells:
+                self.assertEqual(8, len(set(floorcells)))
+            # no task overlap
+            self.assertTrue(obs['tasks'].max() <= 1)
+        self.assertTrue((rewards >= 0).all())
+
+    def test_setState(self):
+        env = FactoryFloor({'seed': 3})
+        batch = BatchFactoryFloor({'batch_size': 4, 'seed': 3})
+        batch.setState(2, env.getState())
+        self.assertEqual(env.getState(), batch.getState(2))
+
+    def test_seed(self):
+        parameters = {'batch_size': 20, 'map': MAP, 'robots': [{'id': 'r' + str(i), 'pos': 'random'} for i in range(3)],
+                      'tasks': ['random']}
+        observations = []
+        for seed in [4, 4, 5]:
+            env = BatchFactoryFloor(dict(parameters, seed=seed))
+            env.reset()
+            for step in range(10):
+                obs, rewards, dones, info = env.step(array([[step % 5] * 3] * 20))
+            observations.append(obs)
+        self.assertTrue(array_equal(observations[0]['tasks'], observations[1]['tasks']))
+        self.assertTrue(array_equal(observations[0]['robots'], observations[1]['robots']))
+        self.assertFalse(array_equal(observations[0]['robots'], observations[2]['robots']))
@@ -54,17 +54,69 @@ class testFactoryFloor(LoggedTestCase):
         self.assertEquals(['.8.', '3.*', '..*', '.99'], floor.getMap().getFullMap())                        
         self.assertEquals(.99 * (8 + 3 + 9 + 9) / (8 + 3 + 5 + 9 + 9 + 9 + 9 + 9), floor.getMap().getTaskProbability())
 
+    def test_getPart_robots_and_tasks(self):
+        env = FactoryFloor({'robots':[{'id':'r1', 'pos':[3, 2]}, {'id':'r2', 'pos':[0, 0]}], 'tasks':[[3, 4], [1, 1]]})
+        area = array([[2, 1], [4, 4]])
+        floor = env.getPart(area)
+        self.assertEquals(['r1'], list(floor.getState().robots.keys()))
+        self.assertEquals([1, 1], floor.getState().robots['r1'].getPosition().tolist())
+        self.assertEquals([[1, 3]], [task.getPosition().tolist() for task in floor.getState().tasks])
+        self.assertIs(floor.getMap(), env.getPart(area).getMap())
+
+    def test_refreshPart(self):
+        certain = {'LEFT':1, 'RIGHT':1, 'ACT':1, 'UP':1, 'DOWN':1}
+        env = FactoryFloor({'robots':[{'id':'r1', 'pos':[1, 1]}, {'id':'r2', 'pos':[0, 4]}], 'tasks':[],
+                            'P_task_appears':0, 'P_action_succeed':certain})
+        area = array([[2, 1], [4, 4]])
+        floor = env.getPart(area)
+        self.assertEquals([], list(floor.getState().robots.keys()))
+        env.step({'r1':4, 'r2':4})
+        env.refreshPart(floor, area)
+        self.assertEquals(['r1'], list(floor.getState().robots.keys()))
+        self.assertEquals([0, 0], floor.getState().robots['r1'].getPosition().tolist())
+        self.assertEquals(['r1'], list(floor.action_space.spaces.keys()))
+
     def test_seed(self):
         """
         we test that we are really having deterministic behaviour 
         """        
         env = FactoryFloor({'seed':42})
-        # convert to string as array needs equalsAll which is 
-        # not supported by assertEquals FAIK
-        self.assertEquals("[4 1]", str(env._getFreeMapPosition()))
-        self.assertEquals("[3 1]", str(env._getFreeMapPosition()))
-        self.assertEquals("[1 4]", str(env._getFreeMapPosition()))
-        
+        positions = [env._getFreeMapPosition().tolist() for n in range(3)]
+        env2 = FactoryFloor({'seed':42})
+        self.assertEquals(positions, [env2._getFreeMapPosition().tolist() for n in range(3)])
+        env3 = FactoryFloor({'seed':43})
+        self.assertNotEqual(positions, [env3._getFreeMapPosition().tolist() for n in range(3)])
+
+    def test_seed_independent_of_global_random(self):
+        """
+        interleaved envs with the same seed give the same episode
+        """
+        env1 = FactoryFloor({'seed':3, 'P_task_appears':0.5})
+        env2 = FactoryFloor({'seed':3, 'P_task_appears':0.5})
+        for step in range(20):
+            actions = {'robot1': step % 5, 'robot2': (step * 3) % 5}
+            random.seed(step)
+            state1, reward1, done, info = env1.step(actions)
+            state2, reward2, done, info = env2.step(actions)
+            self.assertEquals(reward1, reward2)
+            self.assertEquals(state1, state2)
+
+    def test_snapshotObservation(self):
+        """
+        without copying observations we get the same states, 
+        and states returned before are not changed
+        """
+        actions = [{'robot1': a % 5, 'robot2': (a * 3) % 5} for a in range(30)]
+        env = FactoryFloor({'seed': 3, 'steps': 30})
+        expected = [env.reset()] + [env.step(action)[0] for action in actions]
+
+        env = FactoryFloor({'seed': 3, 'steps': 30, 'copyObservation': False})
+        snapshots = [env.reset()] + [env.step(action)[0] for action in actions]
+        for state, snapshot in zip(expected, snapshots):
+            self.assertEqual(state, snapshot)
+        self.assertEqual(0, snapshots[0].step)
+        self.assertEqual(30, env.getState().step)
+
 
 if __name__ == '__main__':
     unittest.main()
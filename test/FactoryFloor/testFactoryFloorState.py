@@ -0,0 +1,72 @@
+from test.LoggedTestCase import LoggedTestCase
+from aienvs.FactoryFloor.FactoryFloor import FactoryFloor
+from aienvs.FactoryFloor.FactoryFloorState import FactoryFloorState, encodeStateAsArray
+from aienvs.FactoryFloor.FactoryFloorRobot import FactoryFloorRobot
+from aienvs.FactoryFloor.FactoryFloorTask import FactoryFloorTask
+from aienvs.FactoryFloor.Map import Map
+from numpy import array, zeros
+import copy
+
+
+class testFactoryFloorState(LoggedTestCase):
+
+    def _createState(self):
+        state = FactoryFloorState({}, [], Map(['....', '..1.', '....'], 0.5))
+        state.addRobot(FactoryFloorRobot('b', array([1, 2])))
+        state.addRobot(FactoryFloorRobot('A', array([3, 0])))
+        state.addTask(FactoryFloorTask(array([2, 1])))
+        state.addTask(FactoryFloorTask(array([2, 1])))
+        return state
+
+    def test_encode(self):
+        state = self._createState()
+        state.step = 3
+        encoded = encodeStateAsArray(state)
+        self.assertEqual((4, 3, 4), encoded.shape)
+        self.assertTrue((encoded[:, :, 0] == 3).all())
+        self.assertEqual(2, encoded[2, 1, 1])
+        self.assertEqual(2, encoded[:, :, 1].sum())
+        # A sorts before b
+        self.assertEqual(1, encoded[3, 0, 2])
+        self.assertEqual(1, encoded[1, 2, 3])
+        self.assertEqual(2, encoded[:, :, 2:].sum())
+
+    def test_encode_buffer(self):
+        state = self._createState()
+        buffer = zeros((4, 3, 4))
+        buffer.fill(7)
+        self.assertIs(buffer, encodeStateAsArray(state, buffer))
+        self.assertTrue((encodeStateAsArray(state) == buffer).all())
+        with self.assertRaises(ValueError):
+            encodeStateAsArray(state, zeros((4, 3, 3)))
+
+    def test_incremental_hash(self):
+        state = self._createState()
+        hash(state)
+        state.moveRobot('b', array([2, 2]))
+        state.removeTask(state.tasks[0])
+        state.addTask(FactoryFloorTask(array([0, 0])))
+        fresh = FactoryFloorState(dict(state.robots), list(state.tasks), state.getMap())
+        self.assertEqual(hash(fresh), hash(state))
+        self.assertEqual(fresh, state)
+
+    def test_eq(self):
+        state = self._createState()
+        other = copy.deepcopy(state)
+        self.assertEqual(state, other)
+        other.moveRobot('A', array([3, 1]))
+        self.assertNotEqual(state, other)
+        other.moveRobot('A', array([3, 0]))
+        self.assertEqual(hash(state), hash(other))
+        other.step = 1
+        self.assertNotEqual(state, other)
+
+    def test_hash_during_run(self):
+        env = FactoryFloor({'seed': 1, 'steps': 50})
+        env.reset()
+        for step in range(50):
+            state, reward, done, info = env.step({'robot1': step % 5, 'robot2': (step * 3) % 5})
+            hash(env.getState())
+            fresh = FactoryFloorState(dict(state.robots), list(state.tasks), state.getMap())
+            fresh.step = state.step
+            self.assertEqual(hash(fresh), hash(env.getState()))
@@ -1,8 +1,12 @@
 from test.LoggedTestCase import LoggedTestCase
 from unittest.mock import Mock
 from aienvs.FactoryFloor.FactoryGraph import FactoryGraph
+import aienvs.FactoryFloor.FactoryGraph as FactoryGraph_module
 from numpy import array
 from aienvs.FactoryFloor.Map import Map
+from networkx import shortest_path
+import tempfile
+import os
 
 
 class testFactoryGraph(LoggedTestCase):
@@ -27,3 +31,50 @@ class testFactoryGraph(LoggedTestCase):
         self.assertFalse(g.has_node((1, 1)))
         self.assertFalse(g.has_edge((0, 1), (1, 1)))
         
+    def test_distances(self):
+        map = Map(['...', '.*.', '..*', '*..'], .8)
+        g = FactoryGraph(map)
+        self.assertEqual(0, g.getDistance((0, 0), (0, 0)))
+        self.assertEqual(2, g.getDistance((0, 0), (2, 0)))
+        self.assertEqual(4, g.getDistance((0, 0), (1, 3)))
+        for source in g.nodes:
+            for target in g.nodes:
+                self.assertEqual(len(shortest_path(g, source, target)) - 1, g.getDistance(source, target))
+
+    def test_unreachable(self):
+        g = FactoryGraph(Map(['.*.'], .8))
+        self.assertEqual(-1, g.getDistance((0, 0), (2, 0)))
+        self.assertIsNone(g.getNextStep((0, 0), (2, 0)))
+        with self.assertRaises(ValueError):
+            g.getDistance((0, 0), (1, 0))
+
+    def test_getDistances(self):
+        g = FactoryGraph(Map(['....', '.**.', '....'], .8))
+        distances = g.getDistances(array([[0, 0], [3, 2]]), array([[3, 0], [0, 2], [1, 0]]))
+        self.assertEqual([[3, 2, 1], [2, 3, 4]], distances.tolist())
+
+    def test_getNextStep(self):
+        g = FactoryGraph(Map(['....', '.**.', '....'], .8))
+        self.assertEqual((1, 2), g.getNextStep((0, 2), (3, 2)))
+        self.assertEqual((3, 2), g.getNextStep((3, 2), (3, 2)))
+
+    def test_cacheDir(self):
+        map = Map(['..', '.*'], .8)
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(2, FactoryGraph(map, directory).getDistance((1, 0), (0, 1)))
+            self.assertEqual(1, len(os.listdir(directory)))
+            self.assertEqual(2, FactoryGraph(map, directory).getDistance((1, 0), (0, 1)))
+
+    def test_distances_in_chunks(self):
+        map = Map(['....*', '.*...', '...*.', '*....'], .8)
+        expected = FactoryGraph(map)._computeDistances()
+        chunk = FactoryGraph_module.BFS_CHUNK
+        try:
+            FactoryGraph_module.BFS_CHUNK = 3
+            self.assertEqual(expected.tolist(), FactoryGraph(map)._computeDistances().tolist())
+        finally:
+            FactoryGraph_module.BFS_CHUNK = chunk
+        g = FactoryGraph(map)
+        for source in g.nodes:
+            for target in g.nodes:
+                self.assertEqual(len(shortest_path(g, source, target)) - 1, g.getDistance(source, target))
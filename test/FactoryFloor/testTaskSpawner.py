@@ -0,0 +1,46 @@
+from test.LoggedTestCase import LoggedTestCase
+from aienvs.FactoryFloor.TaskSpawner import TaskSpawner
+from aienvs.FactoryFloor.Map import Map
+from numpy.random import seed as npseed
+
+
+class testTaskSpawner(LoggedTestCase):
+
+    def _frequencies(self, spawner, n=20000):
+        counts = {}
+        for i in range(n):
+            pos = tuple(spawner.sample())
+            counts[pos] = counts.get(pos, 0) + 1
+        return {pos: count / n for pos, count in counts.items()}
+
+    def test_distribution(self):
+        npseed(1)
+        spawner = TaskSpawner(Map(['1.2', '.*.', '3.4'], 1), False)
+        freqs = self._frequencies(spawner)
+        self.assertAlmostEqual(0.1, freqs[(0, 0)], delta=0.01)
+        self.assertAlmostEqual(0.4, freqs[(2, 2)], delta=0.01)
+
+    def test_occupied_excluded(self):
+        npseed(1)
+        spawner = TaskSpawner(Map(['1.2', '.*.', '3.4'], 1), False, [[2, 2], [0, 0]])
+        freqs = self._frequencies(spawner)
+        self.assertEqual({(2, 0), (0, 2)}, set(freqs.keys()))
+        self.assertAlmostEqual(0.4, freqs[(2, 0)], delta=0.01)
+        spawner.remove([2, 2])
+        self.assertAlmostEqual(4 / 9, self._frequencies(spawner)[(2, 2)], delta=0.01)
+
+    def test_full(self):
+        spawner = TaskSpawner(Map(['1.', '.2'], 1), False)
+        spawner.add(spawner.sample())
+        spawner.add(spawner.sample())
+        self.assertIsNone(spawner.sample())
+        spawner.remove([1, 1])
+        self.assertEqual([1, 1], spawner.sample().tolist())
+
+    def test_overlap(self):
+        spawner = TaskSpawner(Map(['1.', '.2'], 1), True, [[0, 0], [1, 1]])
+        self.assertIsNotNone(spawner.sample())
+
+    def test_no_tasks(self):
+        spawner = TaskSpawner(Map(['..', '..'], 1), True)
+        self.assertIsNone(spawner.sample())
@@ -17,6 +17,8 @@ from unittest.mock import Mock
 # import io
 from aienvs.GroupingRobots.WorldState import WorldState
 from aienvs.GroupingRobots.Robot import Robot
+from aienvs.BasicMap import BasicMap
+from numpy.random import default_rng
 
 # from aienvs.loggers.PickleLogger import PickleLogger
 # logger = logging.getLogger()
@@ -113,6 +115,41 @@ class testWorldState(LoggedTestCase):
         self.assertNotEquals(s1, s5)        
         self.assertNotEquals(hash(s1), hash(s5))        
 
+    def test_getReward(self):
+        themap = BasicMap(['....', '....'])
+        s = WorldState({ROBOT1:Robot(ROBOT1, A), ROBOT2:Robot(ROBOT2, B), ROBOT3:Robot(ROBOT3, A)}, themap, 1)
+        self.assertEquals(2, s.getReward())
+        s = s.withRobot(Robot(ROBOT2, A))
+        self.assertEquals(6, s.getReward())
+        s = s.withStep().withRobot(Robot(ROBOT1, C))
+        self.assertEquals(2, s.getReward())
+        self.assertEquals(set([ROBOT2, ROBOT3]), set(robot.getId() for robot in s.getGroupedRobots()))
+
+    def test_withTeleport_real_map(self):
+        themap = BasicMap(['..*', '...'])
+        s = WorldState({ROBOT1:Robot(ROBOT1, A), ROBOT2:Robot(ROBOT2, array([0, 0])), ROBOT3:Robot(ROBOT3, A)}, themap, 1)
+        s = s.withTeleport(default_rng(1))
+        self.assertEquals(0, s.getReward())
+        self.assertEquals(set(), s.getGroupedRobots())
+        self.assertEquals(2, len(s.getFreeWithoutRobot()))
+        for robot in s.getRobots():
+            self.assertTrue(themap.isFree(robot.getPosition()))
+
+    def test_withActions(self):
+        themap = BasicMap(['..*', '...'])
+        robot1 = Robot(ROBOT1, array([1, 0]))
+        robot2 = Robot(ROBOT2, array([0, 1]))
+        robot3 = Robot(ROBOT3, array([2, 1]))
+        s = WorldState({ROBOT1:robot1, ROBOT2:robot2, ROBOT3:robot3}, themap, 1)
+        # robot1 blocked by wall, robot2 moves up, robot3 has no action
+        actions = {ROBOT1:3, ROBOT2:0}
+        expected = s.withAction(robot1, 3).withAction(robot2, 0)
+        s = s.withActions(actions)
+        self.assertEquals(expected, s)
+        self.assertTrue(array_equal(array([1, 0]), s.getRobots()[0].getPosition()))
+        self.assertTrue(array_equal(array([0, 0]), s.getRobots()[1].getPosition()))
+        self.assertIs(robot3, s.getRobots()[2])
+
     ################# private #################
     def _mockRobot(self, id:str, pos) -> Robot:
         robot = Mock()
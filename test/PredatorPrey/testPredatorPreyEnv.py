@@ -3,6 +3,7 @@ from aienvs.PredatorPrey.PredatorPreyState import PredatorPreyState
 from aienvs.BasicMap import BasicMap
 from aienvs.PredatorPrey.Predator import Predator
 from numpy import array
+from numpy.random import default_rng
 from aienvs.PredatorPrey.PredatorPreyEnv import PredatorPreyEnv
 
 
@@ -28,3 +29,34 @@ class testPredatorPreyEnv(LoggedTestCase):
         env.step({'predator1': 0, 'predator2': 0})  # both North
         print("both predators move north")
         env.render()
+
+    def testObservation(self):
+        env = PredatorPreyEnv({'observationRadius': 1})
+        obs, reward, done, info = env.step({'predator1': 0, 'predator2': 0})
+        self.assertEqual((2, 3, 3, 3), obs.shape)
+        self.assertTrue(env.observation_space.contains(obs))
+
+    def testDictObservation(self):
+        env = PredatorPreyEnv({'dictObservation': True})
+        obs, reward, done, info = env.step({'predator1': 0, 'predator2': 0})
+        self.assertEqual(['predator1', 'predator2'], list(obs.keys()))
+        self.assertEqual(env.getState().getObservationArray()[0].tolist(), obs['predator1'])
+
+    def testSimulate(self):
+        env = PredatorPreyEnv({'p': -1})
+        state = env.getState()
+        newstate, reward = env.simulate(state, {'predator1': 4, 'predator2': 0})
+        self.assertEqual(-1, reward)
+        self.assertIs(state, env.getState())
+        self.assertEqual(str(array([7, 3])), str(newstate.getPredators()[1].getPosition()))
+        # same rng seed gives the same state
+        again, reward = env.simulate(state, {'predator1': 4, 'predator2': 0}, default_rng(3))
+        self.assertEqual(again, env.simulate(state, {'predator1': 4, 'predator2': 0}, default_rng(3))[0])
+
+    def testSeed(self):
+        env1 = PredatorPreyEnv({'seed': 5})
+        env2 = PredatorPreyEnv({'seed': 5})
+        for step in range(10):
+            env1.step({'predator1': step % 4, 'predator2': 1})
+            env2.step({'predator1': step % 4, 'predator2': 1})
+            self.assertEqual(env1.getState(), env2.getState())
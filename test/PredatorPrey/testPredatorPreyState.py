@@ -3,7 +3,9 @@ from test.LoggedTestCase import LoggedTestCase
 from aienvs.PredatorPrey.PredatorPreyState import PredatorPreyState
 from aienvs.BasicMap import BasicMap
 from aienvs.PredatorPrey.Predator import Predator
+from aienvs.PredatorPrey.Prey import Prey
 from numpy import array
+import random
 
 testmap = BasicMap(['...', '...', '...'])
 pred1 = Predator('pred1', array([0, 0]), True)
@@ -99,3 +101,109 @@ class testPredatorPreyState(LoggedTestCase):
         env1 = env.withStep(pred1, 0)  # north, but prey1 is at [0 1]
         self.assertEqual(str(array([0, 0])), str(env1.getPredators()[0].getPosition()))
 
+    def testOccupancyAfterSteps(self):
+        env = PredatorPreyState([pred1, pred2], [prey1], testmap, 1, 1, 2)
+        env1 = env.withStep(pred1, 1).withPreyStep(prey1, 1)  # both east
+        self.assertTrue(env1.isPredatorAt(array([1, 0])))
+        self.assertFalse(env1.isPredatorAt(array([0, 0])))
+        self.assertTrue(env1.isPreyAt(array([1, 1])))
+        self.assertFalse(env1.isPreyAt(array([0, 1])))
+        self.assertFalse(env1.isPreyAt(array([5, -1])))
+        # the original state is not changed
+        self.assertTrue(env.isPredatorAt(array([0, 0])))
+        self.assertTrue(env.isPreyAt(array([0, 1])))
+
+    def testOccupancyAfterCatch(self):
+        env = PredatorPreyState([pred1, pred3], [prey1], testmap, 1, 1, 2)
+        env1 = env.withCatch(prey1, pred1, pred3)
+        for pos in [array([0, 0]), array([1, 1]), array([0, 1])]:
+            self.assertFalse(env1.isPredatorAt(pos) or env1.isPreyAt(pos))
+
+    def testGetObservationArray(self):
+        env = PredatorPreyState([pred1, pred2], [prey1], testmap, 1, 1, 1)
+        obs = env.getObservationArray()
+        self.assertEqual((2, 3, 5, 5), obs.shape)
+        self.assertEqual('uint8', str(obs.dtype))
+        self.assertEqual(env.getObservationMatrix()['pred1'], obs[0].tolist())
+        # pred2 at [1,2] sees pred1 at [0,0] at dx=-1, dy=-2
+        self.assertEqual(1, obs[1, 0, 0, 1])
+
+    def testGetObservationArrayRadius(self):
+        env = PredatorPreyState([pred2], [prey1], testmap, 1, 1, 1)
+        obs = env.getObservationArray(1)
+        self.assertEqual((1, 3, 3, 3), obs.shape)
+        self.assertEqual([[0, 0, 0], [0, 1, 0], [0, 0, 0]], obs[0, 0].tolist())
+        self.assertEqual([[0, 0, 0], [0, 0, 0], [1, 1, 1]], obs[0, 2].tolist())
+        self.assertEqual((0, 3, 7, 7), PredatorPreyState([], [prey1], testmap, 1, 1, 1).getObservationArray(3).shape)
+
+    def _sequentialStep(self, state, actions, preyActions, p):
+        """
+        the joint step done with the single-entity transitions
+        """
+        for prey in state.getPreys():
+            adjacent = [adj for adj in state.getAdjacentPredators(prey.getPosition()) if actions[adj.getId()] == 4]
+            if len(adjacent) >= 2:
+                state = state.withCatch(prey, adjacent[0], adjacent[1])
+        for predator in state.getPredators():
+            if actions[predator.getId()] == 4:
+                state = state.withReward(p)
+            else:
+                state = state.withStep(predator, actions[predator.getId()])
+        for prey in state.getPreys():
+            state = state.withPreyStep(prey, preyActions[prey.getId()])
+        return state.increment()
+
+    def testWithJointStep(self):
+        rnd = random.Random(1)
+        themap = BasicMap(['.....', '..*..', '.....', '.*...'])
+        free = [(x, y) for x in range(5) for y in range(4) if themap.isFree(array([x, y]))]
+        for episode in range(20):
+            cells = rnd.sample(free, 9)
+            state = PredatorPreyState([Predator('pred' + str(i), array(cell), True) for i, cell in enumerate(cells[:6])], \
+                                      [Prey('prey' + str(i), array(cell), True) for i, cell in enumerate(cells[6:])], themap, 0, 0, 10)
+            while not state.isFinal():
+                actions = {pred.getId(): rnd.choice([0, 1, 2, 3, 4, 4]) for pred in state.getPredators()}
+                preyActions = {prey.getId(): rnd.randint(0, 3) for prey in state.getPreys()}
+                expected = self._sequentialStep(state, actions, preyActions, -1)
+                state = state.withJointStep(actions, preyActions, -1)
+                self.assertEqual(expected.getReward(), state.getReward())
+                self.assertEqual([(p.getId(), p.getPosition().tolist()) for p in expected.getPredators()], \
+                                 [(p.getId(), p.getPosition().tolist()) for p in state.getPredators()])
+                self.assertEqual([(p.getId(), p.getPosition().tolist()) for p in expected.getPreys()], \
+                                 [(p.getId(), p.getPosition().tolist()) for p in state.getPreys()])
+                self.assertEqual(expected.getObservationArray().tolist(), state.getObservationArray().tolist())
+                # the key starts with the step
+                self.assertEqual(expected.getKey()[0], state.getKey()[0])
+                self.assertEqual(expected, state)
+
+    def testWithJointStepLastCatch(self):
+        themap = BasicMap(['...', '...'])
+        state = PredatorPreyState([Predator('pred1', array([0, 0]), True), Predator('pred2', array([2, 0]), True)], \
+                                  [Prey('prey1', array([1, 0]), True), Prey('prey2', array([1, 1]), True)], themap, 0, 0, 10)
+        actions = {'pred1': 4, 'pred2': 4}
+        preyActions = {'prey1': 0, 'prey2': 3}
+        expected = self._sequentialStep(state, actions, preyActions, -1)
+        joint = state.withJointStep(actions, preyActions, -1)
+        self.assertTrue(joint.isFinal())
+        self.assertEqual(0, joint.getKey()[0])
+        self.assertEqual(10, joint.getReward())
+        self.assertEqual(expected, joint)
+        self.assertEqual(hash(expected), hash(joint))
+
+    def testWithJointStepShares(self):
+        env = PredatorPreyState([pred1, pred2], [prey1], testmap, 1, 1, 3)
+        env1 = env.withJointStep({'pred1': 1, 'pred2': 4}, {'prey1': 2}, 0)
+        self.assertEqual([0, 0], env.getPredators()[0].getPosition().tolist())
+        self.assertEqual([1, 0], env1.getPredators()[0].getPosition().tolist())
+        self.assertIs(env.getPredators()[1], env1.getPredators()[1])
+
+    def testKeyAndHash(self):
+        env1 = PredatorPreyState([pred1, pred2], [prey1], testmap, 1, 1, 3)
+        env2 = PredatorPreyState([Predator('pred1', array([0, 0]), True), pred2], [prey1], testmap, 1, 1, 3)
+        self.assertEqual(env1, env2)
+        self.assertEqual(hash(env1), hash(env2))
+        self.assertEqual(1, len({env1, env2}))
+        self.assertNotEqual(env1, env1.withStep(pred1, 1))
+        self.assertNotEqual(env1, env1.increment())
+        self.assertNotEqual(env1, env1.withReward(1))
+        self.assertEqual(env1, env1.withStep(pred1, 1).withStep(Predator('pred1', array([1, 0]), True), 3))
@@ -0,0 +1,188 @@
+from test.LoggedTestCase import LoggedTestCase
+from unittest.mock import Mock, patch
+from types import SimpleNamespace
+from aienvs.Sumo.LDM import ldm
+import os
+import sys
+import random
+
+CONSTANTS = SimpleNamespace(VAR_POSITION=0x42, VAR_SPEED=0x40, VAR_ALLOWED_SPEED=0xb7, VAR_WAITING_TIME=0x7a,
+                            VAR_DEPARTED_VEHICLES_IDS=0x74, TL_RED_YELLOW_GREEN_STATE=0x20, TL_CURRENT_PHASE=0x28)
+
+
+def vehicle(x, y, speed=10., allowedSpeed=10., waitingTime=0.):
+    '''
+    @return subscription result of a vehicle
+    '''
+    return {CONSTANTS.VAR_POSITION: (x, y), CONSTANTS.VAR_SPEED: speed,
+            CONSTANTS.VAR_ALLOWED_SPEED: allowedSpeed, CONSTANTS.VAR_WAITING_TIME: waitingTime}
+
+
+class testLDM(LoggedTestCase):
+    '''
+    The SUMO client is a Mock, so these tests run without SUMO.
+    '''
+
+    def _createLdm(self, vehicleIds=[], waitingPenalty=1, new_reward=False, lights={}) -> ldm:
+        '''
+        @param vehicleIds the ids of the vehicles that are in the simulation at init
+        @param lights dict with the state of each traffic light
+        @return initialized ldm on a 100x100 meter net, with 1 pixel per meter
+        '''
+        client = Mock()
+        client.__name__ = "traci"
+        client.constants = CONSTANTS
+        client.simulation.getNetBoundary.return_value = ((10., 10.), (110., 110.))
+        client.trafficlight.getIDList.return_value = list(lights.keys())
+        client.trafficlight.getAllSubscriptionResults.return_value = \
+            {lightid: {CONSTANTS.TL_RED_YELLOW_GREEN_STATE: state} for lightid, state in lights.items()}
+        client.vehicle.getIDList.return_value = vehicleIds
+        with patch.dict(sys.modules, {'traci': client}), patch.dict(os.environ, {'SUMO_HOME': '/sumo'}):
+            theldm = ldm(using_libsumo=False)
+        theldm.init(waitingPenalty, new_reward)
+        theldm.setResolutionInPixelsPerMeter(1, 1)
+        return theldm
+
+    def _step(self, theldm, departed:list, results:dict):
+        '''
+        do a simulation step where given vehicles departed and the subscriptions give results
+        '''
+        client = theldm.SUMO_client
+        client.simulation.getSubscriptionResults.return_value = {CONSTANTS.VAR_DEPARTED_VEHICLES_IDS: departed}
+        client.vehicle.getAllSubscriptionResults.return_value = results
+        theldm.step()
+
+    def test_subscribe_once(self):
+        theldm = self._createLdm(['v0'])
+        client = theldm.SUMO_client
+        client.simulation.subscribe.assert_called_once_with((CONSTANTS.VAR_DEPARTED_VEHICLES_IDS,))
+        self._step(theldm, ['v1'], {'v0': vehicle(20, 20), 'v1': vehicle(30, 30)})
+        self._step(theldm, ['v2'], {'v0': vehicle(21, 20), 'v1': vehicle(31, 30), 'v2': {}})
+        self._step(theldm, [], {'v1': vehicle(32, 30), 'v2': vehicle(40, 40)})
+        subscribed = [call[0][0] for call in client.vehicle.subscribe.call_args_list]
+        self.assertEqual(['v0', 'v1', 'v2'], subscribed)
+        self.assertEqual(3, client.vehicle.getAllSubscriptionResults.call_count)
+        client.vehicle.getSubscriptionResults.assert_not_called()
+
+    def test_empty_results_dropped(self):
+        theldm = self._createLdm()
+        self._step(theldm, ['v1', 'v2'], {'v1': vehicle(20, 20), 'v2': {}})
+        self.assertEqual(['v1'], list(theldm.getVehicles()))
+        self.assertEqual(10., theldm.getVehicleAllowedSpeed('v1'))
+
+    def _rewards(self, function, waitingPenalty=1, new_reward=False, lights={}) -> list:
+        '''
+        @return the global rewards of two steps with a fixed vehicle table
+        '''
+        theldm = self._createLdm(waitingPenalty=waitingPenalty, new_reward=new_reward, lights=lights)
+        self._step(theldm, ['v1', 'v2', 'v3'], {'v1': vehicle(20, 20, speed=5.), 'v2': vehicle(50, 50, speed=0., waitingTime=3.), \
+                                                'v3': vehicle(80, 80, waitingTime=1.)})
+        first = theldm.getRewardByCorners((0, 0), (10, 10), False, [None], function)[None]
+        self._step(theldm, ['v4'], {'v1': vehicle(20, 21, speed=0.), 'v3': vehicle(80, 81, speed=6.), 'v4': vehicle(30, 30, speed=0.)})
+        second = theldm.getRewardByCorners((0, 0), (10, 10), False, [None], function)[None]
+        return [first, second]
+
+    def test_reward_default(self):
+        # -0.5 delay - 0.5 clipped waiting time per vehicle
+        rewards = self._rewards("default")
+        self.assertAlmostEqual(-0.25 - 1 - 0.5, rewards[0])
+        self.assertAlmostEqual(-0.5 - 0.2 - 0.5, rewards[1])
+
+    def test_reward_default_no_waiting_penalty(self):
+        rewards = self._rewards("default", waitingPenalty=0)
+        self.assertAlmostEqual(-0.5 - 1 - 0, rewards[0])
+        self.assertAlmostEqual(-1 - 0.4 - 1, rewards[1])
+
+    def test_reward_new_reward(self):
+        rewards = self._rewards("default", new_reward=True)
+        self.assertAlmostEqual(0 - 1 - 1, rewards[0])
+        self.assertAlmostEqual(0, rewards[1])
+
+    def test_reward_elise(self):
+        rewards = self._rewards("elise")
+        # 0.3 delay, 0.3 wait penalty (-0.5 for waiting 1, -1 for longer)
+        self.assertAlmostEqual(-0.15 - (0.3 + 0.3) - 0.15, rewards[0])
+        # v1 brakes from 5 to 0, v3 from 10 to 6 is not a hard brake, v4 has no previous speed
+        self.assertAlmostEqual(-(0.3 + 0.2) - 0.12 - 0.3, rewards[1])
+
+    def test_reward_elise_light_flip(self):
+        rewards = self._rewards("elise", lights={'tl0': 'ryry', 'tl1': 'GrGr'})
+        self.assertAlmostEqual(-1.5 - 0.9, rewards[0])
+
+    def test_reward_eval(self):
+        rewards = self._rewards("eval")
+        # average over vehicles of their average speed / allowed speed
+        self.assertAlmostEqual((0.5 + 0 + 1) / 3, rewards[0])
+        self.assertAlmostEqual((0.25 + 0 + 0.8 + 0) / 4, rewards[1])
+
+    def test_rasterize_vehicles(self):
+        theldm = self._createLdm()
+        # net boundary is extended by 10 meters, so map cell [x,y] is at meters (x+0.5, y+0.5)
+        self._step(theldm, ['v1', 'v2', 'v3', 'v4'], {'v1': vehicle(20, 20), 'v2': vehicle(20, 20), \
+                                                      'v3': vehicle(-50, 5), 'v4': vehicle(500, 30)})
+        self.assertEqual(2, theldm._arrayMap[20, 20])
+        self.assertEqual(2, theldm._arrayMap.sum())
+        self._step(theldm, [], {'v1': vehicle(30, 30)})
+        self.assertEqual(0, theldm._arrayMap[20, 20])
+        self.assertEqual(1, theldm._arrayMap[30, 30])
+        self.assertEqual(1, theldm._arrayMap.sum())
+
+    def test_rasterize_lights(self):
+        theldm = self._createLdm(lights={'tl0': 'Gyr'})
+        theldm.setPositionOfTrafficHeads('tl0', [(40, 40), (40, 40), (60, 60)])
+        self._step(theldm, [], {'v1': vehicle(40, 40)})
+        self.assertAlmostEqual(1 + 0.8 + 0.5, theldm._arrayMap[40, 40])
+        self.assertAlmostEqual(0.2, theldm._arrayMap[60, 60])
+        theldm.setPositionOfTrafficHeads('tl0', [(70, 70), (70, 70), (70, 70)])
+        self._step(theldm, [], {})
+        self.assertEqual(0, theldm._arrayMap[40, 40])
+        self.assertAlmostEqual(1.5, theldm._arrayMap.sum())
+
+    def test_rasterWindow(self):
+        theldm = self._createLdm()
+        theldm.setRasterWindow((0, 0), (50, 50))
+        self._step(theldm, ['v1', 'v2'], {'v1': vehicle(20, 20), 'v2': vehicle(80, 80)})
+        self.assertEqual(1, theldm._arrayMap.sum())
+        self.assertEqual(1, theldm.getMapSliceByCorners((0, 0), (50, 50)).sum())
+        self.assertEqual(0, theldm.getMapSliceByCorners((60, 60), (100, 100)).sum())
+        theldm.setRasterWindow(None)
+        self._step(theldm, [], {'v1': vehicle(20, 20), 'v2': vehicle(80, 80)})
+        self.assertEqual(1, theldm.getMapSliceByCorners((60, 60), (100, 100)).sum())
+
+    def test_getMapSliceByCorners_copy(self):
+        theldm = self._createLdm()
+        self._step(theldm, ['v1'], {'v1': vehicle(20, 20)})
+        mapslice = theldm.getMapSliceByCorners((0, 0), (50, 50))
+        self._step(theldm, [], {})
+        self.assertEqual(1, mapslice.sum())
+
+    def test_getRewardByCorners_radii(self):
+        theldm = self._createLdm()
+        rnd = random.Random(1)
+        results = {'v' + str(i): vehicle(rnd.uniform(10, 90), rnd.uniform(10, 90), speed=rnd.uniform(0, 10), \
+                                         waitingTime=rnd.choice([0., 1., 2.])) for i in range(50)}
+        self._step(theldm, list(results.keys()), results)
+        radii = [20, None, 0.1, 5, 45]
+        rewards = theldm.getRewardByCorners((40, 40), (60, 60), True, radii, "default")
+        for radius in radii:
+            expected = 0
+            for result in results.values():
+                x, y = result[CONSTANTS.VAR_POSITION]
+                if radius is None or (abs(x - 50) <= radius and abs(y - 50) <= radius):
+                    expected += -0.5 * max(0, 1 - result[CONSTANTS.VAR_SPEED] / 10.) - 0.5 * min(result[CONSTANTS.VAR_WAITING_TIME], 1)
+            self.assertAlmostEqual(expected, rewards[radius])
+        self.assertEqual(0, rewards[0.1])
+        self.assertEqual(radii, list(rewards.keys()))
+        notlocal = theldm.getRewardByCorners((40, 40), (60, 60), False, radii, "default")
+        for radius in radii:
+            self.assertAlmostEqual(rewards[None], notlocal[radius])
+
+    def test_getRewardByCorners_elise_brake_all_radii(self):
+        theldm = self._createLdm()
+        self._step(theldm, ['v1', 'v2'], {'v1': vehicle(50, 50), 'v2': vehicle(70, 70)})
+        theldm.getRewardByCorners((40, 40), (60, 60), True, [5, 30], "elise")
+        self._step(theldm, [], {'v1': vehicle(50, 51, speed=5.), 'v2': vehicle(70, 71)})
+        rewards = theldm.getRewardByCorners((40, 40), (60, 60), True, [5, 30], "elise")
+        # v1 brakes hard, which counts for every radius
+        self.assertAlmostEqual(-0.2 - 0.15, rewards[5])
+        self.assertAlmostEqual(-0.2 - 0.15, rewards[30])
@@ -3,6 +3,8 @@ from unittest.mock import Mock
 from aienvs.gym.DecoratedSpace import DecoratedSpace
 from gym.spaces import Space, Dict, Discrete, MultiDiscrete, Box, Tuple, MultiBinary
 import math
+import copy
+import numpy
 
 '''
 first element of each list: the space dimensions
@@ -86,3 +88,68 @@ class DecoratedSpaceTest(LoggedTestCase):
         self.assertEquals([], space.getSubSpaces())
         # reverse of normal binary notation
         self.assertEquals([0, 1, 0, 1, 1, 0, 1], list(space.getById(64 + 16 + 8 + 2)))
+
+    def test_Dict_cached(self):
+        space = DecoratedSpace.create(Dict({'a':Discrete(5), 'b':Discrete(2)}))
+        self.assertIs(space.getSubSpace('a'), space.getSubSpaces()[0])
+
+    def test_Dict_batch(self):
+        space = DecoratedSpace.create(Dict({'a':Discrete(5), 'b':Discrete(2), 'c':Discrete(3)}))
+        indices = numpy.arange(space.getSize())
+        rows = space.getByIdBatch(indices)
+        self.assertEqual((30, 3), rows.shape)
+        for n in [0, 7, 29]:
+            self.assertEquals(list(space.getById(n).values()), rows[n].tolist())
+        self.assertEquals(indices.tolist(), space.getIndexOfBatch(rows).tolist())
+        self.assertEquals([8, 29], space.getIndexOfBatch([space.getById(8), space.getById(29)]).tolist())
+
+    def test_Dict_with_Dict_batch(self):
+        space = DecoratedSpace.create(Dict({'p':Dict({'a':Discrete(5), 'b':Discrete(2)}), 'q':Discrete(7)}))
+        self.assertEquals([[4, 3]], space.getByIdBatch([34]).tolist())
+        self.assertEquals([34], space.getIndexOfBatch([{'p':{'a':4, 'b':0}, 'q':3}]).tolist())
+
+    def test_MultiDiscrete_batch(self):
+        space = DecoratedSpace.create(MultiDiscrete([5, 2, 3]))
+        self.assertEquals([[2, 1, 2], [0, 0, 0]], space.getByIdBatch([27, 0]).tolist())
+        self.assertEquals([27], space.getIndexOfBatch(numpy.array([[2, 1, 2]])).tolist())
+
+    def test_batch_too_large(self):
+        space = DecoratedSpace.create(Dict({'%02d' % n:Discrete(5) for n in range(30)}))
+        self.assertEquals(5 ** 30, space.getSize())
+        self.assertEquals(4 * 5 ** 29, space.getIndexOf({'%02d' % n:(4 if n == 29 else 0) for n in range(30)}))
+        with self.assertRaises(OverflowError):
+            space.getByIdBatch([0])
+        with self.assertRaises(OverflowError):
+            DecoratedSpace.create(Box(low=-1.0, high=2.0, shape=(3, 4))).getIndexOfBatch([])
+
+    def test_Dict_iterate(self):
+        space = DecoratedSpace.create(Dict({'p':Dict({'a':Discrete(3), 'b':Discrete(2)}), 'q':Discrete(4)}))
+        elements = [copy.deepcopy(element) for element in space]
+        self.assertEquals([space.getById(n) for n in range(space.getSize())], elements)
+
+    def test_Tuple_iterate(self):
+        space = DecoratedSpace.create(Tuple((Discrete(3), Discrete(2))))
+        self.assertEquals([space.getById(n) for n in range(6)], list(space.iterate()))
+
+    def test_MultiDiscrete_iterate(self):
+        space = DecoratedSpace.create(MultiDiscrete([3, 2, 2]))
+        elements = [element.tolist() for element in space.iterate()]
+        self.assertEquals([space.getById(n).tolist() for n in range(12)], elements)
+
+    def test_iterIndices(self):
+        space = DecoratedSpace.create(Dict({'a':Discrete(5), 'b':Discrete(2), 'c':Discrete(3)}))
+        allrows = space.getByIdBatch(numpy.arange(space.getSize())).tolist()
+        self.assertEquals(allrows, [row.tolist() for row in space.iterIndices()])
+        chunks = list(space.iterIndices(chunkSize=8))
+        self.assertEquals([8, 8, 8, 6], [len(chunk) for chunk in chunks])
+        self.assertEquals(allrows, numpy.concatenate(chunks).tolist())
+
+    def test_iterate_large_lazy(self):
+        space = DecoratedSpace.create(Dict({'%02d' % n:Discrete(5) for n in range(30)}))
+        iterator = space.iterate()
+        next(iterator)
+        self.assertEquals(space.getById(1), next(iterator))
+
+    def test_iterate_Box(self):
+        with self.assertRaises(Exception):
+            next(DecoratedSpace.create(Box(low=-1.0, high=2.0, shape=(3, 4))).iterate())
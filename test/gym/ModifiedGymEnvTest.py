@@ -9,3 +9,19 @@ class ModifiedGymEnvTest(LoggedTestCase):
         gymenv = Mock()
         actmodifier = Mock()  # PackedSpace
         ModifiedGymEnv(gymenv, actmodifier)
+
+    def test_step_checks_space_once(self):
+        gymenv = Mock()
+        actmodifier = Mock()
+        actmodifier.getOriginalSpace.return_value = gymenv.action_space
+        env = ModifiedGymEnv(gymenv, actmodifier)
+        env.step({'a_b':1})
+        env.step({'a_b':2})
+        self.assertEqual(1, actmodifier.getOriginalSpace.call_count)
+        self.assertEqual(2, gymenv.step.call_count)
+
+    def test_step_bad_space(self):
+        env = ModifiedGymEnv(Mock(), Mock())
+        with self.assertRaises(Exception) as context:
+            env.step({'a_b':1})
+        self.assertContains("can't handle action space change", context.exception)
@@ -2,6 +2,8 @@ from test.LoggedTestCase import LoggedTestCase
 from unittest.mock import Mock
 from aienvs.gym.PackedSpace import PackedSpace
 from gym.spaces import Dict  , Discrete
+from collections import OrderedDict
+import numpy
 
 
 class PackedSpaceTest(LoggedTestCase):
@@ -26,3 +28,32 @@ class PackedSpaceTest(LoggedTestCase):
         space = Dict({'a':Discrete(4), 'b':Discrete(3), 'c':Discrete(5)})
         PackedSpace(space, {'a_b':['a', 'b']})
     
+
+    def test_unpack(self):
+        space = Dict({'a':Discrete(4), 'b':Discrete(3), 'c':Discrete(5)})
+        packed = PackedSpace(space, {'a_b':['a', 'b']})
+        self.assertEqual({'a_b':9}, packed.pack({'a':1, 'b':2, 'c':4}))
+        self.assertEqual({'a':1, 'b':2, 'c':4}, dict(packed.unpack(OrderedDict([('a_b', 9), ('c', 4)]))))
+
+    def test_unpack_pack_all(self):
+        space = Dict({'a':Discrete(4), 'b':Dict({'x':Discrete(2), 'y':Discrete(3)}), 'c':Discrete(5)})
+        packed = PackedSpace(space, {'a_b':['a', 'b']})
+        for n in range(24):
+            action = packed.unpack(OrderedDict([('a_b', n), ('c', 1)]))
+            self.assertEqual({'a_b':n}, packed.pack(action))
+
+    def test_unpackBatch(self):
+        space = Dict({'a':Discrete(4), 'b':Discrete(3), 'c':Discrete(5)})
+        packed = PackedSpace(space, {'a_b':['a', 'b']})
+        actions = packed.unpackBatch({'a_b':numpy.arange(12), 'c':[4] * 12})
+        for n in range(12):
+            expected = packed.unpack(OrderedDict([('a_b', n), ('c', 4)]))
+            self.assertEqual(expected, {key:int(values[n]) for key, values in actions.items()})
+
+    def test_unpackBatch_no_table(self):
+        space = Dict({'a':Discrete(300), 'b':Discrete(300)})
+        packed = PackedSpace(space, {'a_b':['a', 'b']})
+        actions = packed.unpackBatch({'a_b':[300 * 7 + 5]})
+        self.assertEqual([5], actions['a'].tolist())
+        self.assertEqual([7], actions['b'].tolist())
+        self.assertEqual({'a_b':300 * 7 + 5}, packed.pack({'a':5, 'b':7}))
@@ -0,0 +1,46 @@
+from test.LoggedTestCase import LoggedTestCase
+from unittest.mock import Mock
+from aienvs.runners.Experiment import Experiment
+from aienvs.runners.ParallelExperiment import ParallelExperiment
+from aienvs.FactoryFloor.FactoryFloor import FactoryFloor
+import random
+
+ENVNAME = "aienvs.FactoryFloor.FactoryFloor.FactoryFloor"
+PARAMETERS = {'steps': 7, 'P_task_appears': 1.0, 'allow_task_overlap': True,
+              'robots': [{'id': 'robot1', 'pos': 'random'}, {'id': 'robot2', 'pos': 'random'}],
+              'tasks': ['random', 'random'], 'map': ['1111', '1111', '1111']}
+
+
+class RandomRobotsAgent():
+    """
+    Picklable agent that picks random actions for the default robots.
+    The actions only depend on the observation, so that episodes only depend on the seed
+    """
+
+    def step(self, obs, reward, done):
+        rnd = random.Random(hash(obs))
+        return {'robot1': rnd.randint(0, 4), 'robot2': rnd.randint(0, 4)}
+
+
+class testParallelExperiment(LoggedTestCase):
+
+    def testSameAsSerial(self):
+        seeds = [1, 2, 3, 4, 5]
+        serial = Experiment(RandomRobotsAgent(), FactoryFloor(PARAMETERS), 100, seeds).run()
+        parallel = ParallelExperiment(RandomRobotsAgent(), ENVNAME, PARAMETERS, 100, seeds, 3).run()
+        self.assertEqual(15, len(parallel))
+        self.assertNotEqual(1, len(set(serial)))
+        self.assertEqual(serial, parallel)
+
+    def testListener(self):
+        exp = ParallelExperiment(RandomRobotsAgent(), ENVNAME, PARAMETERS, 70, [1, 2], 2)
+        listener = Mock()
+        exp.addListener(listener)
+        exp.run()
+        self.assertEqual(10, len(listener.notifyChange.mock_calls))
+        self.assertEqual([7 * (n + 1) for n in range(10)], \
+            [call[1][0]['step'] for call in listener.notifyChange.mock_calls])
+
+    def testNoSeeds(self):
+        with self.assertRaises(ValueError):
+            ParallelExperiment(RandomRobotsAgent(), ENVNAME, PARAMETERS, 70, None)
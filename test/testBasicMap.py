@@ -1,4 +1,6 @@
 from aienvs.BasicMap import BasicMap
+import aienvs.BasicMap as BasicMap_module
+import gc
 from test.LoggedTestCase import LoggedTestCase
 from numpy import array, array_equal
 
@@ -77,3 +79,49 @@ class TestBasicMap(LoggedTestCase):
         self.assertEquals(hash(themap1), hash(themap2))
         self.assertNotEqual(hash(themap1), hash(themap3))
         
+
+    def test_grids(self):
+        themap = BasicMap(['.a*', '*b.'])
+        self.assertEqual((3, 2), themap.getCharGrid().shape)
+        self.assertEqual(ord('a'), themap.getCharGrid()[1, 0])
+        self.assertEqual([[True, False], [True, True], [False, True]], themap.getFreeGrid().tolist())
+        self.assertEqual((5, 4), themap.getWallGrid().shape)
+        self.assertTrue(themap.getWallGrid()[0].all())
+        self.assertTrue(themap.getWallGrid()[3, 1])
+        self.assertFalse(themap.getWallGrid()[1, 1])
+        with self.assertRaises(ValueError):
+            themap.getFreeGrid()[0, 0] = False
+
+    def test_isFree_batch(self):
+        themap = BasicMap(['.a*', '*b.'])
+        positions = array([[0, 0], [2, 0], [2, 1], [-1, 0], [3, 1], [0, 2], [7, -5]])
+        self.assertEqual([True, False, True, False, False, False, False], themap.isFree(positions).tolist())
+        self.assertTrue(themap.isFree(array([1, 1])))
+        self.assertFalse(themap.isFree(array([0, 1])))
+        self.assertFalse(themap.isFree(array([0, -1])))
+
+    def test_shared_grids(self):
+        themap1 = BasicMap(['.a.', '.b.'])
+        themap2 = BasicMap(['.a.', '.b.'])
+        self.assertIs(themap1.getWallGrid(), themap2.getWallGrid())
+        self.assertIsNot(themap1.getWallGrid(), BasicMap(['.a.', '.c.']).getWallGrid())
+
+    def test_getMapPositions_readonly(self):
+        pos = BasicMap(['.a.', '.b.', '..c']).getMapPositions('a')[0]
+        with self.assertRaises(ValueError):
+            pos[0] = 2
+        self.assertEqual([1, 0], BasicMap(['.a.', '.b.', '..c']).getMapPositions('a')[0].tolist())
+
+    def test_get(self):
+        themap = BasicMap(['.a.', '.b*', '..c'])
+        self.assertEqual('*', themap.get(array([2, 1])))
+        self.assertEqual('c', themap.get((2, 2)))
+        self.assertIsNone(themap.get(array([3, 0])))
+
+    def test_grids_shared_not_kept(self):
+        lines = ['.x.', '*..']
+        map1 = BasicMap(lines)
+        self.assertIs(map1.getCharGrid(), BasicMap(list(lines)).getCharGrid())
+        del map1
+        gc.collect()
+        self.assertNotIn(tuple(lines), BasicMap_module._gridsCache)
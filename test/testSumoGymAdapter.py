@@ -6,6 +6,7 @@ import yaml
 from test.LoggedTestCase import LoggedTestCase
 from aienvs.Sumo.SumoGymAdapter import SumoGymAdapter
 from aienvs.runners.Experiment import Experiment
+from unittest.mock import patch
 
 logger = logging.getLogger()
 logger.setLevel(50)
@@ -48,6 +49,47 @@ class testSumoGymAdapter(LoggedTestCase):
             i += 1
             obs, global_reward, done, info = env.step(env.action_space.sample())
  
+
+    def _createAdapter(self) -> SumoGymAdapter:
+        '''
+        @return adapter with the phases of test/Sumo/test.tll.xml and a Mock ldm
+        '''
+        dirname = os.path.dirname(__file__)
+        with patch('aienvs.Sumo.SumoGymAdapter.ldm'):
+            env = SumoGymAdapter(parameters={'scenarios_path': dirname, 'scene': 'Sumo', 'tlphasesfile': 'test.tll.xml',
+                                             'seed': None, 'y_t': 2}, init_state=False)
+        env.ldm.getTrafficLights.return_value = ['0', '1']
+        return env
+
+    def _sentStates(self, env, actions:dict) -> dict:
+        '''
+        @return the light states that were sent to the ldm for given actions
+        '''
+        env._set_lights(actions)
+        return env.ldm.setRedYellowGreenStates.call_args[0][0]
+
+    def test_set_lights_only_changes(self):
+        env = self._createAdapter()
+        green0 = 'GGggrrrrGGggrrrr'
+        green1 = 'rrGGrrrrrrGGrrrr'
+        yellow0 = 'yyggrrrryyggrrrr'
+        self.assertEqual({'0': green0, '1': green0}, self._sentStates(env, {'0': 0, '1': 0}))
+        self.assertEqual({}, self._sentStates(env, {'0': 0, '1': 0}))
+        # switching goes through y_t steps of yellow, the corrected action is what is sent
+        self.assertEqual({'0': yellow0}, self._sentStates(env, {'0': 1, '1': 0}))
+        self.assertEqual({}, self._sentStates(env, {'0': 1, '1': 0}))
+        self.assertEqual({'0': green1}, self._sentStates(env, {'0': 1, '1': 0}))
+        self.assertEqual({}, self._sentStates(env, {'0': 1, '1': 0}))
+        env.ldm.setRedYellowGreenState.assert_not_called()
+
+    def test_set_lights_after_restart(self):
+        env = self._createAdapter()
+        self._sentStates(env, {'0': 0, '1': 0})
+        with patch('aienvs.Sumo.SumoGymAdapter.checkBinary'), patch('aienvs.Sumo.SumoGymAdapter.SumoHelper'):
+            env._startSUMO(gui=False)
+        # the new simulation does not have the old light states
+        self.assertEqual({'0': 'GGggrrrrGGggrrrr', '1': 'GGggrrrrGGggrrrr'}, self._sentStates(env, {'0': 0, '1': 0}))
+
         
 if __name__ == '__main__':
     unittest.main()
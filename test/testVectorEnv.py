@@ -0,0 +1,50 @@
+from test.LoggedTestCase import LoggedTestCase
+from aienvs.VectorEnv import SyncVectorEnv, AsyncVectorEnv
+from aienvs.FactoryFloor.FactoryFloor import FactoryFloor
+from numpy import array
+
+FACTORYFLOOR = "aienvs.FactoryFloor.FactoryFloor.FactoryFloor"
+PARAMETERS = {'steps': 3}
+ACTIONS = {'robot1': 4, 'robot2': 2}
+
+
+class testVectorEnv(LoggedTestCase):
+
+    def test_sync_step(self):
+        venv = SyncVectorEnv(FACTORYFLOOR, PARAMETERS, 3)
+        venv.seed(1)
+        obs = venv.reset()
+        self.assertEqual(3, len(obs))
+        obs, rewards, dones, infos = venv.step([ACTIONS] * 3)
+        self.assertEqual(3, len(obs))
+        self.assertEqual((3,), rewards.shape)
+        self.assertEqual([False] * 3, dones.tolist())
+        self.assertEqual(1, obs[0].step)
+
+    def test_sync_autoreset(self):
+        venv = SyncVectorEnv(FACTORYFLOOR, PARAMETERS, 2)
+        venv.reset()
+        for i in range(3):
+            obs, rewards, dones, infos = venv.step(array([[4, 2], [0, 1]]))
+        self.assertEqual([True, True], dones.tolist())
+        self.assertEqual(0, obs[0].step)
+        self.assertEqual(3, infos[1]['terminal_observation'].step)
+
+    def test_async_same_as_single(self):
+        venv = AsyncVectorEnv(FACTORYFLOOR, PARAMETERS, 2)
+        try:
+            venv.seed(5)
+            venv.reset()
+            results = [venv.step([ACTIONS] * 2) for i in range(3)]
+        finally:
+            venv.close()
+
+        for i in range(2):
+            env = FactoryFloor(PARAMETERS)
+            env.seed(5 + i)
+            env.reset()
+            for obs, rewards, dones, infos in results:
+                expectobs, expectreward, expectdone, info = env.step(ACTIONS)
+                self.assertEqual(expectreward, rewards[i])
+                self.assertEqual(expectdone, dones[i])
+            self.assertEqual(expectobs, infos[i]['terminal_observation'])